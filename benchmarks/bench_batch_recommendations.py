@@ -0,0 +1,76 @@
+"""
+Recommendations for a carousel of movies: one GET /movie/{id} per movie
+versus a single POST /api/recommendations, on a synthetic catalog with no
+neighbor table (so every uncached movie needs an index search). The
+recommendation cache is cleared before every round.
+
+    python -m benchmarks.bench_batch_recommendations --size 20000 --batch 100
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from fastapi.testclient import TestClient
+
+import services
+from benchmarks.synthetic import make_movies
+from catalog import MovieCatalog
+from main import app
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        services.invalidate_caches()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_movies(args.size)
+    ids = random.Random(7).sample(df['id'].astype(int).tolist(), args.batch)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        retriever = services.create_faiss_index(df, f"{tmp}/faiss", backend="hashing")
+        # Serve the app without its lifespan, wired to the synthetic data
+        app.state.catalog = MovieCatalog(df)
+        app.state.retriever_loader = services.RetrieverLoader.loaded(retriever, path=f"{tmp}/faiss")
+        client = TestClient(app)
+
+        def per_movie():
+            for movie_id in ids:
+                assert client.get(f"/movie/{movie_id}").status_code == 200
+
+        def per_movie_json():
+            for movie_id in ids:
+                assert client.post("/api/recommendations", json={"movie_ids": [movie_id], "k": args.k}).status_code == 200
+
+        def batched():
+            assert client.post("/api/recommendations", json={"movie_ids": ids, "k": args.k}).status_code == 200
+
+        rows = [
+            (f"{args.batch} x GET /movie/{{id}}", timed(per_movie, args.repeat)),
+            (f"{args.batch} x POST (1 id)", timed(per_movie_json, args.repeat)),
+            (f"1 x POST ({args.batch} ids)", timed(batched, args.repeat)),
+        ]
+
+    print(f"{'calls':<26} {'total ms':>9} {'movies/s':>9}")
+    for name, ms in rows:
+        print(f"{name:<26} {ms:>9.1f} {args.batch / ms * 1000:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
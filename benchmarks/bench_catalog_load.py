@@ -0,0 +1,81 @@
+"""
+Catalog startup cost: joblib pickle + MovieCatalog versus the columnar store.
+
+Each format is loaded in a fresh subprocess that reports load time, the
+resident set size added by the load, and the time of the first (cold)
+lookups: 1k one at a time, then 1k other ids in one get_many call.
+
+    python -m benchmarks.bench_catalog_load --movies 50000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import joblib
+
+from benchmarks.synthetic import make_movies
+from catalog_store import write_store
+
+CHILD = r"""
+import json, sys, time
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+
+import joblib
+from catalog import MovieCatalog
+base = rss_mb()
+start = time.perf_counter()
+if sys.argv[1] == "pickle":
+    catalog = MovieCatalog(joblib.load(sys.argv[2]))
+else:
+    catalog = MovieCatalog.from_store(sys.argv[2])
+load = time.perf_counter() - start
+after_load = rss_mb()
+start = time.perf_counter()
+for movie_id in range(1, 1001):
+    catalog.get(movie_id)
+lookups = time.perf_counter() - start
+start = time.perf_counter()
+catalog.get_many(list(range(1001, 2001)))
+batch = time.perf_counter() - start
+print(json.dumps({"load_s": load, "rss_mb": after_load - base, "lookup_ms": lookups, "batch_ms": batch}))
+"""
+
+
+def measure(fmt, path):
+    out = subprocess.run([sys.executable, "-c", CHILD, fmt, path], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = os.path.join(tmp, "movie_list.pkl")
+        store_path = os.path.join(tmp, "movie_catalog")
+        df = make_movies(args.movies)
+        joblib.dump(df, pickle_path)
+        write_store(df, store_path)
+        del df
+
+        store_bytes = sum(os.path.getsize(os.path.join(store_path, f)) for f in os.listdir(store_path))
+        print(f"{args.movies} movies: pickle {os.path.getsize(pickle_path) / 2**20:.1f} MB, "
+              f"columnar {store_bytes / 2**20:.1f} MB on disk")
+        print(f"{'format':<10} {'load s':>8} {'RSS +MB':>9} {'1k lookups ms':>14} {'1k get_many ms':>15}")
+        for fmt, path in (("pickle", pickle_path), ("columnar", store_path)):
+            r = measure(fmt, path)
+            print(f"{fmt:<10} {r['load_s']:>8.2f} {r['rss_mb']:>9.1f} {r['lookup_ms'] * 1000:>14.1f} {r['batch_ms'] * 1000:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
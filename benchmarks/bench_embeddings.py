@@ -0,0 +1,61 @@
+"""
+Compare FAISS index build time and query latency across embedding backends.
+Backends whose requirements are missing (sentence-transformers for "local",
+HUGGINGFACEHUB_API_TOKEN for "endpoint") are skipped.
+
+    python -m benchmarks.bench_embeddings --size 5000 --backends hashing local endpoint
+"""
+import argparse
+import importlib.util
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import services
+from benchmarks.synthetic import make_movies
+
+
+def available(backend):
+    if backend == "local":
+        return importlib.util.find_spec("sentence_transformers") is not None
+    if backend == "endpoint":
+        return bool(os.getenv("HUGGINGFACEHUB_API_TOKEN") or os.getenv("HF_TOKEN"))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--backends", nargs="+", default=["hashing", "local", "endpoint"])
+    args = parser.parse_args()
+
+    df = make_movies(args.size)
+    queries = df['title'].sample(args.queries, random_state=1).tolist()
+
+    print(f"{'backend':>10} {'build s':>8} {'query p50 ms':>13} {'query p99 ms':>13}")
+    for backend in args.backends:
+        if not available(backend):
+            print(f"{backend:>10} skipped (requirements not available)")
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            retriever = services.create_faiss_index(df, tmp, backend=backend)
+            build_s = time.perf_counter() - start
+            if retriever is None:
+                print(f"{backend:>10} build failed")
+                continue
+
+            vectorstore = retriever.vectorstore
+            timings = []
+            for q in queries:
+                start = time.perf_counter()
+                vectorstore.similarity_search(q, k=6)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{backend:>10} {build_s:>8.2f} {np.percentile(timings, 50):>13.2f} {np.percentile(timings, 99):>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+FAISS index types compared against the exact flat index: build time, index
+size, single-query latency / QPS and recall@k.
+
+Vectors are either the ones stored in a saved index (the real catalog) or a
+synthetic clustered set of unit vectors scaled to any size:
+
+    python -m benchmarks.bench_faiss_index --index movie_recommendation_faiss
+    python -m benchmarks.bench_faiss_index --sizes 100000 1000000 --nprobe 8 32 --ef-search 32 128
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from indexer import new_index, tune_index
+
+SPECS = ["Flat", "IVF1024,Flat", "HNSW32", "IVF1024,PQ48"]
+
+
+def synthetic_vectors(n, dim, clusters=2000, seed=0):
+    """Unit vectors drawn around random cluster centres, like embedded movie texts."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centres[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def saved_vectors(path):
+    index = faiss.read_index(f"{path}/index.faiss")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def measure(index, queries, truth, k):
+    start = time.perf_counter()
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        found[i] = index.search(query[None, :], k)[1][0]
+    elapsed = time.perf_counter() - start
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found.tolist(), truth.tolist())])
+    return len(queries) / elapsed, elapsed / len(queries) * 1000, recall
+
+
+def run(name, vectors, queries, args):
+    print(f"\n{name}: {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}")
+    print(f"{'spec':<16} {'param':<12} {'build s':>8} {'size MB':>8} {'QPS':>8} {'ms/query':>9} {'recall':>7}")
+    truth = None
+    for spec in args.specs:
+        start = time.perf_counter()
+        index = new_index(vectors, spec)
+        index.add(vectors)
+        build = time.perf_counter() - start
+        size = faiss.serialize_index(index).nbytes / 2**20
+
+        if faiss.try_extract_index_ivf(index) is not None:
+            params = [("nprobe", v) for v in args.nprobe]
+        elif hasattr(index, "hnsw"):
+            params = [("efSearch", v) for v in args.ef_search]
+        else:
+            params = [("exact", None)]
+        for param, value in params:
+            tune_index(index, nprobe=value if param == "nprobe" else None, ef_search=value if param == "efSearch" else None)
+            if truth is None:
+                # The first spec is the flat index; its answers are the ground truth
+                truth = np.stack([index.search(q[None, :], args.k)[1][0] for q in queries])
+            qps, latency, recall = measure(index, queries, truth, args.k)
+            label = param if value is None else f"{param}={value}"
+            print(f"{spec:<16} {label:<12} {build:>8.2f} {size:>8.1f} {qps:>8.0f} {latency:>9.3f} {recall:>7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", help="Saved FAISS index whose vectors to benchmark")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[100000], help="Synthetic catalog sizes")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--specs", nargs="+", default=SPECS, help="Index specs; the first must be Flat")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[32, 128])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads")
+    args = parser.parse_args()
+    faiss.omp_set_num_threads(args.threads)
+
+    rng = np.random.default_rng(1)
+    if args.index:
+        vectors = saved_vectors(args.index)
+        # Real queries: stored movie vectors, as the recommender uses them
+        run(args.index, vectors, vectors[rng.choice(len(vectors), args.queries, replace=False)], args)
+    for n in args.sizes:
+        vectors = synthetic_vectors(n + args.queries, args.dim)
+        run(f"synthetic {n}", vectors[:n], vectors[n:], args)
+
+
+if __name__ == "__main__":
+    main()
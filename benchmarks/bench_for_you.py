@@ -0,0 +1,82 @@
+"""
+"For you" recommendations for users with growing rating histories: the
+vectorized profile (one batched vector lookup, a NumPy weighted mean and one
+index search) versus a per-movie Python loop that reconstructs each rated
+movie's vector and filters seen movies one by one.
+
+    python -m benchmarks.bench_for_you --size 50000 --ratings 10 100 1000 5000
+"""
+import argparse
+import random
+import tempfile
+import time
+
+import numpy as np
+
+import services
+from benchmarks.synthetic import make_movies
+from catalog import MovieCatalog
+from neighbors import get_vector_index
+
+
+def per_movie_loop(interactions, catalog, retriever, k):
+    vector_index = get_vector_index(retriever.vectorstore)
+    total, weight_sum = None, 0.0
+    for i in interactions:
+        position = vector_index._positions.get(i['movie_id'])
+        if position is None:
+            continue
+        vector = vector_index.index.reconstruct(position) * i['rating']
+        total = vector if total is None else total + vector
+        weight_sum += i['rating']
+    seen = {i['movie_id'] for i in interactions}
+    _, positions = vector_index.index.search((total / weight_sum)[None, :], k + len(seen))
+    ids = []
+    for position in positions[0]:
+        movie_id = int(vector_index.movie_ids[position])
+        if movie_id not in seen:
+            ids.append(movie_id)
+    return [d for d in catalog.get_many(ids[:k]) if d]
+
+
+def vectorized(interactions, catalog, retriever, k):
+    profile = services.build_user_profile(interactions, retriever)
+    return services.get_profile_recommendations(profile, catalog, retriever, k)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--ratings", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_movies(args.size)
+    catalog = MovieCatalog(df)
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        retriever = services.create_faiss_index(df, f"{tmp}/faiss", backend="hashing")
+        print(f"{'ratings':>8} {'loop ms':>9} {'numpy ms':>9} {'speedup':>8}")
+        for n in args.ratings:
+            interactions = [
+                {'movie_id': m, 'rating': rng.choice(np.arange(0.5, 10.5, 0.5).tolist()), 'status': None}
+                for m in rng.sample(df['id'].astype(int).tolist(), n)
+            ]
+            assert vectorized(interactions, catalog, retriever, args.k) == per_movie_loop(interactions, catalog, retriever, args.k)
+            loop = timed(lambda: per_movie_loop(interactions, catalog, retriever, args.k), args.repeat)
+            fast = timed(lambda: vectorized(interactions, catalog, retriever, args.k), args.repeat)
+            print(f"{n:>8} {loop:>9.2f} {fast:>9.2f} {loop / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
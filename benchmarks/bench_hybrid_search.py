@@ -0,0 +1,91 @@
+"""
+Search quality and latency: the tiered title search against BM25 alone,
+vector similarity alone and the hybrid (reciprocal rank fusion) mode.
+
+Each query targets one movie, either by its title or by a few words from its
+tags/overview (a description of the plot rather than the name). Quality is
+the share of queries whose movie is in the top results (hit@limit) and the
+mean reciprocal rank of that movie.
+
+    python -m benchmarks.bench_hybrid_search --size 20000
+    python -m benchmarks.bench_hybrid_search --catalog movie_catalog --index movie_recommendation_faiss
+"""
+import argparse
+import random
+import tempfile
+import time
+
+import numpy as np
+
+import services
+from benchmarks.synthetic import make_movies
+from catalog import MovieCatalog
+from neighbors import get_vector_index
+
+
+def make_queries(catalog, count, seed=11):
+    rng = random.Random(seed)
+    queries = {"title": [], "description": []}
+    for pos in rng.sample(range(len(catalog)), min(count, len(catalog))):
+        movie = catalog.get_many(catalog.ids_at([pos]))[0]
+        queries["title"].append((movie['title'].lower(), movie['id']))
+        tags = movie.get('tags')
+        words = " ".join([" ".join(tags) if isinstance(tags, (list, tuple)) else str(tags or ""), movie['overview']]).split()
+        if len(words) >= 4:
+            queries["description"].append((" ".join(rng.sample(words, 4)).lower(), movie['id']))
+    return queries
+
+
+def evaluate(search, queries, limit):
+    timings, hits, reciprocal = [], 0, 0.0
+    for query, target in queries:
+        services.search_cache.clear()
+        start = time.perf_counter()
+        ids = search(query)[:limit]
+        timings.append((time.perf_counter() - start) * 1000)
+        if target in ids:
+            hits += 1
+            reciprocal += 1 / (ids.index(target) + 1)
+    return np.percentile(timings, 50), np.percentile(timings, 99), hits / len(queries), reciprocal / len(queries)
+
+
+def run(catalog, retriever, args):
+    vector_index = get_vector_index(retriever.vectorstore)
+    embed = retriever.vectorstore.embedding_function.embed_query
+    methods = {
+        "tiers": lambda q: [r['id'] for r in services.search_movies(q, catalog, limit=args.limit)],
+        "bm25": lambda q: catalog.ids_at(catalog.bm25_index.search(q, args.limit)),
+        "vector": lambda q: vector_index.search_vector(embed(q), args.limit)[0],
+        "hybrid": lambda q: [r['id'] for r in services.hybrid_search(q, catalog, retriever, limit=args.limit)],
+    }
+    start = time.perf_counter()
+    catalog.bm25_index
+    print(f"{len(catalog)} movies, BM25 index built in {(time.perf_counter() - start) * 1000:.0f} ms, limit={args.limit}")
+    print(f"{'queries':<12} {'method':<7} {'p50 ms':>7} {'p99 ms':>7} {'hit@k':>6} {'MRR':>6}")
+    for kind, queries in make_queries(catalog, args.queries).items():
+        for name, search in methods.items():
+            p50, p99, hit, mrr = evaluate(search, queries, args.limit)
+            print(f"{kind:<12} {name:<7} {p50:>7.2f} {p99:>7.2f} {hit:>6.3f} {mrr:>6.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20000, help="Synthetic catalog size")
+    parser.add_argument("--catalog", help="Columnar catalog to benchmark instead of a synthetic one")
+    parser.add_argument("--index", help="FAISS index for --catalog")
+    parser.add_argument("--backend", default=None, help="Embedding backend of --index")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=12)
+    args = parser.parse_args()
+
+    if args.catalog:
+        catalog = MovieCatalog.from_store(args.catalog)
+        run(catalog, services.load_retriever(args.index, args.backend), args)
+        return
+    df = make_movies(args.size)
+    with tempfile.TemporaryDirectory() as tmp:
+        run(MovieCatalog(df), services.create_faiss_index(df, f"{tmp}/faiss", backend="hashing"), args)
+
+
+if __name__ == "__main__":
+    main()
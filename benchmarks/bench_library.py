@@ -0,0 +1,74 @@
+"""
+/library hydration cost versus library size on a synthetic catalog:
+
+  per-row scan  the old path: DataFrame mask + literal_eval per entry
+  batch         services.get_movies_details over the precomputed catalog
+  batch+render  batch hydration plus rendering library.html with every entry
+  first page    hydration and rendering of the first page of each section,
+                which is all /library renders now (later pages load lazily)
+
+    python -m benchmarks.bench_library --catalog 20000 --sizes 50 500 5000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.synthetic import make_movies
+from catalog import MovieCatalog, normalize_movie_record
+from dependencies import templates
+import services
+from database import LIBRARY_PAGE_SIZE
+
+
+def scan_details(movie_id, df):
+    match = df[df['id'] == movie_id]
+    return normalize_movie_record(match.iloc[0].to_dict()) if not match.empty else None
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", type=int, default=20000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--scan-limit", type=int, default=500, help="Largest size timed with the per-row scan")
+    args = parser.parse_args()
+
+    df = make_movies(args.catalog)
+    catalog = MovieCatalog(df)
+    template = templates.env.get_template("library.html")
+
+    print(f"{'entries':>8} {'per-row scan ms':>16} {'batch ms':>9} {'batch+render ms':>16} {'us/entry':>9} {'first page ms':>14}")
+    for size in args.sizes:
+        ids = random.Random(size).sample(df['id'].tolist(), size)
+
+        scan = "-"
+        if size <= args.scan_limit:
+            scan = f"{timed(lambda: [scan_details(i, df) for i in ids], repeat=1):.1f}"
+
+        batch = timed(lambda: services.get_movies_details(ids, catalog))
+
+        def render(page=None):
+            half = len(ids) // 2
+            sections = {}
+            for section, section_ids in (("to_watch", ids[:half]), ("watched", ids[half:]), ("rated", ids)):
+                shown = section_ids[:page] if page else section_ids
+                more = page is not None and len(section_ids) > page
+                sections[section] = {"movies": services.get_movies_details(shown, catalog),
+                                     "next_cursor": "cursor" if more else None}
+            template.render(user="bench", sections=sections, active_page="library")
+
+        full = timed(render)
+        first = timed(lambda: render(LIBRARY_PAGE_SIZE))
+        print(f"{size:>8} {scan:>16} {batch:>9.2f} {full:>16.2f} {full * 1000 / size:>9.1f} {first:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Page latency during a login burst. A server is started per mode and
+browsed with concurrent GET /movie/{id} and /search requests, first alone
+and then while other clients POST /login as fast as they can:
+
+  threads  bcrypt in the default threadpool with no admission limit (the old behaviour)
+  pool     the defaults: a niced bcrypt process pool with 429 admission control
+
+Needs a reachable database (DATABASE_URL) and runs from an app directory
+holding the data files:
+
+    python -m benchmarks.bench_login_burst --logins 32 --duration 15
+"""
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import WORDS
+
+MODES = {
+    "threads": {"PASSWORD_WORKERS": "0", "PASSWORD_MAX_PENDING": "1000000"},
+    "pool": {},
+}
+
+
+async def browse(client, args, deadline, timings):
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        path = f"/movie/{rng.randint(1, args.movies)}" if rng.random() < 0.5 else f"/search?q={rng.choice(WORDS)}"
+        start = time.perf_counter()
+        await client.get(path)
+        timings.append((time.perf_counter() - start) * 1000)
+
+
+async def log_in(client, username, deadline, statuses):
+    while time.perf_counter() < deadline:
+        response = await client.post("/login", data={"username": username, "password": "burst-password"})
+        statuses.append(response.status_code)
+        if response.status_code == 429:
+            await asyncio.sleep(float(response.headers.get("retry-after", 1)))
+
+
+async def phase(url, args, username, logins):
+    timings, statuses = [], []
+    limits = httpx.Limits(max_connections=args.concurrency + logins + 4)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(
+            *(browse(client, args, deadline, timings) for _ in range(args.concurrency)),
+            *(log_in(client, username, deadline, statuses) for _ in range(logins)),
+        )
+    return timings, statuses
+
+
+def run(mode, args):
+    env = dict(os.environ, BCRYPT_ROUNDS=str(args.rounds), **MODES[mode])
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        for _ in range(600):
+            try:
+                if httpx.get(f"{url}/readyz", timeout=5).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        else:
+            raise RuntimeError("server did not become ready")
+
+        username = f"burst_{uuid.uuid4().hex[:10]}"
+        httpx.post(f"{url}/signup", data={"username": username, "password": "burst-password"}, timeout=60)
+        asyncio.run(phase(url, args, username, logins=0))  # warm caches
+        rows = []
+        for logins in (0, args.logins):
+            timings, statuses = asyncio.run(phase(url, args, username, logins))
+            rows.append((mode, logins, np.percentile(timings, 50), np.percentile(timings, 99), len(timings) / args.duration,
+                         statuses.count(303) / args.duration, statuses.count(429)))
+        return rows
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32, help="Concurrent clients logging in during the burst")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent browsing clients")
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--movies", type=int, default=5000, help="Movie ids requested are 1..movies")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--modes", nargs="+", default=list(MODES))
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'logins':>6} {'page p50':>9} {'page p99':>9} {'pages/s':>8} {'logins/s':>9} {'429s':>6}")
+    for mode in args.modes:
+        for row in run(mode, args):
+            print("{:<8} {:>6} {:>9.1f} {:>9.1f} {:>8.1f} {:>9.1f} {:>6}".format(*row))
+
+
+if __name__ == "__main__":
+    main()
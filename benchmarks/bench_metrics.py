@@ -0,0 +1,76 @@
+"""
+Overhead of the metrics hooks: the cost of one histogram observation and of
+a @metrics.timed call, then end-to-end request latency with metrics on and
+off (METRICS_ENABLED) for cached /movie/{id} pages and searches on a
+synthetic catalog.
+
+    python -m benchmarks.bench_metrics --size 20000 --requests 2000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import timeit
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from fastapi.testclient import TestClient
+
+import metrics
+import services
+from benchmarks.synthetic import make_movies
+from catalog import MovieCatalog
+from main import app
+
+
+def per_call_ns(stmt, number=200000):
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    def noop():
+        pass
+    timed_noop = metrics.timed("bench")(noop)
+    bare = per_call_ns(noop)
+    print(f"{'hook':<28} {'ns/call':>8}")
+    print(f"{'histogram.observe':<28} {per_call_ns(lambda: metrics.STAGE_DURATION.observe(0.001, 'bench')):>8.0f}")
+    print(f"{'@timed call (minus bare)':<28} {per_call_ns(timed_noop) - bare:>8.0f}")
+
+    df = make_movies(args.size)
+    ids = random.Random(5).choices(df['id'].astype(int).tolist(), k=args.requests)
+    with tempfile.TemporaryDirectory() as tmp:
+        retriever = services.create_faiss_index(df, f"{tmp}/faiss", backend="hashing")
+        # Serve the app without its lifespan, wired to the synthetic data
+        app.state.catalog = MovieCatalog(df)
+        app.state.retriever_loader = services.RetrieverLoader.loaded(retriever, path=f"{tmp}/faiss")
+        client = TestClient(app)
+        paths = [f"/movie/{movie_id}" for movie_id in ids[:200]] + ["/search?q=dark", "/search?q=night"] * 50
+
+        for path in paths:
+            client.get(path)  # warm every cache first
+        print(f"\n{'metrics':<8} {'ms/request':>10}")
+        results = {}
+        for enabled in (False, True, False, True):
+            metrics.METRICS_ENABLED = enabled
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                for i in range(args.requests):
+                    client.get(paths[i % len(paths)])
+                best = min(best, time.perf_counter() - start)
+            results[enabled] = min(results.get(enabled, float("inf")), best / args.requests * 1000)
+        for enabled, ms in results.items():
+            print(f"{'on' if enabled else 'off':<8} {ms:>10.3f}")
+        print(f"overhead: {(results[True] - results[False]) * 1000:.1f} us/request "
+              f"({(results[True] / results[False] - 1) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
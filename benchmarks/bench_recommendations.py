@@ -0,0 +1,68 @@
+"""
+Latency of the recommendation paths on a synthetic catalog:
+
+  title-query   the old path: retriever.invoke(title), embedding the title text
+  stored-vector get_recommendations_by_id with no neighbor table
+  table         get_recommendations_by_id served from the neighbor table
+
+The hashing backend is used so the run is offline; with the endpoint
+backend the title-query path additionally pays an HTTP round trip per call.
+
+    python -m benchmarks.bench_recommendations --size 20000
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+import services
+from benchmarks.synthetic import make_movies
+from catalog import MovieCatalog
+from neighbors import build_neighbor_table, get_vector_index
+
+
+def measure(fn, items):
+    timings = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_movies(args.size)
+    catalog = MovieCatalog(df)
+    sample = df.sample(args.requests, random_state=3)
+    ids = sample['id'].astype(int).tolist()
+    titles = sample['title'].tolist()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        retriever = services.create_faiss_index(df, f"{tmp}/faiss", backend="hashing")
+        table = build_neighbor_table(retriever.vectorstore, f"{tmp}/neighbors", k=20)
+        get_vector_index(retriever.vectorstore)  # built once per loaded index, not per request
+
+        def title_query(title):
+            results = retriever.invoke(title)
+            return [catalog.get(d.metadata['title']) for d in results if d.metadata['title'] != title][:args.k]
+
+        rows = [
+            ("title-query", measure(title_query, titles)),
+            ("stored-vector", measure(lambda i: services.get_recommendations_by_id(i, catalog, retriever, args.k), ids)),
+            ("table", measure(lambda i: services.get_recommendations_by_id(i, catalog, retriever, args.k, table), ids)),
+        ]
+
+    print(f"{'path':>14} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, (p50, p99) in rows:
+        print(f"{name:>14} {p50:>8.3f} {p99:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Library listing and per-movie aggregate queries before and after the
+schema migrations, on a synthetic dataset in a scratch schema:
+
+  v1   tables only (the old init_db schema: primary keys and UNIQUE(user_id, movie_id))
+  v2   + covering indexes for recent-first listing and per-movie scans
+  v3   + the movie_stats aggregate table maintained by triggers
+
+Half the rows are ratings and half bookmarks, spread over --users users
+and 20,000 movies, plus one heavy user with --heavy rows in each table.
+Reports the median latency of each query, the time each migration took,
+and the cost of single-row rating upserts (the triggers add to writes).
+Needs a reachable database (DATABASE_URL):
+
+    python -m benchmarks.bench_schema --rows 10000000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import psycopg
+
+import database as db
+import migrations
+
+SCHEMA = "bench_schema"
+MOVIES = 20000
+
+
+def _median_ms(samples):
+    return statistics.median(samples) * 1000
+
+
+async def timed(conn, query, params=(), repeat=20):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await (await conn.execute(query, params)).fetchall()
+        samples.append(time.perf_counter() - start)
+    return _median_ms(samples)
+
+
+async def load(conn, args):
+    users = args.users
+    per_table = args.rows // 2
+    await conn.execute(
+        "INSERT INTO users (username, password) SELECT 'u' || g, 'x' FROM generate_series(1, %s) g", (users + 1,)
+    )
+    for table, value in (("ratings", "(random() * 20)::int / 2.0"),
+                         ("bookmarks", "CASE WHEN random() < 0.6 THEN 'watched' ELSE 'to_watch' END")):
+        column = "rating" if table == "ratings" else "status"
+        start = time.perf_counter()
+        # Row i belongs to user i % users; its movie is distinct per user while i / users < MOVIES
+        await conn.execute(f"""
+        INSERT INTO {table} (user_id, movie_id, movie_title, {column}, created_at)
+        SELECT i %% %s + 1, ((i / %s) * 131 + i %% %s) %% {MOVIES} + 1, 'Movie ' || i %% {MOVIES}, {value},
+               now() - random() * interval '365 days'
+        FROM generate_series(0, %s - 1) i
+        """, (users, users, users, per_table))
+        await conn.execute(f"""
+        INSERT INTO {table} (user_id, movie_id, movie_title, {column}, created_at)
+        SELECT %s, g, 'Movie ' || g, {value}, now() - random() * interval '365 days'
+        FROM generate_series(1, %s) g
+        """, (users + 1, min(args.heavy, MOVIES)))
+        print(f"loaded {per_table:,} {table} in {time.perf_counter() - start:.1f}s")
+    await conn.execute("VACUUM ANALYZE users")
+    await conn.execute("VACUUM ANALYZE ratings")
+    await conn.execute("VACUUM ANALYZE bookmarks")
+
+
+async def measure(conn, args, with_stats):
+    heavy = args.users + 1
+    rows = {}
+    for name, (table, status) in {"ratings page": ("ratings", None), "to_watch page": ("bookmarks", "to_watch")}.items():
+        query, params = db._page_query(table, heavy, status, None, 24)
+        rows[f"{name}, heavy user"] = await timed(conn, query, params)
+        query, params = db._page_query(table, 1, status, None, 24)
+        rows[f"{name}, typical user"] = await timed(conn, query, params)
+
+    movies = list(range(1, 25))
+    rows["aggregates, 1 movie (GROUP BY)"] = await timed(conn, """
+    SELECT count(*), avg(rating) FROM ratings WHERE movie_id = %s
+    UNION ALL SELECT count(*) FILTER (WHERE status = 'watched'), count(*) FILTER (WHERE status = 'to_watch') FROM bookmarks WHERE movie_id = %s
+    """, (1, 1), repeat=5)
+    rows["aggregates, 24 movies (GROUP BY)"] = await timed(conn, """
+    SELECT movie_id, count(*), avg(rating) FROM ratings WHERE movie_id = ANY(%s) GROUP BY movie_id
+    """, (movies,), repeat=3)
+    if with_stats:
+        rows["aggregates, 24 movies (movie_stats)"] = await timed(conn, """
+        SELECT movie_id, rating_count, rating_sum / NULLIF(rating_count, 0), watched_count, to_watch_count
+        FROM movie_stats WHERE movie_id = ANY(%s)
+        """, (movies,))
+
+    start = time.perf_counter()
+    for movie_id in range(1, 201):
+        await conn.execute("""
+        INSERT INTO ratings (user_id, movie_id, movie_title, rating) VALUES (%s, %s, 'x', 5)
+        ON CONFLICT(user_id, movie_id) DO UPDATE SET rating = EXCLUDED.rating
+        """, (2, movie_id))
+    rows["rating upsert (autocommit)"] = (time.perf_counter() - start) / 200 * 1000
+    return rows
+
+
+async def main_async(args):
+    conn = await psycopg.AsyncConnection.connect(db.get_conninfo(), autocommit=True)
+    try:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+        await conn.execute(f"SET search_path TO {SCHEMA}")
+
+        await migrations.migrate(conn, target=1)
+        await load(conn, args)
+        results = {"v1": await measure(conn, args, with_stats=False)}
+        for version in (2, 3):
+            start = time.perf_counter()
+            await migrations.migrate(conn, target=version)
+            print(f"migration {version} took {time.perf_counter() - start:.1f}s")
+            await conn.execute("VACUUM ANALYZE ratings")
+            await conn.execute("VACUUM ANALYZE bookmarks")
+            results[f"v{version}"] = await measure(conn, args, with_stats=version >= 3)
+
+        print(f"\n{'query (median ms)':<38}" + "".join(f"{v:>10}" for v in results))
+        for name in results["v3"]:
+            print(f"{name:<38}" + "".join(
+                f"{results[v][name]:>10.2f}" if name in results[v] else f"{'-':>10}" for v in results
+            ))
+    finally:
+        if not args.keep:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000, help="Ratings plus bookmarks to generate")
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--heavy", type=int, default=20_000, help="Ratings and bookmarks of the heavy user")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema afterwards")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare search latency of the precomputed SearchIndex against the old
+full-column pandas tiers across catalog sizes.
+
+    python -m benchmarks.bench_search --sizes 5000 50000 200000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from rapidfuzz import process, fuzz
+
+from benchmarks.synthetic import WORDS, make_movies
+from search_index import SearchIndex
+
+
+def legacy_search(query, df, limit=12):
+    """The pre-index search_movies tiers, minus detail hydration."""
+    query = query.strip().lower()
+    results, seen = [], set()
+
+    def add_unique(titles):
+        for t in titles:
+            if t not in seen:
+                results.append(t)
+                seen.add(t)
+            if len(results) >= limit:
+                return True
+        return False
+
+    if add_unique(df[df['title'].str.lower() == query]['title'].tolist()): return results
+    if add_unique(df[df['title'].str.lower().str.startswith(query)]['title'].tolist()): return results
+    if add_unique(df[df['title'].str.lower().str.contains(query, na=False, regex=False)]['title'].tolist()): return results
+    fuzzy = process.extract(query, df['title'].tolist(), scorer=fuzz.token_set_ratio, limit=limit)
+    if add_unique([m[0] for m in fuzzy if m[1] >= 80]): return results
+    add_unique(df[df['keywords'].str.lower().str.contains(query, na=False, regex=False)]['title'].tolist())
+    return results
+
+
+def make_queries(count, seed=7):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        word = rng.choice(WORDS)
+        kind = rng.random()
+        if kind < 0.3:
+            queries.append(word[:3])                                     # prefix
+        elif kind < 0.6:
+            queries.append(f"{word} {rng.choice(WORDS)}")                # multi-word
+        elif kind < 0.8:
+            queries.append(word[:-1] + "x")                              # typo
+        else:
+            queries.append(rng.choice(WORDS) + rng.choice(WORDS)[:2])    # rare / no match
+    return queries
+
+
+def measure(fn, queries):
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 50000, 200000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries)
+    print(f"{'size':>8} {'build ms':>9} {'legacy p50':>11} {'legacy p99':>11} {'index p50':>10} {'index p99':>10}")
+    for size in args.sizes:
+        df = make_movies(size)
+        start = time.perf_counter()
+        index = SearchIndex.from_dataframe(df)
+        build_ms = (time.perf_counter() - start) * 1000
+        legacy_p50, legacy_p99 = measure(lambda q: legacy_search(q, df), queries)
+        index_p50, index_p99 = measure(lambda q: index.search(q), queries)
+        print(f"{size:>8} {build_ms:>9.0f} {legacy_p50:>11.2f} {legacy_p99:>11.2f} {index_p50:>10.2f} {index_p99:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Memory and throughput of N gunicorn workers, with and without shared loading:
+
+  private  no preload, pickled catalog, FAISS read into memory: every worker
+           loads its own copies
+  shared   the defaults: preload in the master, memory-mapped catalog and index
+
+Memory is the total PSS (proportional set size, so shared pages are counted
+once) of the master and its workers after every worker has served
+recommendations. Run from an app directory holding the data files:
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --movies 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def pss_mb(pid):
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+async def hammer(url, movies, duration, concurrency):
+    count = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client):
+        nonlocal count
+        rng = random.Random()
+        while time.perf_counter() < deadline:
+            response = await client.get(f"/movie/{rng.randint(1, movies)}")
+            count += response.status_code == 200
+
+    async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        return count / (time.perf_counter() - start)
+
+
+def run(mode, workers, args):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(args.port))
+    if mode == "private":
+        env.update(GUNICORN_PRELOAD="0", FAISS_MMAP="0", CATALOG_STORE_PATH=os.devnull)
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py"],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        for _ in range(600):
+            try:
+                if httpx.get(f"{url}/", timeout=5).status_code == 200 and len(children(server.pid)) == workers:
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        else:
+            raise RuntimeError("server did not start")
+
+        # Warm every worker so each has loaded whatever it loads lazily
+        asyncio.run(hammer(url, args.movies, args.warmup, concurrency=workers * 4))
+        memory = pss_mb(server.pid) + sum(pss_mb(p) for p in children(server.pid))
+        throughput = asyncio.run(hammer(url, args.movies, args.duration, args.concurrency))
+        return memory, throughput
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--movies", type=int, default=50000, help="Movie ids requested are 1..movies")
+    parser.add_argument("--warmup", type=float, default=10)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'workers':>7} {'PSS MB':>8} {'req/s':>8}")
+    for mode in ("private", "shared"):
+        for workers in args.workers:
+            memory, throughput = run(mode, workers, args)
+            print(f"{mode:<8} {workers:>7} {memory:>8.0f} {throughput:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
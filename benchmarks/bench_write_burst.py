@@ -0,0 +1,81 @@
+"""
+Bookmark/rating write bursts with and without group commit. Concurrent
+clients each click through random ratings and bookmarks (awaiting every
+write, like the front end does), once per coalescing window:
+
+  window 0     every write is its own transaction (the old behaviour)
+  window > 0   writes are buffered for that many seconds and committed in batches
+
+Reports write throughput and latency, and the write transactions
+committed (one per write without buffering, one per batch with it).
+Needs a reachable database (DATABASE_URL):
+
+    python -m benchmarks.bench_write_burst --clients 64 --writes 50 --windows 0 0.002 0.01
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+import numpy as np
+
+import database as db
+import write_buffer
+
+
+async def client(user_id, args, rng, latencies):
+    for _ in range(args.writes):
+        movie_id = rng.randint(1, args.movies)
+        start = time.perf_counter()
+        if rng.random() < 0.5:
+            ok = await db.add_rating(user_id, movie_id, f"Movie {movie_id}", rng.randint(0, 20) / 2)
+        else:
+            ok = await db.add_bookmark(user_id, movie_id, f"Movie {movie_id}", rng.choice(("to_watch", "watched")))
+        assert ok
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run(window, user_ids, args):
+    write_buffer.WRITE_COALESCE_WINDOW = db._writes.window = window
+    latencies = []
+    batches, _ = write_buffer.BATCH_SIZE.snapshot()
+    start = time.perf_counter()
+    await asyncio.gather(*(client(u, args, random.Random(u), latencies) for u in user_ids))
+    elapsed = time.perf_counter() - start
+    transactions = len(latencies) if window <= 0 else write_buffer.BATCH_SIZE.snapshot()[0] - batches
+    return len(latencies) / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99), transactions
+
+
+async def main_async(args):
+    if not await db.open_pool():
+        raise SystemExit("Could not connect to the database.")
+    await db.migrate()
+    try:
+        prefix = f"burst_{uuid.uuid4().hex[:8]}"
+        async with db._connection() as conn:
+            cursor = await conn.execute(
+                "INSERT INTO users (username, password) SELECT %s || g, 'x' FROM generate_series(1, %s) g RETURNING id",
+                (prefix, args.clients),
+            )
+            user_ids = [r[0] for r in await cursor.fetchall()]
+
+        print(f"{'window s':>9} {'writes/s':>9} {'p50 ms':>7} {'p99 ms':>7} {'transactions':>12}")
+        for window in args.windows:
+            throughput, p50, p99, committed = await run(window, user_ids, args)
+            print(f"{window:>9} {throughput:>9.0f} {p50:>7.1f} {p99:>7.1f} {committed:>12}")
+    finally:
+        await db.close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=64, help="Concurrent users clicking")
+    parser.add_argument("--writes", type=int, default=50, help="Writes per user")
+    parser.add_argument("--movies", type=int, default=5000)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 0.002, 0.005, 0.01])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
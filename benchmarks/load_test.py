@@ -0,0 +1,78 @@
+"""
+Concurrent load against a running server: a mix of GET /movie/{id} and
+POST /api/rate from logged-in sessions. Reports throughput and latency.
+
+    uvicorn main:app --port 8000 &
+    python -m benchmarks.load_test --url http://localhost:8000 --concurrency 50 --duration 20
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+import httpx
+import numpy as np
+
+
+async def login(client):
+    username = f"load_{uuid.uuid4().hex[:12]}"
+    await client.post("/signup", data={"username": username, "password": "loadtest"})
+
+
+async def worker(client, args, deadline, results):
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        movie_id = rng.choice(args.movie_ids)
+        start = time.perf_counter()
+        kind = "rate" if rng.random() < args.rate_share else "movie"
+        try:
+            if kind == "rate":
+                response = await client.post("/api/rate", json={
+                    "movie_id": movie_id, "movie_title": str(movie_id), "rating": rng.randint(0, 20) / 2,
+                })
+            else:
+                response = await client.get(f"/movie/{movie_id}")
+            status = response.status_code
+        except httpx.TransportError:
+            # Dropped connections count as errors rather than ending the run
+            status = 0
+        results.append((kind, status, (time.perf_counter() - start) * 1000))
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    clients = [httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) for _ in range(args.users)]
+    await asyncio.gather(*(login(c) for c in clients))
+
+    results = []
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(worker(clients[i % len(clients)], args, deadline, results) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*(c.aclose() for c in clients))
+
+    print(f"{len(results)} requests in {elapsed:.1f}s -> {len(results) / elapsed:.1f} req/s "
+          f"(concurrency {args.concurrency})")
+    for kind in ("movie", "rate"):
+        timings = [ms for k, _, ms in results if k == kind]
+        errors = sum(1 for k, status, _ in results if k == kind and not 200 <= status < 400)
+        if timings:
+            print(f"  {kind:>5}: n={len(timings)} errors={errors} "
+                  f"p50={np.percentile(timings, 50):.1f}ms p99={np.percentile(timings, 99):.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=10, help="Distinct logged-in sessions")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--rate-share", type=float, default=0.3, help="Fraction of requests that are POST /api/rate")
+    parser.add_argument("--movie-ids", type=int, nargs="+", default=list(range(1, 1001)))
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
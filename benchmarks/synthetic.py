@@ -0,0 +1,44 @@
+"""Synthetic movie catalogs for benchmarks, shaped like movie_list.pkl."""
+import random
+
+import pandas as pd
+
+WORDS = (
+    "dark knight star war love story night day city dead man woman last first lost "
+    "return rise fall king queen dream shadow fire ice blood moon sun road home "
+    "secret island house game heart world time space ship ghost hunter legend"
+).split()
+GENRES = ["Action", "Adventure", "Comedy", "Crime", "Drama", "Fantasy", "Horror", "Romance", "Thriller"]
+
+
+def make_movies(n, seed=42):
+    """Return a DataFrame of n fake movies with stringified list columns."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+        if rng.random() < 0.3:
+            title = f"{title} {rng.randint(2, 5)}"
+        keywords = rng.sample(WORDS, 4)
+        genres = rng.sample(GENRES, 2)
+        cast = [f"Actor {rng.randint(1, n)}" for _ in range(5)]
+        rows.append({
+            'id': i + 1,
+            'title': title,
+            'overview': " ".join(rng.choice(WORDS) for _ in range(30)),
+            'genres': str(genres),
+            'keywords': str(keywords),
+            'cast': str(cast),
+            'crew': str([f"Director {rng.randint(1, n)}"]),
+            'production_companies': str([f"Studio {rng.randint(1, 200)}"]),
+            'release_date': f"{rng.randint(1950, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'budget': rng.randint(0, 200_000_000),
+            'revenue': rng.randint(0, 900_000_000),
+            'runtime': float(rng.randint(80, 180)),
+            'vote_average': round(rng.uniform(1, 10), 1),
+            'vote_count': rng.randint(0, 20000),
+            'popularity': rng.uniform(0, 200),
+            'poster_path': f"/poster{i}.jpg",
+            'tags': " ".join(genres + keywords + cast),
+        })
+    return pd.DataFrame(rows)
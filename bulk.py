@@ -0,0 +1,181 @@
+"""
+Bulk import and export of ratings and bookmarks.
+
+Imports read CSV (with a header row) or JSON lines, validate each row and
+hand them to database.bulk_import a batch at a time, which COPYs each batch
+into a staging table and merges it with ON CONFLICT. Exports stream
+COPY ... TO STDOUT. Neither side holds more than one batch in memory:
+
+    python -m bulk import ratings ratings.csv
+    python -m bulk import bookmarks bookmarks.jsonl --format jsonl
+    python -m bulk export ratings --format jsonl > ratings.jsonl
+    python -m bulk export bookmarks --user-id 42 --out bookmarks.csv
+
+Columns are user_id, movie_id, movie_title and rating (a number) or
+status ('to_watch' or 'watched'); other columns are ignored. The same API
+is served at /admin/import/{kind} and /admin/export/{kind}.
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import math
+import os
+import sys
+from itertools import islice
+
+import database as db
+import logger as app_logging
+from logger import get_logger
+
+# Initialize logger for bulk
+logger = get_logger("bulk")
+
+# Rows per COPY batch (and transaction) of an import
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 50000))
+
+FORMATS = ("csv", "jsonl")
+STATUSES = ("to_watch", "watched")
+# Ratings the UI can give (the slider on the movie page)
+MIN_RATING, MAX_RATING = 0, 10
+
+
+def _rating(value):
+    rating = float(value)
+    if not math.isfinite(rating):
+        raise ValueError(f"rating {value!r} is not a number")
+    if not MIN_RATING <= rating <= MAX_RATING:
+        raise ValueError(f"rating {value!r} is outside {MIN_RATING}-{MAX_RATING}")
+    return rating
+
+
+def _status(value):
+    if value not in STATUSES:
+        raise ValueError(f"status {value!r} is not one of {STATUSES}")
+    return value
+
+
+_VALUES = {"ratings": ("rating", _rating), "bookmarks": ("status", _status)}
+
+
+def _title(value):
+    if value is None:
+        raise ValueError("movie_title is missing")
+    return str(value)
+
+
+def read_rows(kind, fmt, lines, stats):
+    """
+    Validated (user_id, movie_id, movie_title, value) tuples from CSV or
+    JSONL text lines. Malformed rows are skipped and counted in
+    stats['rejected']; stats['read'] counts every row.
+    """
+    if kind not in _VALUES or fmt not in FORMATS:
+        raise ValueError(f"Unsupported bulk import: {kind} as {fmt}")
+    column, convert = _VALUES[kind]
+    stats.setdefault("read", 0)
+    stats.setdefault("rejected", 0)
+    records = csv.DictReader(lines) if fmt == "csv" else (line for line in lines if line.strip())
+    for record in records:
+        stats["read"] += 1
+        try:
+            if fmt == "jsonl":
+                record = json.loads(record)
+            yield (int(record["user_id"]), int(record["movie_id"]), _title(record["movie_title"]), convert(record[column]))
+        except (ValueError, TypeError, KeyError) as e:
+            stats["rejected"] += 1
+            if stats["rejected"] <= 10:
+                logger.warning(f"Skipping {kind} row {stats['read']}: {e!r}")
+
+
+def stream_lines(chunks, loop):
+    """
+    Text lines (with their newlines) of an async byte stream such as an
+    upload, for read_rows running in a worker thread: each chunk is awaited
+    on `loop`, so the upload is parsed while it is still arriving.
+    """
+    async def next_chunk():
+        return await chunks.__anext__()
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    while True:
+        try:
+            chunk = asyncio.run_coroutine_threadsafe(next_chunk(), loop).result()
+        except StopAsyncIteration:
+            break
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        yield from (line + "\n" for line in lines)
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def batches(rows, size=None):
+    """Lists of up to `size` rows, pulled from the (blocking) iterator in a thread."""
+    size = size or BULK_BATCH_SIZE
+    while True:
+        batch = await asyncio.to_thread(lambda: list(islice(rows, size)))
+        if not batch:
+            return
+        yield batch
+
+
+async def import_lines(kind, fmt, lines, batch_size=None, stats=None):
+    """
+    Import CSV/JSONL text lines into ratings or bookmarks; returns the counts.
+    Pass `stats` to read the counts so far if the import fails midway.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(read=0, rejected=0)
+    await db.bulk_import(kind, batches(read_rows(kind, fmt, lines, stats), batch_size), stats)
+    return stats
+
+
+async def _import_file(args):
+    with open(args.path, newline="", encoding="utf-8") if args.path != "-" else sys.stdin as f:
+        return await import_lines(args.kind, args.format, f, args.batch_size)
+
+
+async def _export_file(args):
+    with open(args.out, "wb") if args.out != "-" else sys.stdout.buffer as out:
+        async for block in db.bulk_export(args.kind, args.format, args.user_id):
+            out.write(block)
+
+
+async def _run(args):
+    if not await db.open_pool():
+        raise SystemExit("Could not connect to the database.")
+    try:
+        if args.command == "import":
+            stats = await _import_file(args)
+            print(", ".join(f"{key} {value}" for key, value in stats.items()), file=sys.stderr)
+        else:
+            await _export_file(args)
+    finally:
+        await db.close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import or export ratings and bookmarks with COPY.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("import", help="Merge a CSV/JSONL file into ratings or bookmarks")
+    load.add_argument("kind", choices=db.BULK_KINDS)
+    load.add_argument("path", help="Input file, or - for stdin")
+    load.add_argument("--format", choices=FORMATS, default="csv")
+    load.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="Rows per COPY batch")
+    dump = commands.add_parser("export", help="Write ratings or bookmarks to stdout")
+    dump.add_argument("kind", choices=db.BULK_KINDS)
+    dump.add_argument("--format", choices=FORMATS, default="csv")
+    dump.add_argument("--user-id", type=int, default=None, help="Only this user's rows")
+    dump.add_argument("--out", default="-", help="Output file, or - for stdout")
+    args = parser.parse_args()
+    if args.command == "export" and args.out == "-":
+        # Keep log lines out of the exported data
+        app_logging.c_handler.setStream(sys.stderr)
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
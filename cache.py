@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from logger import get_logger
+
+# Initialize logger for cache
+logger = get_logger("cache")
+
+# "memory" keeps a cache per worker process; "redis" shares one across workers
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", 2048))
+CACHE_TTL = float(os.getenv("CACHE_TTL", 600))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemoryCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL and hit/miss counters."""
+
+    def __init__(self, name, max_size=CACHE_MAX_SIZE, ttl=CACHE_TTL, clock=time.monotonic):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        """Cached value for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self)}
+
+
+class RedisCache:
+    """
+    Cache shared by every worker through Redis. Values are stored as JSON
+    with a TTL; a sorted set of last-access times provides LRU eviction and
+    lets clear() drop every entry at once. Redis errors count as misses.
+    """
+
+    def __init__(self, client, name, max_size=CACHE_MAX_SIZE, ttl=CACHE_TTL):
+        self.client = client
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lru_key = f"cache:{name}:lru"
+        self.hits = self.misses = self.evictions = 0
+
+    def _key(self, key):
+        return f"cache:{self.name}:{key}"
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self._key(key))
+            if raw is not None:
+                self.client.zadd(self._lru_key, {key: time.time()})
+                self.hits += 1
+                return json.loads(raw)
+        except Exception as e:
+            logger.warning(f"Cache '{self.name}' read failed: {e}")
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        try:
+            self.client.set(self._key(key), json.dumps(value), ex=max(1, int(self.ttl)))
+            self.client.zadd(self._lru_key, {key: time.time()})
+            overflow = self.client.zcard(self._lru_key) - self.max_size
+            if overflow > 0:
+                evicted = [member for member, _ in self.client.zpopmin(self._lru_key, overflow)]
+                self.client.delete(*[self._key(k.decode() if isinstance(k, bytes) else k) for k in evicted])
+                self.evictions += len(evicted)
+        except Exception as e:
+            logger.warning(f"Cache '{self.name}' write failed: {e}")
+
+    def delete(self, key):
+        try:
+            self.client.delete(self._key(key))
+            self.client.zrem(self._lru_key, key)
+        except Exception as e:
+            logger.warning(f"Cache '{self.name}' delete failed: {e}")
+
+    def clear(self):
+        try:
+            keys = self.client.zrange(self._lru_key, 0, -1)
+            self.client.delete(self._lru_key, *[self._key(k.decode() if isinstance(k, bytes) else k) for k in keys])
+        except Exception as e:
+            logger.warning(f"Cache '{self.name}' clear failed: {e}")
+
+    def __len__(self):
+        try:
+            return self.client.zcard(self._lru_key)
+        except Exception:
+            return 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self)}
+
+
+# Caches built by create_cache, reported on /metrics
+_caches = []
+
+
+def create_cache(name, backend=None, max_size=None, ttl=None):
+    """Build a cache for the configured backend, falling back to memory if Redis is unavailable."""
+    backend = (backend or CACHE_BACKEND).lower()
+    max_size, ttl = max_size or CACHE_MAX_SIZE, ttl or CACHE_TTL
+    cache = None
+    if backend == "redis":
+        try:
+            import redis
+            client = redis.Redis.from_url(REDIS_URL)
+            client.ping()
+            cache = RedisCache(client, name, max_size, ttl)
+        except Exception as e:
+            logger.error(f"Redis cache unavailable ({e}); using in-process cache for '{name}'.")
+    cache = cache or MemoryCache(name, max_size, ttl)
+    _caches.append(cache)
+    return cache
+
+
+def _collect_cache_metrics():
+    stats = [(cache.name, cache.stats()) for cache in _caches]
+    return [
+        (f"cache_{field}_total", "counter", f"Cache {field} in this worker", [({"cache": name}, s[field]) for name, s in stats])
+        for field in ("hits", "misses", "evictions")
+    ] + [("cache_entries", "gauge", "Entries currently cached", [({"cache": name}, s["size"]) for name, s in stats])]
+
+
+metrics.register_collector(_collect_cache_metrics)
@@ -0,0 +1,275 @@
+import ast
+import hashlib
+import math
+import random
+import weakref
+from datetime import datetime
+from functools import cached_property
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from search_index import BM25Index, SearchIndex
+
+# Fields stored as stringified lists in the raw movie data
+LIST_FIELDS = ('cast', 'crew', 'genres', 'keywords', 'production_companies')
+NUMERIC_FIELDS = ('budget', 'revenue', 'runtime', 'vote_average', 'vote_count', 'popularity')
+
+
+def get_poster_url(poster_path):
+    """Construct full TMDB image URL"""
+    if poster_path and isinstance(poster_path, str):
+        return f"https://image.tmdb.org/t/p/w500{poster_path}"
+    return "https://via.placeholder.com/500x750?text=No+Poster"
+
+
+def normalize_movie_record(details):
+    """Normalize a raw movie row (as a dict) into the shape the templates expect."""
+    # Ensure list fields are properly formatted
+    for field in LIST_FIELDS:
+        if field in details:
+            raw_value = details[field]
+
+            # Normalize to list
+            if not isinstance(raw_value, list):
+                if isinstance(raw_value, str) and raw_value:
+                    try:
+                        parsed = ast.literal_eval(raw_value)
+                        raw_value = parsed if isinstance(parsed, list) else [parsed]
+                    except Exception:
+                        # Keep original string so we don't lose info
+                        raw_value = [raw_value]
+                else:
+                    raw_value = []
+
+            # Extract names from dictionaries or convert to string
+            processed_items = []
+            for item in raw_value:
+                if isinstance(item, dict):
+                    # Try different keys: 'name', 'character', 'job', or first available value
+                    name = item.get('name') or item.get('character') or item.get('job')
+                    if not name and item:
+                        name = next((v for v in item.values() if v and isinstance(v, str)), None)
+                    if name:
+                        processed_items.append(str(name).strip())
+                elif item:
+                    processed_items.append(str(item).strip())
+
+            details[field] = [item for item in processed_items if item and item.strip()]
+        else:
+            details[field] = []
+
+    # Ensure overview is a string
+    overview_value = details.get('overview')
+    if overview_value is None or (isinstance(overview_value, float) and str(overview_value) == 'nan'):
+        details['overview'] = ""
+    else:
+        details['overview'] = str(overview_value)
+
+    # Handle numeric fields
+    for field in NUMERIC_FIELDS:
+        if field in details:
+            if isinstance(details[field], float) and math.isnan(details[field]):
+                details[field] = None
+            elif details[field] == 0 and field in ['budget', 'revenue']:
+                details[field] = None
+
+    # Release date formatting can stay as it's often needed in data, but purely UI strings should go
+    if 'release_date' in details and details['release_date']:
+        try:
+            if isinstance(details['release_date'], str):
+                date_obj = datetime.strptime(details['release_date'], '%Y-%m-%d')
+                details['year'] = str(date_obj.year)
+            else:
+                details['year'] = 'N/A'
+        except:
+            details['year'] = 'N/A'
+
+    details['poster_url'] = get_poster_url(details.get('poster_path'))
+    return details
+
+
+def _freeze(details):
+    """Turn a normalized record into a read-only mapping with tuple list fields."""
+    for field in LIST_FIELDS:
+        details[field] = tuple(details[field])
+    return MappingProxyType(details)
+
+
+def _thaw(record):
+    """Return a mutable copy of a frozen record, as get_movie_details always has."""
+    details = dict(record)
+    for field in LIST_FIELDS:
+        details[field] = list(details[field])
+    return details
+
+
+class MovieCatalog:
+    """
+    Movie data with every row normalized once up front.
+    Lookups by TMDB id or case-insensitive title are plain dict hits.
+    """
+
+    def __init__(self, df=None):
+        df = df if df is not None else pd.DataFrame()
+        self._store = None
+        rows = df.to_dict('records') if len(df) else []
+        self._records = tuple(_freeze(normalize_movie_record(row)) for row in rows)
+        # Raw keyword strings feed the keyword search tier
+        self._keyword_texts = df['keywords'].tolist() if 'keywords' in df.columns else None
+        self._index([r.get('id') for r in self._records], [r.get('title') for r in self._records])
+        self.version = catalog_fingerprint(self._records)
+
+    @classmethod
+    def from_store(cls, path, mmap=True):
+        """Open a columnar catalog written by catalog_store; records are decoded on access."""
+        from catalog_store import CatalogStore
+        store = CatalogStore(path, mmap=mmap)
+        catalog = cls.__new__(cls)
+        catalog._store = store
+        catalog._records = store.records
+        catalog._keyword_texts = store.column_values('__keywords_raw')
+        catalog._index(store.column_values('id'), store.column_values('title'))
+        catalog.version = store.manifest['version']
+        return catalog
+
+    def _index(self, ids, titles):
+        self._ids = ids
+        self._titles = titles
+
+        # First occurrence wins, matching the old boolean-mask + iloc[0] lookup
+        self._by_id = {}
+        self._by_title = {}
+        for pos, (movie_id, title) in enumerate(zip(ids, titles)):
+            if movie_id is not None and not (isinstance(movie_id, float) and math.isnan(movie_id)):
+                self._by_id.setdefault(int(movie_id), pos)
+            if isinstance(title, str):
+                self._by_title.setdefault(title.lower(), pos)
+
+        # Sorted id -> position arrays for batch lookups
+        self._id_keys = np.fromiter(self._by_id.keys(), dtype=np.int64, count=len(self._by_id))
+        self._id_positions = np.fromiter(self._by_id.values(), dtype=np.int64, count=len(self._by_id))
+        order = np.argsort(self._id_keys)
+        self._id_keys = self._id_keys[order]
+        self._id_positions = self._id_positions[order]
+
+    def __len__(self):
+        return len(self._records)
+
+    def position(self, identifier):
+        """Row position for a TMDB id (int) or title (str), or None."""
+        if isinstance(identifier, (int, np.integer)):
+            return self._by_id.get(int(identifier))
+        return self._by_title.get(str(identifier).lower())
+
+    def record(self, identifier):
+        """Read-only normalized record, or None if the movie is unknown."""
+        pos = self.position(identifier)
+        return self._records[pos] if pos is not None else None
+
+    def get(self, identifier):
+        """Mutable copy of the normalized record, or None if the movie is unknown."""
+        record = self.record(identifier)
+        return _thaw(record) if record is not None else None
+
+    def positions(self, movie_ids):
+        """Row positions for many TMDB ids at once; -1 where an id is unknown."""
+        ids = np.asarray(movie_ids, dtype=np.int64)
+        if not len(self._id_keys) or not len(ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        slots = np.minimum(np.searchsorted(self._id_keys, ids), len(self._id_keys) - 1)
+        return np.where(self._id_keys[slots] == ids, self._id_positions[slots], -1)
+
+    def ids_at(self, positions):
+        """TMDB ids of the movies at the given row positions."""
+        return [int(self._ids[pos]) for pos in positions]
+
+    def get_many(self, movie_ids):
+        """Mutable details for many TMDB ids, aligned with the input (None if unknown)."""
+        positions = self.positions(movie_ids).tolist()
+        if self._store is None:
+            return [_thaw(self._records[pos]) if pos >= 0 else None for pos in positions]
+        # Store-backed: decode the uncached records in bulk, a column at a time
+        records = iter(self._records.many([pos for pos in positions if pos >= 0]))
+        return [_thaw(next(records)) if pos >= 0 else None for pos in positions]
+
+    @cached_property
+    def search_index(self):
+        """Title/keyword search structures, built on first use."""
+        return SearchIndex(self._titles, self._keyword_texts)
+
+    @cached_property
+    def bm25_index(self):
+        """BM25 index over each movie's title, tags and overview, built on first use."""
+        texts = []
+        for title, tags, overview in zip(self._titles, self.column('tags'), self.column('overview')):
+            if isinstance(tags, (list, tuple)):
+                tags = " ".join(tags)
+            texts.append(" ".join(t for t in (title, tags, overview) if isinstance(t, str)))
+        return BM25Index(texts)
+
+    def column(self, name):
+        """One field's value for every movie, in catalog order (None where missing)."""
+        if self._store is not None:
+            values = self._store.column_values(name)
+            return values if values is not None else [None] * len(self)
+        return [record.get(name) for record in self._records]
+
+    @cached_property
+    def _popularity_order(self):
+        scores = np.array([
+            float(v) if isinstance(v, (int, float)) and not math.isnan(v) else -np.inf
+            for v in self.column('popularity')
+        ], dtype=np.float64)
+        return np.argsort(-scores, kind='stable')
+
+    def popular(self, n, exclude=()):
+        """Details of the n most popular movies, skipping the ids in `exclude`."""
+        results = []
+        for pos in self._popularity_order.tolist():
+            if len(results) >= n:
+                break
+            record = self._records[pos]
+            if record.get('id') not in exclude:
+                results.append(_thaw(record))
+        return results
+
+    def sample(self, n):
+        """Random selection of up to n movie details."""
+        positions = random.sample(range(len(self._records)), min(n, len(self._records)))
+        return [_thaw(self._records[pos]) for pos in positions]
+
+
+def catalog_fingerprint(records):
+    """
+    Content fingerprint over every field of every record: identical data yields
+    the same version in every worker, and any change (tags, overview, scores...)
+    yields a new one.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for record in records:
+        digest.update(f"{sorted(record.items(), key=lambda item: item[0])!r}\x1e".encode())
+    return digest.hexdigest()
+
+
+# Catalogs built by as_catalog, by id() of their DataFrame: (weak ref to the frame, catalog)
+_frame_catalogs = {}
+
+
+def as_catalog(data):
+    """
+    Accept either a MovieCatalog or a raw movie DataFrame. The catalog built
+    for a DataFrame is reused for as long as the frame lives, so only the
+    first call pays for normalizing every row; don't mutate a frame in place
+    after passing it here.
+    """
+    if isinstance(data, MovieCatalog):
+        return data
+    key = id(data)
+    entry = _frame_catalogs.get(key)
+    if entry is not None and entry[0]() is data:
+        return entry[1]
+    catalog = MovieCatalog(data)
+    _frame_catalogs[key] = (weakref.ref(data, lambda _, key=key: _frame_catalogs.pop(key, None)), catalog)
+    return catalog
@@ -0,0 +1,289 @@
+"""
+Columnar on-disk movie catalog.
+
+Each column of the normalized catalog is written as plain .npy arrays that
+can be memory-mapped, with list fields stored already parsed:
+
+    manifest.json               row count, catalog version, column kinds
+    <col>.nulls.npy             int8 per row: 0 value, 1 None, 2 NaN, 3 key absent
+    <col>.values.npy            int / float columns
+    <col>.offsets.npy           str / json columns: row -> byte range in <col>.data.npy
+    <col>.data.npy              str / json columns: UTF-8 bytes
+    <col>.items.npy             list columns: row -> item range in the item string table
+    <col>.item_offsets.npy      list columns: item -> byte range in <col>.item_data.npy
+    <col>.item_data.npy         list columns: UTF-8 bytes of every item
+
+Convert the pickled DataFrame with:
+
+    python -m catalog_store --src movie_list.pkl --out movie_catalog
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+from types import MappingProxyType
+
+import numpy as np
+
+from cache import MemoryCache
+from catalog import LIST_FIELDS, MovieCatalog
+from logger import get_logger
+
+# Initialize logger for catalog_store
+logger = get_logger("catalog_store")
+
+CATALOG_STORE_PATH = os.getenv("CATALOG_STORE_PATH", "movie_catalog")
+# Decoded records kept per process for hot movies
+RECORD_CACHE_SIZE = int(os.getenv("CATALOG_RECORD_CACHE_SIZE", 4096))
+FORMAT_VERSION = 1
+
+_VALUE, _NONE, _NAN, _ABSENT = 0, 1, 2, 3
+_MISSING = object()
+
+
+def _null_code(value):
+    if value is _MISSING:
+        return _ABSENT
+    if value is None:
+        return _NONE
+    if isinstance(value, float) and math.isnan(value):
+        return _NAN
+    return _VALUE
+
+
+def _column_kind(values):
+    present = [v for v in values if _null_code(v) == _VALUE]
+    if all(isinstance(v, (list, tuple)) and all(isinstance(i, str) for i in v) for v in present):
+        return "list" if present else "str"
+    if all(isinstance(v, str) for v in present):
+        return "str"
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return "int"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return "float"
+    return "json"
+
+
+def _string_table(strings):
+    encoded = [s.encode() for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return offsets, data
+
+
+def write_store(catalog, path=CATALOG_STORE_PATH):
+    """Write a MovieCatalog (or raw DataFrame) to `path` in the columnar format."""
+    if not isinstance(catalog, MovieCatalog):
+        catalog = MovieCatalog(catalog)
+    records = catalog._records
+    columns = {}
+    for record in records:
+        for key in record:
+            columns.setdefault(key, None)
+    columns = list(columns)
+
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    def save(name, array):
+        np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+
+    kinds = {}
+    raw_keywords = catalog._keyword_texts or [None] * len(records)
+    column_data = [(col, [r.get(col, _MISSING) for r in records]) for col in columns]
+    column_data.append(("__keywords_raw", list(raw_keywords)))
+    for index, (col, values) in enumerate(column_data):
+        kind = kinds[col] = _column_kind(values)
+        name = f"c{index}"
+        nulls = np.array([_null_code(v) for v in values], dtype=np.int8)
+        save(f"{name}.nulls", nulls)
+        present = [v if code == _VALUE else None for v, code in zip(values, nulls.tolist())]
+
+        if kind == "int":
+            save(f"{name}.values", np.array([v if v is not None else 0 for v in present], dtype=np.int64))
+        elif kind == "float":
+            save(f"{name}.values", np.array([v if v is not None else 0.0 for v in present], dtype=np.float64))
+        elif kind in ("str", "json"):
+            encode = (lambda v: v) if kind == "str" else json.dumps
+            offsets, data = _string_table([encode(v) if v is not None else "" for v in present])
+            save(f"{name}.offsets", offsets)
+            save(f"{name}.data", data)
+        else:
+            items = [list(v) if v is not None else [] for v in present]
+            item_ranges = np.zeros(len(items) + 1, dtype=np.int64)
+            np.cumsum([len(i) for i in items], out=item_ranges[1:])
+            offsets, data = _string_table([item for row in items for item in row])
+            save(f"{name}.items", item_ranges)
+            save(f"{name}.item_offsets", offsets)
+            save(f"{name}.item_data", data)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "rows": len(records),
+        "version": catalog.version,
+        "columns": [{"name": col, "file": f"c{i}", "kind": kinds[col]} for i, (col, _) in enumerate(column_data)],
+    }
+    with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    logger.info(f"Columnar catalog with {len(records)} movies written to {path}.")
+
+
+def store_exists(path=CATALOG_STORE_PATH):
+    return os.path.exists(os.path.join(path, "manifest.json"))
+
+
+class _Column:
+    def __init__(self, path, spec, mmap_mode):
+        self.name = spec["name"]
+        self.kind = spec["kind"]
+
+        def load(suffix):
+            array = np.load(os.path.join(path, f"{spec['file']}.{suffix}.npy"), mmap_mode=mmap_mode)
+            # A plain ndarray over the same mapping: np.memmap adds overhead to every index and slice
+            return array.view(np.ndarray)
+
+        self.nulls = load("nulls")
+        if self.kind in ("int", "float"):
+            self.values = load("values")
+        elif self.kind in ("str", "json"):
+            self.offsets, self.data = load("offsets"), load("data")
+        else:
+            self.items, self.offsets, self.data = load("items"), load("item_offsets"), load("item_data")
+        if self.kind not in ("int", "float"):
+            self._bytes = memoryview(self.data)
+
+    def _string(self, start, end):
+        return str(self._bytes[start:end], "utf-8")
+
+    def _finish(self, code, value):
+        if code == _VALUE:
+            return json.loads(value) if self.kind == "json" else value
+        if code == _ABSENT:
+            return _MISSING
+        return None if code == _NONE else float("nan")
+
+    def get(self, row):
+        """Value at row, or _MISSING if the record has no such key."""
+        code = int(self.nulls[row])
+        if code != _VALUE:
+            return self._finish(code, None)
+        if self.kind == "int":
+            return int(self.values[row])
+        if self.kind == "float":
+            return float(self.values[row])
+        if self.kind in ("str", "json"):
+            return self._finish(code, self._string(int(self.offsets[row]), int(self.offsets[row + 1])))
+        bounds = self.offsets[int(self.items[row]):int(self.items[row + 1]) + 1].tolist()
+        return [self._string(start, end) for start, end in zip(bounds, bounds[1:])]
+
+    def take(self, rows):
+        """Values at many rows (an int array), like get() for each but with one array read per field."""
+        codes = self.nulls[rows].tolist()
+        if self.kind in ("int", "float"):
+            values = self.values[rows].tolist()
+        elif self.kind in ("str", "json"):
+            values = [self._string(start, end) for start, end in zip(self.offsets[rows].tolist(), self.offsets[rows + 1].tolist())]
+        else:
+            firsts, counts = self.items[rows], self.items[rows + 1] - self.items[rows]
+            # Item indices of every requested row, back to back
+            items = np.repeat(firsts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            strings = iter([self._string(start, end) for start, end in zip(self.offsets[items].tolist(), self.offsets[items + 1].tolist())])
+            values = [[next(strings) for _ in range(count)] for count in counts.tolist()]
+        return [self._finish(code, value) for code, value in zip(codes, values)]
+
+    def tolist(self):
+        nulls = self.nulls.tolist()
+        if self.kind in ("int", "float"):
+            values = self.values.tolist()
+        elif self.kind == "str":
+            raw, offsets = bytes(self.data), self.offsets.tolist()
+            values = [raw[offsets[i]:offsets[i + 1]].decode() for i in range(len(nulls))]
+        else:
+            values = self.take(np.arange(len(nulls)))
+        return [v if code == _VALUE else (float("nan") if code == _NAN else None)
+                for v, code in zip(values, nulls)]
+
+
+class _Records:
+    """Sequence of read-only records decoded from the columns on access."""
+
+    def __init__(self, columns, rows):
+        self._columns = columns
+        self._rows = rows
+        # Decoded records of hot movies
+        self._cache = MemoryCache("catalog_records", max_size=RECORD_CACHE_SIZE, ttl=math.inf)
+
+    def __len__(self):
+        return self._rows
+
+    def __getitem__(self, row):
+        if not 0 <= row < self._rows:
+            raise IndexError(row)
+        record = self._cache.get(row)
+        if record is None:
+            record = self._build([column.get(row) for column in self._columns])
+            self._cache.set(row, record)
+        return record
+
+    def __iter__(self):
+        return (self[row] for row in range(self._rows))
+
+    def many(self, rows):
+        """Records at many row positions; the uncached ones are decoded a column at a time."""
+        records = [self._cache.get(row) for row in rows]
+        missing = [i for i, record in enumerate(records) if record is None]
+        if missing:
+            positions = np.array([rows[i] for i in missing], dtype=np.int64)
+            if positions.min() < 0 or positions.max() >= self._rows:
+                raise IndexError(positions)
+            columns = [column.take(positions) for column in self._columns]
+            for i, values in zip(missing, zip(*columns)):
+                records[i] = self._build(values)
+                self._cache.set(rows[i], records[i])
+        return records
+
+    def _build(self, values):
+        details = {}
+        for column, value in zip(self._columns, values):
+            if value is not _MISSING:
+                details[column.name] = tuple(value) if column.name in LIST_FIELDS else value
+        return MappingProxyType(details)
+
+
+class CatalogStore:
+    """Reader for a columnar catalog directory; arrays are memory-mapped by default."""
+
+    def __init__(self, path=CATALOG_STORE_PATH, mmap=True):
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog format {self.manifest.get('format')} in {path}")
+        mmap_mode = "r" if mmap else None
+        self._columns = {spec["name"]: _Column(path, spec, mmap_mode) for spec in self.manifest["columns"]}
+        record_columns = [c for name, c in self._columns.items() if not name.startswith("__")]
+        self.records = _Records(record_columns, self.manifest["rows"])
+
+    def column_values(self, name):
+        """Whole column as a Python list (None for missing values), or None if absent."""
+        column = self._columns.get(name)
+        return column.tolist() if column is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the pickled movie DataFrame to the columnar catalog format.")
+    parser.add_argument("--src", default="movie_list.pkl", help="joblib-pickled movie DataFrame")
+    parser.add_argument("--out", default=CATALOG_STORE_PATH, help="Output directory")
+    args = parser.parse_args()
+
+    import joblib
+    write_store(joblib.load(args.src), args.out)
+
+
+if __name__ == "__main__":
+    main()
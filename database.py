@@ -1,7 +1,18 @@
-from psycopg2 import pool
+import json
 import os
-import bcrypt
+import time
+from contextlib import asynccontextmanager
+
+import psycopg
 from dotenv import load_dotenv
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+
+import metrics
+import migrations
+import passwords
+import user_state
+import write_buffer
 from logger import get_logger
 
 # Initialize logger for database
@@ -9,231 +20,515 @@ logger = get_logger("database")
 
 load_dotenv()
 
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
-
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Use a connection pool for better performance
-def create_pool():
-    
+# Pool sizing; each worker process holds its own pool
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+# Seconds a request may wait for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", 5))
+
+db_pool = None
+
+def get_conninfo():
+    # Try DATABASE_URL first, but only if it looks complete
+    if DATABASE_URL and "@" in DATABASE_URL:
+        return DATABASE_URL
+
+    # Fallback to individual parameters
+    params = {
+        "dbname": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "host": os.getenv("DB_HOST"),
+        "port": os.getenv("DB_PORT"),
+    }
+    return make_conninfo(**{k: v for k, v in params.items() if v})
+
+# Use an asyncio connection pool so handlers await the database instead of
+# holding a worker thread
+async def open_pool():
+    global db_pool
+    conninfo = get_conninfo()
     try:
-        # Try DATABASE_URL first, but only if it looks complete
-        if DATABASE_URL and "@" in DATABASE_URL:
-            return pool.SimpleConnectionPool(1, 10, DATABASE_URL)
-        
-        # Fallback to individual parameters
-        return pool.SimpleConnectionPool(
-            1, 10,
-            database=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            host=os.getenv("DB_HOST"),
-            port=os.getenv("DB_PORT")
+        # Probe once so an unreachable server fails fast instead of retrying in the background
+        probe = await psycopg.AsyncConnection.connect(conninfo, connect_timeout=DB_CONNECT_TIMEOUT)
+        await probe.close()
+
+        pool = AsyncConnectionPool(
+            conninfo,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            timeout=DB_POOL_TIMEOUT,
+            open=False,
         )
+        await pool.open(wait=True, timeout=DB_POOL_TIMEOUT)
+        db_pool = pool
+        logger.info(f"Database pool opened (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE}).")
     except Exception as e:
         logger.error(f"Error creating connection pool: {e}")
-        return None
+        db_pool = None
+    return db_pool
 
-db_pool = create_pool()
-
-def get_connection():
+async def close_pool():
+    global db_pool
     if db_pool:
-        return db_pool.getconn()
-    return None
+        await db_pool.close()
+        db_pool = None
 
-def release_connection(conn):
-    if db_pool and conn:
-        db_pool.putconn(conn)
+@asynccontextmanager
+async def _connection():
+    """Check a connection out of the pool, recording how long the checkout waited."""
+    start = time.perf_counter()
+    async with db_pool.connection() as conn:
+        metrics.DB_POOL_WAIT.observe(time.perf_counter() - start)
+        yield conn
 
-def init_db():
-    conn = get_connection()
-    if not conn: return
-    try:
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-        """)
-        
-        # Bookmarks table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS bookmarks (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER NOT NULL REFERENCES users(id),
-            movie_id INTEGER NOT NULL,
-            movie_title TEXT NOT NULL,
-            status TEXT NOT NULL, -- 'to_watch', 'watched'
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, movie_id)
-        )
-        """)
-        
-        # Ratings table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS ratings (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER NOT NULL REFERENCES users(id),
-            movie_id INTEGER NOT NULL,
-            movie_title TEXT NOT NULL,
-            rating FLOAT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, movie_id)
-        )
-        """)
-        
-        conn.commit()
-        cursor.close()
-    finally:
-        release_connection(conn)
-
-def hash_password(password):
-    """Hash a password using bcrypt."""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode(), salt).decode()
-
-def add_user(username, password):
-    conn = get_connection()
-    if not conn: return False
+async def migrate(target=None):
+    """Bring the schema up to date (see migrations.py); returns the versions applied."""
+    if not db_pool: return []
+    async with _connection() as conn:
+        return await migrations.migrate(conn, target)
+
+@metrics.timed("db.add_user")
+async def add_user(username, password):
+    """Create a user; returns the new user id, or None on failure."""
+    if not db_pool: return None
+    # bcrypt is CPU-bound; it runs in the password pool (PasswordPoolBusy propagates as a 429)
+    hashed_pw = await passwords.hash_password_async(password)
     try:
-        cursor = conn.cursor()
-        hashed_pw = hash_password(password)
-        cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, hashed_pw))
-        conn.commit()
-        cursor.close()
-        return True
+        async with _connection() as conn:
+            cursor = await conn.execute(
+                "INSERT INTO users (username, password) VALUES (%s, %s) RETURNING id", (username, hashed_pw)
+            )
+            return (await cursor.fetchone())[0]
     except Exception as e:
         logger.error(f"Error adding user {username}: {e}")
-        return False
-    finally:
-        release_connection(conn)
-
-def verify_user(username, password):
-    conn = get_connection()
-    if not conn: return None
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, password FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        cursor.close()
-        
-        if user and bcrypt.checkpw(password.encode(), user[1].encode()):
-            return user[0]
         return None
-    finally:
-        release_connection(conn)
 
-def get_user_id(username):
-    conn = get_connection()
-    if not conn: return None
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        cursor.close()
+@metrics.timed("db.verify_user")
+async def verify_user(username, password):
+    if not db_pool: return None
+    async with _connection() as conn:
+        cursor = await conn.execute("SELECT id, password FROM users WHERE username = %s", (username,))
+        user = await cursor.fetchone()
+
+    if user and await passwords.verify_password(password, user[1]):
+        return user[0]
+    return None
+
+@metrics.timed("db.get_user_id")
+async def get_user_id(username):
+    if not db_pool: return None
+    async with _connection() as conn:
+        cursor = await conn.execute("SELECT id FROM users WHERE username = %s", (username,))
+        user = await cursor.fetchone()
         return user[0] if user else None
-    finally:
-        release_connection(conn)
 
-def add_bookmark(user_id, movie_id, movie_title, status):
-    conn = get_connection()
-    if not conn: return False
+@metrics.timed("db.add_bookmark")
+async def add_bookmark(user_id, movie_id, movie_title, status):
+    if not db_pool: return False
+    if write_buffer.WRITE_COALESCE_WINDOW > 0:
+        return await _buffered("bookmark", user_id, movie_id, movie_title, status)
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-        INSERT INTO bookmarks (user_id, movie_id, movie_title, status)
-        VALUES (%s, %s, %s, %s)
-        ON CONFLICT(user_id, movie_id) DO UPDATE SET status=EXCLUDED.status
-        """, (user_id, movie_id, movie_title, status))
-        conn.commit()
-        cursor.close()
+        async with _connection() as conn:
+            await conn.execute("""
+            INSERT INTO bookmarks (user_id, movie_id, movie_title, status)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT(user_id, movie_id) DO UPDATE SET status=EXCLUDED.status
+            """, (user_id, movie_id, movie_title, status))
+        user_state.invalidate(user_id)
         return True
     except Exception as e:
         logger.error(f"Error adding bookmark for user {user_id}, movie {movie_id}: {e}")
         return False
-    finally:
-        release_connection(conn)
 
-def remove_bookmark(user_id, movie_id):
-    conn = get_connection()
-    if not conn: return
-    try:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM bookmarks WHERE user_id = %s AND movie_id = %s", (user_id, movie_id))
-        conn.commit()
-        cursor.close()
-    finally:
-        release_connection(conn)
-
-def get_user_bookmarks(user_id):
-    conn = get_connection()
-    if not conn: return []
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT movie_id, movie_title, status FROM bookmarks WHERE user_id = %s", (user_id,))
-        rows = cursor.fetchall()
-        bookmarks = [{'movie_id': r[0], 'movie_title': r[1], 'status': r[2]} for r in rows]
-        cursor.close()
-        return bookmarks
-    finally:
-        release_connection(conn)
-
-def get_bookmark(user_id, movie_id):
-    conn = get_connection()
-    if not conn: return None
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT status FROM bookmarks WHERE user_id = %s AND movie_id = %s", (user_id, movie_id))
-        row = cursor.fetchone()
-        cursor.close()
+@metrics.timed("db.remove_bookmark")
+async def remove_bookmark(user_id, movie_id):
+    if not db_pool: return
+    if write_buffer.WRITE_COALESCE_WINDOW > 0:
+        # A removal coalesces with a bookmark of the same movie in the same batch
+        return await _buffered("bookmark", user_id, movie_id, None, None)
+    async with _connection() as conn:
+        await conn.execute("DELETE FROM bookmarks WHERE user_id = %s AND movie_id = %s", (user_id, movie_id))
+    user_state.invalidate(user_id)
+
+@metrics.timed("db.get_user_bookmarks")
+async def get_user_bookmarks(user_id):
+    """Every bookmark of a user; pages (get_user_bookmarks_page) or iter_user_bookmarks bound the memory instead."""
+    if not db_pool: return []
+    async with _connection() as conn:
+        cursor = await conn.execute("SELECT movie_id, movie_title, status FROM bookmarks WHERE user_id = %s", (user_id,))
+        rows = await cursor.fetchall()
+        return [{'movie_id': r[0], 'movie_title': r[1], 'status': r[2]} for r in rows]
+
+@metrics.timed("db.get_bookmark")
+async def get_bookmark(user_id, movie_id):
+    if not db_pool: return None
+    async with _connection() as conn:
+        cursor = await conn.execute("SELECT status FROM bookmarks WHERE user_id = %s AND movie_id = %s", (user_id, movie_id))
+        row = await cursor.fetchone()
         return row[0] if row else None
-    finally:
-        release_connection(conn)
 
-def add_rating(user_id, movie_id, movie_title, rating):
-    conn = get_connection()
-    if not conn: return False
+@metrics.timed("db.get_user_interactions")
+async def get_user_interactions(user_id):
+    """
+    Every movie a user rated or bookmarked, in one query.
+    Returns [{'movie_id', 'rating': float|None, 'status': str|None}].
+    """
+    if not db_pool: return []
+    async with _connection() as conn:
+        cursor = await conn.execute("""
+        SELECT COALESCE(r.movie_id, b.movie_id), r.rating, b.status
+        FROM (SELECT movie_id, rating FROM ratings WHERE user_id = %s) r
+        FULL OUTER JOIN (SELECT movie_id, status FROM bookmarks WHERE user_id = %s) b ON b.movie_id = r.movie_id
+        """, (user_id, user_id))
+        rows = await cursor.fetchall()
+        return [{'movie_id': r[0], 'rating': r[1], 'status': r[2]} for r in rows]
+
+async def get_user_state(user_id):
+    """
+    A user's bookmarks and ratings (a user_state.UserState), from the
+    per-user cache when it is current, else loaded with one query.
+    """
+    state = user_state.cached(user_id)
+    if state is not None:
+        return state
+    # Read the counter before loading so a write that lands meanwhile still invalidates the result
+    version = user_state.version(user_id)
+    rows = await get_user_interactions(user_id)
+    state = user_state.UserState.from_interactions(version, rows)
+    return user_state.store(user_id, state) if db_pool else state
+
+async def get_user_movie_states(user_id, movie_ids):
+    """
+    Bookmark status and rating of one or many movies for a user.
+    Returns {movie_id: {'status': str|None, 'rating': float|None}} for every
+    requested id: from the cached user state when it is current, else with
+    one query over just these ids.
+    """
+    movie_ids = list(dict.fromkeys(int(m) for m in movie_ids))
+    state = user_state.cached(user_id)
+    if state is not None:
+        return state.movie_states(movie_ids)
+    return await _get_user_movie_states(user_id, movie_ids)
+
+@metrics.timed("db.get_user_movie_states")
+async def _get_user_movie_states(user_id, movie_ids):
+    states = {m: {'status': None, 'rating': None} for m in movie_ids}
+    if not db_pool or not movie_ids: return states
+    async with _connection() as conn:
+        cursor = await conn.execute("""
+        SELECT m.movie_id, b.status, r.rating
+        FROM unnest(%s::int[]) AS m(movie_id)
+        LEFT JOIN bookmarks b ON b.user_id = %s AND b.movie_id = m.movie_id
+        LEFT JOIN ratings r ON r.user_id = %s AND r.movie_id = m.movie_id
+        """, (movie_ids, user_id, user_id))
+        for r in await cursor.fetchall():
+            states[r[0]] = {'status': r[1], 'rating': r[2]}
+    return states
+
+@metrics.timed("db.add_rating")
+async def add_rating(user_id, movie_id, movie_title, rating):
+    if not db_pool: return False
+    if write_buffer.WRITE_COALESCE_WINDOW > 0:
+        return await _buffered("rating", user_id, movie_id, movie_title, rating)
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-        INSERT INTO ratings (user_id, movie_id, movie_title, rating)
-        VALUES (%s, %s, %s, %s)
-        ON CONFLICT(user_id, movie_id) DO UPDATE SET rating=EXCLUDED.rating
-        """, (user_id, movie_id, movie_title, rating))
-        conn.commit()
-        cursor.close()
+        async with _connection() as conn:
+            await conn.execute("""
+            INSERT INTO ratings (user_id, movie_id, movie_title, rating)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT(user_id, movie_id) DO UPDATE SET rating=EXCLUDED.rating
+            """, (user_id, movie_id, movie_title, rating))
+        user_state.invalidate(user_id)
         return True
     except Exception as e:
         logger.error(f"Error adding rating for user {user_id}, movie {movie_id}: {e}")
         return False
-    finally:
-        release_connection(conn)
 
-def get_user_ratings(user_id):
-    conn = get_connection()
-    if not conn: return []
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT movie_id, movie_title, rating FROM ratings WHERE user_id = %s", (user_id,))
-        rows = cursor.fetchall()
-        ratings = [{'movie_id': r[0], 'movie_title': r[1], 'rating': r[2]} for r in rows]
-        cursor.close()
-        return ratings
-    finally:
-        release_connection(conn)
-
-def get_rating(user_id, movie_id):
-    conn = get_connection()
-    if not conn: return None
+@metrics.timed("db.write_batch")
+async def _write_batch(writes):
+    """
+    Apply a batch of coalesced writes in one transaction: multi-row upserts
+    of ratings and bookmarks, and one delete for removed bookmarks.
+    `writes` maps ("rating"|"bookmark", user_id, movie_id) to (movie_title, value);
+    a bookmark value of None removes it.
+    """
+    ratings = [(u, m, title, value) for (kind, u, m), (title, value) in writes.items() if kind == "rating"]
+    bookmarks = [(u, m, title, value) for (kind, u, m), (title, value) in writes.items() if kind == "bookmark" and value is not None]
+    removed = [(u, m) for (kind, u, m), (_, value) in writes.items() if kind == "bookmark" and value is None]
+    async with _connection() as conn:
+        async with conn.transaction():
+            if ratings:
+                await conn.execute("""
+                INSERT INTO ratings (user_id, movie_id, movie_title, rating)
+                SELECT * FROM unnest(%s::int[], %s::int[], %s::text[], %s::float8[])
+                ON CONFLICT(user_id, movie_id) DO UPDATE SET rating=EXCLUDED.rating
+                """, [list(column) for column in zip(*ratings)])
+            if bookmarks:
+                await conn.execute("""
+                INSERT INTO bookmarks (user_id, movie_id, movie_title, status)
+                SELECT * FROM unnest(%s::int[], %s::int[], %s::text[], %s::text[])
+                ON CONFLICT(user_id, movie_id) DO UPDATE SET status=EXCLUDED.status
+                """, [list(column) for column in zip(*bookmarks)])
+            if removed:
+                await conn.execute("""
+                DELETE FROM bookmarks b USING unnest(%s::int[], %s::int[]) AS r(user_id, movie_id)
+                WHERE b.user_id = r.user_id AND b.movie_id = r.movie_id
+                """, [list(column) for column in zip(*removed)])
+    for user_id in {u for _, u, _ in writes}:
+        user_state.invalidate(user_id)
+
+# Rating and bookmark writes are group-committed (see write_buffer)
+_writes = write_buffer.WriteBuffer(_write_batch)
+
+async def _buffered(kind, user_id, movie_id, movie_title, value):
+    """Queue one write for the next batch and wait for it to commit; False if it failed."""
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT rating FROM ratings WHERE user_id = %s AND movie_id = %s", (user_id, movie_id))
-        row = cursor.fetchone()
-        cursor.close()
+        key = (kind, int(user_id), int(movie_id))
+    except (TypeError, ValueError) as e:
+        logger.error(f"Invalid {kind} write for user {user_id}, movie {movie_id}: {e}")
+        return False
+    return await _writes.submit(key, (movie_title, value))
+
+async def flush_writes():
+    """Commit buffered rating/bookmark writes; the app calls this on shutdown before closing the pool."""
+    await _writes.flush()
+
+@metrics.timed("db.get_movie_stats")
+async def get_movie_stats(movie_ids):
+    """
+    Community stats of movies from the movie_stats aggregate table.
+    Returns {movie_id: {'rating_count', 'avg_rating': float|None, 'watched', 'to_watch'}}
+    for every requested id, zeros for movies nobody has rated or bookmarked.
+    """
+    movie_ids = list(dict.fromkeys(int(m) for m in movie_ids))
+    stats = {m: {'rating_count': 0, 'avg_rating': None, 'watched': 0, 'to_watch': 0} for m in movie_ids}
+    if not db_pool or not movie_ids: return stats
+    async with _connection() as conn:
+        cursor = await conn.execute("""
+        SELECT movie_id, rating_count, rating_sum / NULLIF(rating_count, 0), watched_count, to_watch_count
+        FROM movie_stats WHERE movie_id = ANY(%s)
+        """, (movie_ids,))
+        for r in await cursor.fetchall():
+            stats[r[0]] = {'rating_count': r[1], 'avg_rating': r[2], 'watched': r[3], 'to_watch': r[4]}
+    return stats
+
+@metrics.timed("db.get_user_ratings")
+async def get_user_ratings(user_id):
+    """Every rating of a user; pages (get_user_ratings_page) or iter_user_ratings bound the memory instead."""
+    if not db_pool: return []
+    async with _connection() as conn:
+        cursor = await conn.execute("SELECT movie_id, movie_title, rating FROM ratings WHERE user_id = %s", (user_id,))
+        rows = await cursor.fetchall()
+        return [{'movie_id': r[0], 'movie_title': r[1], 'rating': r[2]} for r in rows]
+
+@metrics.timed("db.get_rating")
+async def get_rating(user_id, movie_id):
+    if not db_pool: return None
+    async with _connection() as conn:
+        cursor = await conn.execute("SELECT rating FROM ratings WHERE user_id = %s AND movie_id = %s", (user_id, movie_id))
+        row = await cursor.fetchone()
         return row[0] if row else None
-    finally:
-        release_connection(conn)
+
+# The value column of each interaction table, its SQL type and its COPY type
+_INTERACTION_TABLES = {
+    "ratings": ("rating", "FLOAT", "float8"),
+    "bookmarks": ("status", "TEXT", "text"),
+}
+BULK_KINDS = tuple(_INTERACTION_TABLES)
+
+@metrics.timed("db.bulk_import")
+async def bulk_import(kind, batches, stats=None):
+    """
+    Merge batches of (user_id, movie_id, movie_title, value) rows into the
+    ratings or bookmarks table. Each batch is COPYed into a temporary staging
+    table and upserted with ON CONFLICT in its own transaction; the last row
+    for a (user_id, movie_id) pair wins, and rows of unknown users are skipped.
+    `batches` is an async iterable of lists. Returns {'staged', 'merged', 'skipped'};
+    pass `stats` to have them kept current there, so the counts of batches
+    committed before an error survive it.
+    """
+    column, sql_type, _ = _INTERACTION_TABLES[kind]
+    stats = stats if stats is not None else {}
+    stats.update(staged=0, merged=0, skipped=0)
+    if not db_pool: return stats
+    async with _connection() as conn:
+        async for batch in batches:
+            if not batch:
+                continue
+            async with conn.transaction():
+                await conn.execute(f"""
+                CREATE TEMP TABLE bulk_stage (
+                    seq BIGINT GENERATED ALWAYS AS IDENTITY,
+                    user_id INTEGER NOT NULL,
+                    movie_id INTEGER NOT NULL,
+                    movie_title TEXT NOT NULL,
+                    {column} {sql_type} NOT NULL
+                ) ON COMMIT DROP
+                """)
+                async with conn.cursor() as cur:
+                    async with cur.copy(f"COPY bulk_stage (user_id, movie_id, movie_title, {column}) FROM STDIN") as copy:
+                        for row in batch:
+                            await copy.write_row(row)
+                    await cur.execute(f"""
+                    INSERT INTO {kind} (user_id, movie_id, movie_title, {column})
+                    SELECT DISTINCT ON (s.user_id, s.movie_id) s.user_id, s.movie_id, s.movie_title, s.{column}
+                    FROM bulk_stage s JOIN users u ON u.id = s.user_id
+                    ORDER BY s.user_id, s.movie_id, s.seq DESC
+                    ON CONFLICT(user_id, movie_id) DO UPDATE SET {column}=EXCLUDED.{column}
+                    """)
+                    merged = cur.rowcount
+                    await cur.execute("""
+                    SELECT s.user_id, u.id IS NULL, count(*) FROM bulk_stage s
+                    LEFT JOIN users u ON u.id = s.user_id GROUP BY s.user_id, u.id
+                    """)
+                    users = await cur.fetchall()
+            stats["staged"] += len(batch)
+            stats["merged"] += merged
+            stats["skipped"] += sum(count for _, unknown, count in users if unknown)
+            for user_id, unknown, _ in users:
+                if not unknown:
+                    user_state.invalidate(user_id)
+    return stats
+
+async def bulk_export(kind, fmt="csv", user_id=None):
+    """
+    Stream the ratings or bookmarks table (optionally one user's rows) with
+    COPY ... TO STDOUT, yielding blocks of bytes: CSV with a header row, or
+    JSON lines. Rows are never collected in memory.
+    """
+    column, _, pg_type = _INTERACTION_TABLES[kind]
+    if not db_pool: return
+    where = "WHERE user_id = %s" if user_id is not None else ""
+    query = f"SELECT user_id, movie_id, movie_title, {column} FROM {kind} {where}"
+    params = (user_id,) if user_id is not None else None
+    async with _connection() as conn:
+        async with conn.cursor() as cur:
+            if fmt == "csv":
+                async with cur.copy(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", params) as copy:
+                    async for block in copy:
+                        yield bytes(block)
+                return
+            keys = ("user_id", "movie_id", "movie_title", column)
+            async with cur.copy(f"COPY ({query}) TO STDOUT", params) as copy:
+                copy.set_types(["int4", "int4", "text", pg_type])
+                lines = []
+                async for row in copy.rows():
+                    lines.append(json.dumps(dict(zip(keys, row))))
+                    if len(lines) >= 1000:
+                        yield ("\n".join(lines) + "\n").encode()
+                        lines = []
+                if lines:
+                    yield ("\n".join(lines) + "\n").encode()
+
+# Default page size of the paginated library queries
+LIBRARY_PAGE_SIZE = int(os.getenv("LIBRARY_PAGE_SIZE", 24))
+
+def _page_query(table, user_id, status=None, after=None, limit=LIBRARY_PAGE_SIZE):
+    """
+    SELECT for one keyset page of a user's bookmarks or ratings, newest
+    first. Fetches one extra row to tell whether another page follows;
+    limit=None selects every row.
+    """
+    values = "status, NULL::float AS rating" if table == "bookmarks" else "NULL::text AS status, rating"
+    where, params = ["user_id = %s"], [user_id]
+    if status is not None:
+        where.append("status = %s")
+        params.append(status)
+    if after is not None:
+        where.append("(created_at, id) < (%s, %s)")
+        params.extend(after)
+    query = f"""
+    SELECT id, movie_id, movie_title, {values}, created_at FROM {table}
+    WHERE {' AND '.join(where)}
+    ORDER BY created_at DESC, id DESC
+    """
+    if limit is not None:
+        query += "LIMIT %s"
+        params.append(limit + 1)
+    return query, params
+
+def _page(rows, limit):
+    """(rows as dicts, key of the next page or None) from a _page_query result."""
+    items = [{'movie_id': r[1], 'movie_title': r[2], 'status': r[3], 'rating': r[4]} for r in rows[:limit]]
+    return items, ((rows[limit - 1][5], rows[limit - 1][0]) if len(rows) > limit else None)
+
+@metrics.timed("db.get_user_bookmarks_page")
+async def get_user_bookmarks_page(user_id, status=None, after=None, limit=LIBRARY_PAGE_SIZE):
+    """
+    One page of a user's bookmarks (optionally of one status), newest first.
+    Returns ([{'movie_id', 'movie_title', 'status', 'rating': None}], next_key);
+    pass next_key as `after` for the following page. It is None on the last page.
+    """
+    if not db_pool: return [], None
+    query, params = _page_query("bookmarks", user_id, status, after, limit)
+    async with _connection() as conn:
+        cursor = await conn.execute(query, params)
+        return _page(await cursor.fetchall(), limit)
+
+@metrics.timed("db.get_user_ratings_page")
+async def get_user_ratings_page(user_id, after=None, limit=LIBRARY_PAGE_SIZE):
+    """One page of a user's ratings, newest first; like get_user_bookmarks_page."""
+    if not db_pool: return [], None
+    query, params = _page_query("ratings", user_id, None, after, limit)
+    async with _connection() as conn:
+        cursor = await conn.execute(query, params)
+        return _page(await cursor.fetchall(), limit)
+
+async def get_user_library(user_id, limit=LIBRARY_PAGE_SIZE):
+    """
+    The first page of each library section ('to_watch', 'watched', 'rated'):
+    {section: (rows, next_key)} as from the page functions. Only the bounded
+    pages are queried; when the user's state is cached they are kept on it,
+    so they are queried once per change of their library.
+    """
+    state = user_state.cached(user_id)
+    pages = state.library.get(limit) if state is not None else None
+    if pages is None:
+        pages = await _get_user_library(user_id, limit)
+        if state is not None and db_pool:
+            state.library[limit] = pages
+    return pages
+
+@metrics.timed("db.get_user_library")
+async def _get_user_library(user_id, limit):
+    """First page of every library section in one round trip."""
+    sections = {"to_watch": ("bookmarks", "to_watch"), "watched": ("bookmarks", "watched"), "rated": ("ratings", None)}
+    if not db_pool: return {section: ([], None) for section in sections}
+    queries, params = [], []
+    for section, (table, status) in sections.items():
+        query, section_params = _page_query(table, user_id, status, None, limit)
+        queries.append(f"(SELECT %s AS section, p.* FROM ({query}) p)")
+        params += [section, *section_params]
+    async with _connection() as conn:
+        cursor = await conn.execute(" UNION ALL ".join(queries), params)
+        rows = await cursor.fetchall()
+    return {section: _page([r[1:] for r in rows if r[0] == section], limit) for section in sections}
+
+async def _iter_rows(table, user_id, status, batch_size):
+    query, params = _page_query(table, user_id, status, limit=None)
+    async with _connection() as conn:
+        # A named cursor lives on the server: only batch_size rows are in memory at a time
+        async with conn.cursor(name=f"iter_{table}_{user_id}") as cursor:
+            cursor.itersize = batch_size
+            await cursor.execute(query, params)
+            async for r in cursor:
+                yield {'movie_id': r[1], 'movie_title': r[2], 'status': r[3], 'rating': r[4]}
+
+async def iter_user_bookmarks(user_id, status=None, batch_size=1000):
+    """
+    Yield every bookmark of a user, newest first, through a server-side
+    cursor fetching `batch_size` rows at a time; for batch jobs that must not
+    hold a whole history in memory.
+    """
+    if not db_pool: return
+    async for row in _iter_rows("bookmarks", user_id, status, batch_size):
+        yield row
+
+async def iter_user_ratings(user_id, batch_size=1000):
+    """Yield every rating of a user, newest first; like iter_user_bookmarks."""
+    if not db_pool: return
+    async for row in _iter_rows("ratings", user_id, None, batch_size):
+        yield row
@@ -1,9 +1,24 @@
-from fastapi import Request
+import hmac
+import os
+
+from fastapi import HTTPException, Request
 from fastapi.templating import Jinja2Templates
+import metrics
 import services
 
+# Shared secret for the /admin API (sent as the X-Admin-Token header); unset disables it
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+class TimedTemplates(Jinja2Templates):
+    """Jinja2Templates that records how long each page takes to render."""
+
+    def TemplateResponse(self, *args, **kwargs):
+        name = kwargs.get("name", args[1] if len(args) > 1 else "template")
+        with metrics.timer(metrics.STAGE_DURATION, f"render:{name}"):
+            return super().TemplateResponse(*args, **kwargs)
+
 # Centralized Template Engine
-templates = Jinja2Templates(directory="templates")
+templates = TimedTemplates(directory="templates")
 
 def jinja_format_number(value):
     """Jinja2 filter to format numbers with commas."""
@@ -27,13 +42,23 @@ def jinja_format_float(value, decimals=1):
 templates.env.filters["format_number"] = jinja_format_number
 templates.env.filters["format_float"] = jinja_format_float
 
-def get_df(request: Request):
-    """Dependency to get the movie dataframe from app state."""
-    return request.app.state.df
+def get_catalog(request: Request):
+    """Dependency to get the movie catalog from app state."""
+    return request.app.state.catalog
 
 def get_retriever(request: Request):
-    """Dependency to get the lazy-loaded retriever from app state."""
-    if request.app.state.retriever is None:
-        request.app.state.retriever = services.load_retriever()
-    return request.app.state.retriever
+    """Dependency to get the retriever, or None while it is still loading in the background."""
+    return request.app.state.retriever_loader.get()
+
+def get_neighbors(request: Request):
+    """Dependency to get the neighbor table published with the loaded index (None if it has none)."""
+    return request.app.state.retriever_loader.neighbors
+
+def is_admin_token(token):
+    """True if `token` is the configured admin token."""
+    return bool(ADMIN_TOKEN and token) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
 
+def require_admin(request: Request):
+    """Dependency guarding admin endpoints with the X-Admin-Token header."""
+    if not is_admin_token(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=401, detail="Unauthorized")
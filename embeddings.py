@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from logger import get_logger
+
+# Initialize logger for embeddings
+logger = get_logger("embeddings")
+
+# Backend selection: "endpoint" (HF Inference API), "local" (in-process
+# sentence-transformers) or "hashing" (dependency-free, fully offline)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "endpoint").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", 384))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 256))
+
+BACKENDS = ("endpoint", "local", "hashing")
+METADATA_FILE = "embedding.json"
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=200_000)
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic feature-hashing encoder over word unigrams and bigrams.
+    Needs no model files or network access, so the same text always maps
+    to the same vector in every process.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM, batch_size=EMBEDDING_BATCH_SIZE):
+        self.dim = dim
+        self.batch_size = batch_size
+
+    def _features(self, text):
+        tokens = _TOKEN_RE.findall(str(text).lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def encode(self, texts):
+        """Encode texts into an (n, dim) float32 matrix of unit vectors."""
+        texts = list(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            rows, cols, signs = [], [], []
+            for offset, text in enumerate(texts[start:start + self.batch_size]):
+                for feature in self._features(text):
+                    h = _token_hash(feature)
+                    rows.append(start + offset)
+                    cols.append(h % self.dim)
+                    signs.append(1.0 if (h >> 63) & 1 else -1.0)
+            if rows:
+                np.add.at(out, (np.array(rows), np.array(cols)), np.array(signs, dtype=np.float32))
+
+        # Sublinear term frequency, then L2 normalize
+        out = np.sign(out) * np.log1p(np.abs(out))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+
+def get_embeddings(backend=None):
+    """Return the embedding model for the configured (or given) backend."""
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    logger.info(f"Using '{backend}' embedding backend.")
+    if backend == "hashing":
+        return HashingEmbeddings()
+    if backend == "local":
+        try:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            return HuggingFaceEmbeddings(
+                model_name=EMBEDDING_MODEL,
+                model_kwargs={"device": "cpu"},
+                encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE, "normalize_embeddings": True},
+            )
+        except ImportError as e:
+            raise RuntimeError("EMBEDDING_BACKEND=local requires the sentence-transformers package") from e
+    if backend == "endpoint":
+        from langchain_huggingface import HuggingFaceEndpointEmbeddings
+        return HuggingFaceEndpointEmbeddings(model=EMBEDDING_MODEL)
+    raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of {BACKENDS}.")
+
+
+def describe_backend(backend=None):
+    """
+    Identity of the vectors a backend produces, stored next to an index so
+    mismatches can be detected. The endpoint and local backends run the same
+    sentence-transformers model, so their indexes are interchangeable.
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "hashing":
+        return {"encoder": "hashing", "dim": EMBEDDING_DIM}
+    return {"encoder": EMBEDDING_MODEL}
+
+
+def save_index_metadata(path, backend=None):
+    with open(os.path.join(path, METADATA_FILE), "w") as f:
+        json.dump(describe_backend(backend), f)
+
+
+def index_matches_backend(path, backend=None):
+    """
+    True if the index at `path` holds vectors from the given backend.
+    Indexes without metadata predate this file and were built by the endpoint backend.
+    """
+    try:
+        with open(os.path.join(path, METADATA_FILE)) as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        saved = describe_backend("endpoint")
+    return saved == describe_backend(backend)
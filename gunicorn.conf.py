@@ -0,0 +1,27 @@
+"""
+Gunicorn settings.
+
+The app is preloaded in the master, which loads the catalog, neighbor table
+and FAISS index once before forking. Workers inherit those structures
+copy-on-write, and the memory-mapped catalog and index files are shared
+through the page cache, so adding workers adds little memory.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    import services
+    services.preload_shared_resources()
+    # Keep the collector from touching preloaded objects, which would
+    # copy their pages into every worker
+    gc.freeze()
@@ -0,0 +1,214 @@
+"""
+Incremental FAISS index maintenance.
+
+Each saved index is a versioned directory, and the index path is a symlink
+to the current one, so a new version is published with a single atomic
+rename and running workers can pick it up without a restart:
+
+    movie_recommendation_faiss -> movie_recommendation_faiss.versions/20260101T120000-1a2b3c
+    movie_recommendation_faiss.versions/
+
+A version holds the index files and, when built, the neighbor table
+computed from that index (see neighbors), so the two are always swapped in
+together.
+
+Sync the index with the catalog, embedding only new or changed movies:
+
+    python -m indexer
+"""
+import argparse
+import os
+import re
+import shutil
+import time
+import uuid
+
+import faiss
+import numpy as np
+
+from logger import get_logger
+
+# Initialize logger for indexer
+logger = get_logger("indexer")
+
+FAISS_PATH = os.getenv("FAISS_PATH", "movie_recommendation_faiss")
+# Published index versions kept on disk, including the current one
+INDEX_VERSIONS_KEPT = int(os.getenv("INDEX_VERSIONS_KEPT", 2))
+# faiss index_factory spec for new indexes, e.g. "Flat", "IVF1024,Flat", "HNSW32", "IVF1024,PQ48"
+FAISS_INDEX_SPEC = os.getenv("FAISS_INDEX_SPEC", "Flat")
+# Search-time accuracy/speed knobs for IVF and HNSW indexes
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", 16))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", 64))
+
+
+def _versions_dir(path):
+    return f"{os.path.normpath(path)}.versions"
+
+
+def _fit_spec(spec, n):
+    # k-means wants ~39 training points per IVF list; shrink the list count for small catalogs
+    nlist = max(1, n // 39)
+    fitted = re.sub(r"IVF(\d+)", lambda m: f"IVF{min(int(m.group(1)), nlist)}", spec)
+    if fitted != spec:
+        logger.warning(f"Index spec '{spec}' is too coarse for {n} vectors; using '{fitted}'.")
+    return fitted
+
+
+def new_index(vectors, spec=None):
+    """
+    Empty, trained FAISS index for vectors like `vectors`, from a faiss
+    index_factory spec. IVF indexes keep a direct map so stored vectors can
+    still be reconstructed by position.
+    """
+    spec = spec or FAISS_INDEX_SPEC
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = faiss.index_factory(vectors.shape[1], _fit_spec(spec, len(vectors)))
+    if not index.is_trained:
+        index.train(vectors)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return tune_index(index)
+
+
+def tune_index(index, nprobe=None, ef_search=None):
+    """Apply the search-time nprobe (IVF) / efSearch (HNSW) settings to an index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe or FAISS_NPROBE
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search or FAISS_EF_SEARCH
+    return index
+
+
+def index_version(path=FAISS_PATH):
+    """Identity of the index file currently published at `path`, or None if there is none."""
+    try:
+        stat = os.stat(os.path.join(path, "index.faiss"))
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def new_index_dir(path=FAISS_PATH):
+    """Empty directory to build the next version of the index at `path` in."""
+    build_dir = os.path.join(_versions_dir(path), f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}")
+    os.makedirs(build_dir)
+    return build_dir
+
+
+def publish_index(build_dir, path=FAISS_PATH):
+    """Atomically point `path` at `build_dir`, then prune old versions."""
+    path = os.path.normpath(path)
+    versions = _versions_dir(path)
+    if os.path.isdir(path) and not os.path.islink(path):
+        # One-time move of a plain index directory into the versioned layout
+        os.replace(path, os.path.join(versions, f"legacy-{uuid.uuid4().hex[:6]}"))
+
+    link = f"{path}.tmp-link"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.relpath(build_dir, os.path.dirname(os.path.abspath(path))), link)
+    os.replace(link, path)
+    logger.info(f"Published index version {os.path.basename(build_dir)} at {path}.")
+
+    current = os.path.realpath(path)
+    old = sorted(
+        (os.path.join(versions, name) for name in os.listdir(versions)),
+        key=os.path.getmtime, reverse=True,
+    )
+    for version_dir in [d for d in old if os.path.realpath(d) != current][max(INDEX_VERSIONS_KEPT - 1, 0):]:
+        shutil.rmtree(version_dir, ignore_errors=True)
+
+
+def sync_faiss_index(catalog, path=FAISS_PATH, backend=None, neighbors_k=None):
+    """
+    Bring the index at `path` in line with the catalog: movies that are new or
+    whose text or title changed are embedded and added, deleted or outdated
+    entries are removed, and the result is published as a new version, with a
+    fresh neighbor table when `neighbors_k` is set.
+    Falls back to a full build when there is no index or it came from another
+    embedding backend. Returns counts of embedded, removed and unchanged movies.
+    """
+    import services
+    from embeddings import get_embeddings, index_matches_backend, save_index_metadata
+    from neighbors import build_neighbor_table, neighbors_path, publish_neighbor_table
+
+    documents = {}
+    for doc in services.movie_documents(catalog):
+        documents.setdefault(doc.metadata['id'], doc)
+
+    if index_version(path) is None or not index_matches_backend(path, backend):
+        logger.info(f"No compatible index at {path}; building it from scratch.")
+        if services.create_faiss_index(catalog, path, backend, neighbors_k=neighbors_k) is None:
+            raise RuntimeError(f"Could not build the FAISS index at {path}")
+        return {"embedded": len(catalog), "removed": 0, "unchanged": 0}
+
+    # Load into memory (not mapped) so entries can be removed and added
+    vectorstore = services.load_vectorstore(path, get_embeddings(backend), mmap=False)
+    # Only flat indexes renumber their entries on removal the way the docstore mapping expects
+    removable = isinstance(vectorstore.index, faiss.IndexFlat)
+    kept, stale = set(), []
+    for docstore_id in vectorstore.index_to_docstore_id.values():
+        doc = vectorstore.docstore.search(docstore_id)
+        movie_id = int(doc.metadata['id'])
+        wanted = documents.get(movie_id)
+        if (wanted is not None and movie_id not in kept and wanted.page_content == doc.page_content
+                and wanted.metadata['title'] == doc.metadata['title']):
+            kept.add(movie_id)
+        else:
+            stale.append(docstore_id)
+
+    fresh = [doc for movie_id, doc in documents.items() if movie_id not in kept]
+    stats = {"embedded": len(fresh), "removed": len(stale), "unchanged": len(kept)}
+    if not fresh and not stale:
+        logger.info(f"Index at {path} is up to date ({len(kept)} movies).")
+        if neighbors_k:
+            publish_neighbor_table(path, neighbors_k, backend)
+        return stats
+
+    if stale and not removable:
+        logger.info(f"{type(vectorstore.index).__name__} can't drop entries in place; rebuilding the index.")
+        if services.create_faiss_index(catalog, path, backend, neighbors_k=neighbors_k) is None:
+            raise RuntimeError(f"Could not build the FAISS index at {path}")
+        return {"embedded": len(catalog), "removed": stats["removed"], "unchanged": 0}
+
+    if stale:
+        vectorstore.delete(stale)
+    if fresh:
+        vectorstore.add_documents(fresh)
+    build_dir = new_index_dir(path)
+    vectorstore.save_local(build_dir)
+    save_index_metadata(build_dir, backend)
+    if neighbors_k:
+        build_neighbor_table(vectorstore, neighbors_path(build_dir), neighbors_k)
+    publish_index(build_dir, path)
+    logger.info(f"Index synced: {stats['embedded']} embedded, {stats['removed']} removed, {stats['unchanged']} unchanged.")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the FAISS index with the movie catalog, embedding only changes.")
+    parser.add_argument("--index", default=FAISS_PATH, help="FAISS index path")
+    parser.add_argument("--backend", default=None, help="Embedding backend (defaults to EMBEDDING_BACKEND)")
+    parser.add_argument("--neighbors", action="store_true", help="Publish a fresh neighbor table with the index")
+    parser.add_argument("--rebuild", action="store_true", help="Build the whole index from scratch")
+    parser.add_argument("--spec", default=None, help="Index spec for --rebuild (defaults to FAISS_INDEX_SPEC)")
+    args = parser.parse_args()
+
+    import services
+    from neighbors import NEIGHBORS_K
+    catalog = services.load_movie_data()
+    if not len(catalog):
+        raise SystemExit("The movie catalog is empty.")
+    neighbors_k = NEIGHBORS_K if args.neighbors else None
+    if args.rebuild:
+        if services.create_faiss_index(catalog, args.index, args.backend, spec=args.spec, neighbors_k=neighbors_k) is None:
+            raise SystemExit("Could not build the FAISS index.")
+    else:
+        stats = sync_faiss_index(catalog, args.index, args.backend, neighbors_k)
+        print(f"embedded {stats['embedded']}, removed {stats['removed']}, unchanged {stats['unchanged']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,19 @@ from contextlib import asynccontextmanager
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 
 import database as db
+import metrics
+import passwords
+import profiling
 import services
+from dependencies import templates
 from logger import get_logger
-from routers import auth, movies, users
+from routers import admin, auth, movies, users
 
 # Suppress unnecessary logs but don't ignore warnings globally
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
@@ -34,19 +39,34 @@ async def lifespan(app: FastAPI):
 
     # Database initialization
     logger.info("Initializing Database...")
-    db.init_db()
+    await db.open_pool()
+    await db.migrate()
 
-    # Load basic data on startup
+    # Load basic data on startup, reusing what the gunicorn master preloaded
     logger.info("Initializing Movie Recommendation System...")
-    app.state.df = services.load_movie_data()
-    
-    # Lazy load retriever later
-    app.state.retriever = None
+    shared = services.shared_resources
+    app.state.catalog = shared['catalog'] if 'catalog' in shared else services.load_movie_data()
+
+    # Load the retriever and its neighbor table in the background (single-flight)
+    # unless they were preloaded; until then, recommendations fall back to popular movies
+    if shared.get('retriever') is not None:
+        app.state.retriever_loader = services.RetrieverLoader.loaded(
+            shared['retriever'], neighbors=shared['neighbors'], version=shared['index_version']
+        )
+    elif len(app.state.catalog):
+        app.state.retriever_loader = services.RetrieverLoader().start()
+    else:
+        # No movies, so nothing to index or recommend
+        app.state.retriever_loader = services.RetrieverLoader()
     
     yield
     
     # Clean up resources if needed
     logger.info("Shutting down Movie Recommendation System...")
+    # Commit buffered bookmark/rating writes before the pool goes away
+    await db.flush_writes()
+    await db.close_pool()
+    passwords.shutdown()
 
 app = FastAPI(title="Movie Recommendation System", lifespan=lifespan)
 
@@ -59,6 +79,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Profiles sampled requests (PROFILE_SAMPLE_RATE) or ones sent with the admin token in X-Profile
+app.add_middleware(profiling.ProfilingMiddleware)
+# Outermost, so request timings cover every other middleware too
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Static Files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -67,6 +91,61 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 app.include_router(auth.router)
 app.include_router(movies.router)
 app.include_router(users.router)
+app.include_router(admin.router)
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz(request: Request):
+    """Readiness: 200 once the catalog is loaded and the recommendation index has warmed."""
+    loader = request.app.state.retriever_loader
+    loader.check_for_update()
+    checks = {
+        "catalog": len(request.app.state.catalog),
+        "retriever": loader.state,
+        "neighbors": loader.neighbors is not None,
+        "database": db.db_pool is not None,
+    }
+    if loader.error:
+        checks["retriever_error"] = loader.error
+    ready = checks["catalog"] > 0 and loader.ready
+    status = "ready" if ready else ("unavailable" if loader.state == "failed" else "starting")
+    return JSONResponse({"status": status, "checks": checks}, status_code=200 if ready else 503)
+
+@app.exception_handler(passwords.PasswordPoolBusy)
+async def password_pool_busy(request: Request, exc: passwords.PasswordPoolBusy):
+    """Shed login/signup load once the password pool is full instead of queueing without bound."""
+    logger.warning(f"Password pool full; rejecting {request.method} {request.url.path} ({exc}).")
+    page = "signup.html" if request.url.path == "/signup" else "login.html"
+    return templates.TemplateResponse(
+        request=request,
+        name=page,
+        context={"error": "Too many sign-in attempts right now. Please try again in a moment."},
+        status_code=429,
+        headers={"Retry-After": "1"},
+    )
+
+def _collect_app_metrics():
+    loader = getattr(app.state, "retriever_loader", None)
+    samples = [("retriever_ready", "gauge", "1 once the FAISS retriever is loaded in this worker",
+                [({}, int(loader is not None and loader.ready))])]
+    if db.db_pool is not None:
+        stats = db.db_pool.get_stats()
+        samples += [
+            (f"db_pool_{key}", "gauge", f"Connection pool {key.replace('_', ' ')}", [({}, stats.get(key, 0))])
+            for key in ("pool_size", "pool_available", "requests_waiting")
+        ]
+    return samples
+
+metrics.register_collector(_collect_app_metrics)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics for the worker serving the scrape."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
@@ -0,0 +1,224 @@
+"""
+Versioned database migrations.
+
+Each migration is a numbered list of statements applied once, in order, in
+its own transaction, and recorded in the schema_migrations table. Workers
+starting together serialize on an advisory lock, so each migration runs
+exactly once however many processes call migrate(). Add a migration by
+appending to MIGRATIONS; never edit one that has shipped.
+
+    python -m migrations            # apply pending migrations
+    python -m migrations --status   # list applied and pending versions
+"""
+import argparse
+import asyncio
+
+from logger import get_logger
+
+# Initialize logger for migrations
+logger = get_logger("migrations")
+
+# Advisory lock key held while migrating
+_LOCK_KEY = 4242_0001
+
+_MOVIE_STATS_RATINGS = """
+CREATE OR REPLACE FUNCTION movie_stats_ratings() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    -- Per-statement deltas from the transition tables, applied in movie_id order to avoid deadlocks
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO movie_stats AS s (movie_id, rating_count, rating_sum)
+        SELECT movie_id, count(*), sum(rating) FROM new_rows GROUP BY movie_id ORDER BY movie_id
+        ON CONFLICT (movie_id) DO UPDATE SET
+            rating_count = s.rating_count + EXCLUDED.rating_count, rating_sum = s.rating_sum + EXCLUDED.rating_sum;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO movie_stats AS s (movie_id, rating_count, rating_sum)
+        SELECT movie_id, sum(n), sum(total) FROM (
+            SELECT movie_id, 1 AS n, rating AS total FROM new_rows
+            UNION ALL SELECT movie_id, -1, -rating FROM old_rows
+        ) d GROUP BY movie_id ORDER BY movie_id
+        ON CONFLICT (movie_id) DO UPDATE SET
+            rating_count = s.rating_count + EXCLUDED.rating_count, rating_sum = s.rating_sum + EXCLUDED.rating_sum;
+    ELSE
+        UPDATE movie_stats s SET rating_count = s.rating_count - d.n, rating_sum = s.rating_sum - d.total
+        FROM (SELECT movie_id, count(*) AS n, sum(rating) AS total FROM old_rows GROUP BY movie_id ORDER BY movie_id) d
+        WHERE s.movie_id = d.movie_id;
+    END IF;
+    RETURN NULL;
+END $$
+"""
+
+_MOVIE_STATS_BOOKMARKS = """
+CREATE OR REPLACE FUNCTION movie_stats_bookmarks() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO movie_stats AS s (movie_id, watched_count, to_watch_count)
+        SELECT movie_id, count(*) FILTER (WHERE status = 'watched'), count(*) FILTER (WHERE status = 'to_watch')
+        FROM new_rows GROUP BY movie_id ORDER BY movie_id
+        ON CONFLICT (movie_id) DO UPDATE SET
+            watched_count = s.watched_count + EXCLUDED.watched_count,
+            to_watch_count = s.to_watch_count + EXCLUDED.to_watch_count;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO movie_stats AS s (movie_id, watched_count, to_watch_count)
+        SELECT movie_id, sum(watched), sum(to_watch) FROM (
+            SELECT movie_id, (status = 'watched')::int AS watched, (status = 'to_watch')::int AS to_watch FROM new_rows
+            UNION ALL SELECT movie_id, -(status = 'watched')::int, -(status = 'to_watch')::int FROM old_rows
+        ) d GROUP BY movie_id ORDER BY movie_id
+        ON CONFLICT (movie_id) DO UPDATE SET
+            watched_count = s.watched_count + EXCLUDED.watched_count,
+            to_watch_count = s.to_watch_count + EXCLUDED.to_watch_count;
+    ELSE
+        UPDATE movie_stats s SET watched_count = s.watched_count - d.watched, to_watch_count = s.to_watch_count - d.to_watch
+        FROM (
+            SELECT movie_id, count(*) FILTER (WHERE status = 'watched') AS watched,
+                   count(*) FILTER (WHERE status = 'to_watch') AS to_watch
+            FROM old_rows GROUP BY movie_id ORDER BY movie_id
+        ) d
+        WHERE s.movie_id = d.movie_id;
+    END IF;
+    RETURN NULL;
+END $$
+"""
+
+# (version, description, statements); append only
+MIGRATIONS = [
+    (1, "users, bookmarks and ratings tables", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS bookmarks (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            movie_id INTEGER NOT NULL,
+            movie_title TEXT NOT NULL,
+            status TEXT NOT NULL, -- 'to_watch', 'watched'
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, movie_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS ratings (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            movie_id INTEGER NOT NULL,
+            movie_title TEXT NOT NULL,
+            rating FLOAT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, movie_id)
+        )
+        """,
+    ]),
+    (2, "covering indexes for recent-first library pages and per-movie scans", [
+        # Replaces the plain keyset indexes init_db used to create
+        "DROP INDEX IF EXISTS bookmarks_user_created_idx",
+        "DROP INDEX IF EXISTS bookmarks_user_status_created_idx",
+        "DROP INDEX IF EXISTS ratings_user_created_idx",
+        "CREATE INDEX IF NOT EXISTS bookmarks_user_recent_idx ON bookmarks (user_id, created_at DESC, id DESC) INCLUDE (movie_id, movie_title, status)",
+        "CREATE INDEX IF NOT EXISTS bookmarks_user_status_recent_idx ON bookmarks (user_id, status, created_at DESC, id DESC) INCLUDE (movie_id, movie_title)",
+        "CREATE INDEX IF NOT EXISTS ratings_user_recent_idx ON ratings (user_id, created_at DESC, id DESC) INCLUDE (movie_id, movie_title, rating)",
+        "CREATE INDEX IF NOT EXISTS bookmarks_movie_idx ON bookmarks (movie_id) INCLUDE (status)",
+        "CREATE INDEX IF NOT EXISTS ratings_movie_idx ON ratings (movie_id) INCLUDE (rating)",
+    ]),
+    (3, "movie_stats aggregate table kept current by statement triggers", [
+        # Hold off writers so no row lands between the backfill and the triggers
+        "LOCK TABLE ratings, bookmarks IN SHARE ROW EXCLUSIVE MODE",
+        """
+        CREATE TABLE movie_stats (
+            movie_id INTEGER PRIMARY KEY,
+            rating_count BIGINT NOT NULL DEFAULT 0,
+            rating_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            watched_count BIGINT NOT NULL DEFAULT 0,
+            to_watch_count BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        INSERT INTO movie_stats (movie_id, rating_count, rating_sum, watched_count, to_watch_count)
+        SELECT COALESCE(r.movie_id, b.movie_id), COALESCE(r.n, 0), COALESCE(r.total, 0),
+               COALESCE(b.watched, 0), COALESCE(b.to_watch, 0)
+        FROM (SELECT movie_id, count(*) AS n, sum(rating) AS total FROM ratings GROUP BY movie_id) r
+        FULL OUTER JOIN (
+            SELECT movie_id, count(*) FILTER (WHERE status = 'watched') AS watched,
+                   count(*) FILTER (WHERE status = 'to_watch') AS to_watch
+            FROM bookmarks GROUP BY movie_id
+        ) b ON b.movie_id = r.movie_id
+        """,
+        _MOVIE_STATS_RATINGS,
+        _MOVIE_STATS_BOOKMARKS,
+        # Transition tables allow one event per trigger, so each table gets three
+        "CREATE TRIGGER ratings_stats_insert AFTER INSERT ON ratings REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION movie_stats_ratings()",
+        "CREATE TRIGGER ratings_stats_update AFTER UPDATE ON ratings REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION movie_stats_ratings()",
+        "CREATE TRIGGER ratings_stats_delete AFTER DELETE ON ratings REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION movie_stats_ratings()",
+        "CREATE TRIGGER bookmarks_stats_insert AFTER INSERT ON bookmarks REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION movie_stats_bookmarks()",
+        "CREATE TRIGGER bookmarks_stats_update AFTER UPDATE ON bookmarks REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION movie_stats_bookmarks()",
+        "CREATE TRIGGER bookmarks_stats_delete AFTER DELETE ON bookmarks REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION movie_stats_bookmarks()",
+    ]),
+]
+
+
+async def applied_versions(conn):
+    """Versions already recorded in schema_migrations."""
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor = await conn.execute("SELECT version FROM schema_migrations")
+    return {r[0] for r in await cursor.fetchall()}
+
+
+async def migrate(conn, target=None):
+    """
+    Apply every pending migration up to `target` (default: all) on an open
+    psycopg AsyncConnection. Returns the versions applied by this call.
+    """
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock(%s)", (_LOCK_KEY,))
+            if version in await applied_versions(conn):
+                continue
+            for statement in statements:
+                await conn.execute(statement)
+            await conn.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)", (version, description)
+            )
+        logger.info(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+
+async def _run(args):
+    import database as db
+    if not await db.open_pool():
+        raise SystemExit("Could not connect to the database.")
+    try:
+        async with db._connection() as conn:
+            if args.status:
+                async with conn.transaction():
+                    done = await applied_versions(conn)
+                for version, description, _ in MIGRATIONS:
+                    print(f"{version:>4}  {'applied' if version in done else 'pending':<8} {description}")
+            else:
+                applied = await migrate(conn, args.target)
+                print(f"applied {applied}" if applied else "up to date")
+    finally:
+        await db.close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply versioned database migrations.")
+    parser.add_argument("--status", action="store_true", help="List migrations instead of applying them")
+    parser.add_argument("--target", type=int, default=None, help="Stop after this version")
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
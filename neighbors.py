@@ -0,0 +1,249 @@
+"""
+Precomputed item-to-item neighbor table.
+
+Built offline from the vectors already stored in the FAISS index with one
+batched all-pairs search, then saved as plain .npy arrays inside the index
+version it was computed from (see indexer), and memory-mapped together
+with that index:
+
+    movie_recommendation_faiss.versions/<version>/neighbors/
+        ids.npy        (n,)   movie ids, sorted ascending
+        neighbors.npy  (n, k) neighbor movie ids per row, best first, -1 padded
+        scores.npy     (n, k) index distances for those neighbors
+
+Adding the table publishes a new index version, so running workers swap in
+the table and its index at once:
+
+    python -m neighbors --k 20
+"""
+import argparse
+import os
+import shutil
+import weakref
+
+import numpy as np
+
+from indexer import FAISS_PATH, index_version, new_index_dir, publish_index
+from logger import get_logger
+
+# Initialize logger for neighbors
+logger = get_logger("neighbors")
+
+# Subdirectory of an index version that holds its neighbor table
+NEIGHBORS_DIR = "neighbors"
+NEIGHBORS_K = int(os.getenv("NEIGHBORS_K", 20))
+
+
+def neighbors_path(index_dir):
+    """Where the neighbor table of the index version at `index_dir` lives."""
+    return os.path.join(index_dir, NEIGHBORS_DIR)
+
+
+def vectorstore_metadata(vectorstore):
+    """Movie ids and titles for every position of the FAISS index."""
+    ids, titles = [], []
+    for pos in range(vectorstore.index.ntotal):
+        doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[pos])
+        ids.append(int(doc.metadata['id']))
+        titles.append(doc.metadata['title'])
+    return np.array(ids, dtype=np.int64), np.array(titles, dtype=object)
+
+
+class MovieVectorIndex:
+    """
+    Movie-id keyed view of a FAISS vectorstore. Searches start from the
+    vectors already stored in the index, so no embedding call is needed.
+    """
+
+    def __init__(self, vectorstore):
+        self.index = vectorstore.index
+        self.movie_ids, self.titles = vectorstore_metadata(vectorstore)
+        self._positions = {}
+        for pos, movie_id in enumerate(self.movie_ids.tolist()):
+            self._positions.setdefault(movie_id, pos)
+        # Sorted id -> position arrays for vectorized lookups
+        self._id_keys = np.fromiter(self._positions.keys(), dtype=np.int64, count=len(self._positions))
+        self._id_positions = np.fromiter(self._positions.values(), dtype=np.int64, count=len(self._positions))
+        order = np.argsort(self._id_keys)
+        self._id_keys, self._id_positions = self._id_keys[order], self._id_positions[order]
+
+    def similar(self, movie_id, k):
+        """Ids and distances of the k nearest movies, excluding the movie (and its title) itself."""
+        return self.similar_many([movie_id], k)[movie_id]
+
+    def similar_many(self, movie_ids, k):
+        """
+        similar() for many movies with one batched search over their stored
+        vectors. Returns {movie_id: (ids, distances)}, None for unindexed movies.
+        """
+        results = {movie_id: None for movie_id in movie_ids}
+        found = [(movie_id, self._positions[movie_id]) for movie_id in results if movie_id in self._positions]
+        if not found:
+            return results
+
+        queries = np.vstack([self.index.reconstruct(pos) for _, pos in found])
+        distances, positions = self.index.search(queries, min(k + 1, self.index.ntotal))
+        for (movie_id, pos), dist_row, pos_row in zip(found, distances.tolist(), positions.tolist()):
+            ids, scores = [], []
+            for dist, p in zip(dist_row, pos_row):
+                if p < 0 or p == pos or self.titles[p] == self.titles[pos]:
+                    continue
+                ids.append(int(self.movie_ids[p]))
+                scores.append(dist)
+            results[movie_id] = (ids[:k], scores[:k])
+        return results
+
+
+    def vectors(self, movie_ids):
+        """
+        Stored vectors for many movies at once. Returns a boolean mask of which
+        ids are indexed and the (found, dim) matrix of their vectors.
+        """
+        ids = np.asarray(movie_ids, dtype=np.int64)
+        if not len(ids) or not len(self._id_keys):
+            return np.zeros(len(ids), dtype=bool), np.empty((0, self.index.d), dtype=np.float32)
+        slots = np.minimum(np.searchsorted(self._id_keys, ids), len(self._id_keys) - 1)
+        found = self._id_keys[slots] == ids
+        positions = self._id_positions[slots[found]]
+        if not len(positions):
+            return found, np.empty((0, self.index.d), dtype=np.float32)
+        return found, self.index.reconstruct_batch(positions)
+
+    def search_vector(self, vector, k, exclude=()):
+        """Ids and distances of the k movies nearest to any vector, skipping the ids in `exclude`."""
+        exclude = np.unique(np.asarray(list(exclude), dtype=np.int64))
+        fetch = min(k + len(exclude), self.index.ntotal)
+        if fetch <= 0:
+            return [], []
+        distances, positions = self.index.search(np.asarray(vector, dtype=np.float32).reshape(1, -1), fetch)
+        ids = self.movie_ids[np.maximum(positions[0], 0)]
+        keep = (positions[0] >= 0) & ~np.isin(ids, exclude)
+        return ids[keep][:k].tolist(), distances[0][keep][:k].tolist()
+
+
+_vector_indexes = weakref.WeakKeyDictionary()
+
+
+def get_vector_index(vectorstore):
+    """MovieVectorIndex for a vectorstore, built once and reused while it is alive."""
+    vector_index = _vector_indexes.get(vectorstore)
+    if vector_index is None:
+        vector_index = _vector_indexes[vectorstore] = MovieVectorIndex(vectorstore)
+    return vector_index
+
+
+def build_neighbor_table(vectorstore, path, k=NEIGHBORS_K, batch_size=4096):
+    """
+    Compute the top-k neighbors of every indexed movie and save them under
+    `path`, normally neighbors_path() of an index version not yet published.
+    """
+    index = vectorstore.index
+    n = index.ntotal
+    logger.info(f"Building top-{k} neighbor table for {n} movies...")
+    movie_ids, titles = vectorstore_metadata(vectorstore)
+    vectors = index.reconstruct_n(0, n)
+
+    neighbors = np.full((n, k), -1, dtype=np.int64)
+    scores = np.full((n, k), np.inf, dtype=np.float32)
+    fetch = min(k + 1, n)
+    for start in range(0, n, batch_size):
+        stop = min(start + batch_size, n)
+        distances, positions = index.search(vectors[start:stop], fetch)
+
+        # Drop padding and the query movie itself (and any movie sharing its title)
+        own_titles = titles[start:stop, None]
+        valid = (positions >= 0) & (titles[np.maximum(positions, 0)] != own_titles)
+        order = np.argsort(~valid, axis=1, kind="stable")[:, :k]
+        kept = np.take_along_axis(valid, order, axis=1)
+        width = order.shape[1]
+        neighbors[start:stop, :width] = np.where(kept, movie_ids[np.take_along_axis(positions, order, axis=1)], -1)
+        scores[start:stop, :width] = np.where(kept, np.take_along_axis(distances, order, axis=1), np.inf)
+
+    # Sort rows by movie id so lookups are a binary search
+    row_order = np.argsort(movie_ids, kind="stable")
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "ids.npy"), movie_ids[row_order])
+    np.save(os.path.join(path, "neighbors.npy"), neighbors[row_order])
+    np.save(os.path.join(path, "scores.npy"), scores[row_order])
+    logger.info(f"Neighbor table saved to {path}.")
+    return NeighborTable(path)
+
+
+def publish_neighbor_table(index_path=FAISS_PATH, k=NEIGHBORS_K, backend=None):
+    """
+    Build the neighbor table of the index published at `index_path` and
+    publish it with a copy of that index as a new version. Returns the
+    published version directory.
+    """
+    from embeddings import get_embeddings
+    import services
+
+    current = os.path.realpath(index_path)
+    vectorstore = services.load_vectorstore(current, get_embeddings(backend))
+    build_dir = new_index_dir(index_path)
+    for name in os.listdir(current):
+        if os.path.isfile(os.path.join(current, name)):
+            shutil.copy2(os.path.join(current, name), build_dir)
+    build_neighbor_table(vectorstore, neighbors_path(build_dir), k)
+    publish_index(build_dir, index_path)
+    return build_dir
+
+
+class NeighborTable:
+    """Memory-mapped movie_id -> (neighbor ids, scores) lookup."""
+
+    def __init__(self, path):
+        self.path = path
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.neighbors = np.load(os.path.join(path, "neighbors.npy"), mmap_mode="r")
+        self.scores = np.load(os.path.join(path, "scores.npy"), mmap_mode="r")
+
+    @classmethod
+    def load(cls, path):
+        """Return the table at `path`, or None if it has not been built."""
+        if not os.path.exists(os.path.join(path, "ids.npy")):
+            logger.info(f"No neighbor table at {path}; recommendations will use the live retriever.")
+            return None
+        try:
+            table = cls(path)
+            logger.info(f"Neighbor table loaded from {path} ({len(table.ids)} movies).")
+            return table
+        except Exception as e:
+            logger.error(f"Error loading neighbor table: {e}")
+            return None
+
+    @property
+    def k(self):
+        return self.neighbors.shape[1]
+
+    def row(self, movie_id):
+        """Row index for a movie id, or None if it is not in the table."""
+        row = int(np.searchsorted(self.ids, movie_id))
+        if row < len(self.ids) and self.ids[row] == movie_id:
+            return row
+        return None
+
+    def lookup(self, movie_id, k):
+        """Neighbor ids and scores for a movie, or None if the table can't answer for k."""
+        row = self.row(movie_id)
+        if row is None or k > self.k:
+            return None
+        ids = self.neighbors[row, :k]
+        valid = ids >= 0
+        return ids[valid].tolist(), self.scores[row, :k][valid].tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the precomputed neighbor table of the FAISS index.")
+    parser.add_argument("--index", default=FAISS_PATH, help="FAISS index path")
+    parser.add_argument("--backend", default=None, help="Embedding backend (defaults to EMBEDDING_BACKEND)")
+    parser.add_argument("--k", type=int, default=NEIGHBORS_K, help="Neighbors kept per movie")
+    args = parser.parse_args()
+
+    if index_version(args.index) is None:
+        raise SystemExit(f"No FAISS index at {args.index}; build it with python -m indexer first.")
+    publish_neighbor_table(args.index, args.k, args.backend)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Password hashing and verification off the request path.
+
+bcrypt runs in a small dedicated process pool at a lower CPU priority, so a
+burst of logins queues up there instead of competing with page renders for
+the threadpool and the CPU. Each web worker admits at most
+PASSWORD_MAX_PENDING operations at a time (queued or running); beyond
+that, callers get PasswordPoolBusy, which the app turns into a 429.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+import metrics
+from logger import get_logger
+
+# Initialize logger for passwords
+logger = get_logger("passwords")
+
+# bcrypt cost factor for new hashes; existing hashes keep the cost they were made with
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Hashing processes per web worker; 0 hashes in threads instead, as before
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", 1))
+# Password operations one web worker admits at once before answering 429
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", 16))
+# Niceness added to the hashing processes so page renders win the CPU
+PASSWORD_WORKER_NICE = int(os.getenv("PASSWORD_WORKER_NICE", 10))
+
+REJECTED = metrics.Counter("password_requests_rejected_total", "Password operations refused because the pool was full")
+
+_pool = None
+_pending = 0
+
+
+class PasswordPoolBusy(Exception):
+    """Too many password operations are already queued in this worker."""
+
+
+def hash_password(password, rounds=None):
+    """Hash a password using bcrypt."""
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds or BCRYPT_ROUNDS)).decode()
+
+
+def check_password(password, hashed):
+    """True if `password` matches the bcrypt hash."""
+    return bcrypt.checkpw(password.encode(), hashed.encode())
+
+
+def _init_worker(nice):
+    try:
+        os.nice(nice)
+    except OSError:
+        pass
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn, not fork: web workers run threads, and the children only need bcrypt
+        _pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(PASSWORD_WORKER_NICE,),
+        )
+        logger.info(f"Started password pool with {PASSWORD_WORKERS} process(es).")
+    return _pool
+
+
+async def _run(func, *args):
+    global _pool, _pending
+    if _pending >= PASSWORD_MAX_PENDING:
+        REJECTED.inc()
+        raise PasswordPoolBusy(f"{_pending} password operations already pending")
+    _pending += 1
+    try:
+        if PASSWORD_WORKERS <= 0:
+            return await asyncio.to_thread(func, *args)
+        loop = asyncio.get_running_loop()
+        pool = _get_pool()
+        try:
+            return await loop.run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            # A hashing process died; reap the broken pool, start a fresh one and retry once
+            if _pool is pool:
+                logger.error("Password pool broke; restarting it.")
+                _pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            return await loop.run_in_executor(_get_pool(), func, *args)
+    finally:
+        _pending -= 1
+
+
+@metrics.timed("password.hash")
+async def hash_password_async(password):
+    """hash_password in the password pool. Raises PasswordPoolBusy when it is full."""
+    return await _run(hash_password, password, BCRYPT_ROUNDS)
+
+
+@metrics.timed("password.verify")
+async def verify_password(password, hashed):
+    """check_password in the password pool. Raises PasswordPoolBusy when it is full."""
+    return await _run(check_password, password, hashed)
+
+
+def pending():
+    return _pending
+
+
+def shutdown():
+    """Stop the hashing processes."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+metrics.register_collector(lambda: [
+    ("password_pending", "gauge", "Password operations queued or running in this worker", [({}, _pending)]),
+])
@@ -0,0 +1,230 @@
+"""
+Opt-in request profiling.
+
+A sampled request runs under a statistical stack sampler: a thread that
+records the Python stack of every thread working for that request each
+PROFILE_INTERVAL seconds. That is the event loop thread while the request's
+task is the one running there, and threadpool workers running a call made
+from the request; other requests served meanwhile stay out of its profile.
+The result is written to PROFILE_DIR as a collapsed-stack file (one
+"frame;frame;frame count" line per stack, ready for flamegraph.pl or
+speedscope) next to a JSON summary of the request and its timed stages
+(the metrics spans), slowest first.
+
+Requests are sampled at PROFILE_SAMPLE_RATE, or on demand by passing the
+admin token as the X-Profile header. The token is never read from the query
+string, where access logs, browser history and Referer headers would keep it.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from fastapi.concurrency import run_in_threadpool
+
+import dependencies
+import metrics
+from logger import get_logger
+
+# Initialize logger for profiling
+logger = get_logger("profiling")
+
+# Share of requests profiled without being asked for (0 disables sampling)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+# Profiles kept on disk; older ones are deleted
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 200))
+
+# Leaf frames of threads that are waiting rather than working
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "thread.py")
+
+# The running StackSampler, inherited by the tasks and threadpool calls of the profiled request
+_active = contextvars.ContextVar("profiling_sampler", default=None)
+
+
+def _label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def _worker_context(frame):
+    """The contextvars.Context a threadpool worker runs its current call in, or None."""
+    # anyio's worker thread runs each call as context.run(func) from its run() loop
+    while frame is not None:
+        if frame.f_code.co_name == "run":
+            context = frame.f_locals.get("context")
+            if isinstance(context, contextvars.Context):
+                return context
+        frame = frame.f_back
+    return None
+
+
+def _profile_name(started_at, method, route):
+    """Sortable file name, e.g. 20260101T120000-123456-GET-movie_movie_id."""
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(started_at))
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    return f"{stamp}-{int(started_at * 1e6) % 10**6:06d}-{method}-{slug}"
+
+
+class StackSampler:
+    """
+    Background thread counting the collapsed stacks of the busy threads
+    working for whoever started it: the starting thread (while the starting
+    asyncio task, if any, is the one running there) and threadpool workers
+    running a call made from it.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._owner = threading.get_ident()
+        try:
+            self._loop, self._task = asyncio.get_running_loop(), asyncio.current_task()
+        except RuntimeError:
+            self._loop = self._task = None
+        self._token = _active.set(self)
+        self._thread.start()
+        return self
+
+    def _works_for_us(self, ident, frame):
+        if ident == self._owner:
+            return self._task is None or asyncio.current_task(self._loop) is self._task
+        context = _worker_context(frame)
+        return context is not None and context.get(_active) is self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == self._thread.ident or os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    continue
+                if self._works_for_us(ident, frame):
+                    self.stacks[_collapse(frame)] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        _active.reset(self._token)
+        return self.stacks
+
+
+def wants_profile(scope, sample_rate=None):
+    """Whether to profile this request: explicitly asked for with the admin token, or sampled."""
+    if dependencies.ADMIN_TOKEN:
+        token = dict(scope.get("headers") or []).get(b"x-profile")
+        if token is not None and dependencies.is_admin_token(token.decode("latin-1")):
+            return True
+    rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+    return rate > 0 and random.random() < rate
+
+
+def save_profile(directory, summary, stacks):
+    """Write one profile (collapsed stacks + JSON summary) and prune the oldest beyond PROFILE_KEEP."""
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, summary["name"])
+    with open(f"{base}.collapsed", "w") as f:
+        f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    with open(f"{base}.json", "w") as f:
+        json.dump(summary, f)
+    for name in list_profiles(directory)[PROFILE_KEEP:]:
+        for ext in (".json", ".collapsed"):
+            try:
+                os.remove(os.path.join(directory, name + ext))
+            except OSError:
+                pass
+
+
+def list_profiles(directory=None):
+    """Profile names in `directory`, newest first."""
+    directory = directory or PROFILE_DIR
+    try:
+        names = [f[:-len(".json")] for f in os.listdir(directory) if f.endswith(".json")]
+    except OSError:
+        return []
+    return sorted(names, reverse=True)
+
+
+def load_profile(name, directory=None):
+    """JSON summary of a saved profile, or None."""
+    directory = directory or PROFILE_DIR
+    try:
+        with open(os.path.join(directory, f"{os.path.basename(name)}.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling sampled or explicitly requested HTTP requests."""
+
+    def __init__(self, app, sample_rate=None, directory=None, interval=None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not wants_profile(scope, self.sample_rate):
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        spans = []
+        token = metrics.request_spans.set(spans)
+        sampler = StackSampler(self.interval or PROFILE_INTERVAL).start()
+        started_at, start = time.time(), time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            stacks = sampler.stop()
+            metrics.request_spans.reset(token)
+            route = getattr(scope.get("route"), "path", scope["path"])
+            summary = {
+                "name": _profile_name(started_at, scope["method"], route),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route,
+                "status": status,
+                "started_at": started_at,
+                "duration_ms": round(duration * 1000, 3),
+                "samples": sampler.samples,
+                "spans": sorted(
+                    ({"stage": stage, "offset_ms": round((t0 - start) * 1000, 3), "duration_ms": round(sec * 1000, 3)}
+                     for stage, t0, sec in spans),
+                    key=lambda span: span["duration_ms"], reverse=True,
+                ),
+            }
+            try:
+                # File writes and pruning stay off the event loop
+                await run_in_threadpool(save_profile, self.directory or PROFILE_DIR, summary, stacks)
+                logger.info(f"Profiled {scope['method']} {scope['path']} in {summary['duration_ms']} ms -> {summary['name']}")
+            except OSError as e:
+                logger.error(f"Could not save profile for {scope['path']}: {e}")
@@ -0,0 +1,81 @@
+import asyncio
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
+import psycopg
+from starlette.requests import ClientDisconnect
+
+import bulk
+import database as db
+import profiling
+from dependencies import require_admin
+from logger import get_logger
+
+# Initialize logger for admin
+logger = get_logger("admin")
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.get("/profiles")
+def recent_profiles(limit: int = Query(20, ge=1, le=200), spans: int = Query(5, ge=0, le=100)):
+    """Most recent request profiles (newest first) and the slowest spans across them."""
+    summaries = [p for p in (profiling.load_profile(name) for name in profiling.list_profiles()[:limit]) if p]
+    slowest = sorted(
+        ({**span, "profile": p["name"], "route": p["route"]} for p in summaries for span in p["spans"]),
+        key=lambda span: span["duration_ms"], reverse=True,
+    )
+    return {
+        "profiles": [{**p, "spans": p["spans"][:spans]} for p in summaries],
+        "slowest_spans": slowest[:20],
+    }
+
+@router.get("/profiles/{name}")
+def download_profile(name: str):
+    """Collapsed stacks of one profile, for flamegraph.pl or speedscope."""
+    path = os.path.join(profiling.PROFILE_DIR, f"{os.path.basename(name)}.collapsed")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=os.path.basename(path))
+
+@router.post("/import/{kind}")
+async def import_interactions(request: Request, kind: str, format: str = Query("csv", pattern="^(csv|jsonl)$")):
+    """
+    Merge an uploaded CSV/JSONL body into ratings or bookmarks. The body is
+    parsed while it streams in and COPYed a batch at a time. If the import
+    fails midway, the error detail carries the counts so far: batches merged
+    before the error stay merged.
+    """
+    if kind not in db.BULK_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown kind '{kind}'")
+    if not db.db_pool:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    lines = bulk.stream_lines(request.stream(), asyncio.get_running_loop())
+    stats = {}
+    try:
+        await bulk.import_lines(kind, format, lines, stats=stats)
+    except (ValueError, UnicodeError) as e:
+        logger.error(f"Bulk import into {kind} failed: {e} ({stats})")
+        raise HTTPException(status_code=400, detail={"error": f"Import failed: {e}", **stats})
+    except ClientDisconnect:
+        logger.warning(f"Bulk import into {kind} aborted: client disconnected ({stats})")
+        raise HTTPException(status_code=400, detail={"error": "Upload interrupted", **stats})
+    except psycopg.Error as e:
+        logger.error(f"Bulk import into {kind} failed in the database: {e} ({stats})")
+        raise HTTPException(status_code=503, detail={"error": "Database error during import", **stats})
+    logger.info(f"Bulk import into {kind}: {stats}")
+    return stats
+
+@router.get("/export/{kind}")
+async def export_interactions(kind: str, format: str = Query("csv", pattern="^(csv|jsonl)$"), user_id: int | None = None):
+    """Stream ratings or bookmarks (optionally one user's) as CSV or JSON lines."""
+    if kind not in db.BULK_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown kind '{kind}'")
+    if not db.db_pool:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        db.bulk_export(kind, format, user_id),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{format}"'},
+    )
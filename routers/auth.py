@@ -20,9 +20,9 @@ def login_page(request: Request):
     )
 
 @router.post("/login")
-def login(request: Request, username: str = Form(...), password: str = Form(...)):
+async def login(request: Request, username: str = Form(...), password: str = Form(...)):
     """Handle user login."""
-    user_id = db.verify_user(username, password)
+    user_id = await db.verify_user(username, password)
     if user_id:
         logger.info(f"User '{username}' logged in successfully.")
         request.session["user"] = username
@@ -46,9 +46,9 @@ def signup_page(request: Request):
     )
 
 @router.post("/signup")
-def signup(request: Request, username: str = Form(...), password: str = Form(...)):
+async def signup(request: Request, username: str = Form(...), password: str = Form(...)):
     """Handle user registration."""
-    existing_id = db.get_user_id(username)
+    existing_id = await db.get_user_id(username)
     if existing_id:
         logger.warning(f"Signup failed: Username '{username}' already exists.")
         return templates.TemplateResponse(
@@ -64,9 +64,9 @@ def signup(request: Request, username: str = Form(...), password: str = Form(...
             context={"error": "Password must be at least 4 characters"}
         )
         
-    if db.add_user(username, password):
+    user_id = await db.add_user(username, password)
+    if user_id:
         logger.info(f"New user created: '{username}'")
-        user_id = db.get_user_id(username)
         request.session["user"] = username
         request.session["user_id"] = user_id
         return RedirectResponse(url="/", status_code=303)
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Request, Query, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse
 
 import services
 import database as db
-from dependencies import get_df, get_retriever, templates
+from dependencies import get_catalog, get_neighbors, get_retriever, templates
 from logger import get_logger
 
 # Initialize logger for movies
@@ -11,15 +12,15 @@ logger = get_logger("movies")
 
 router = APIRouter()
 
+# Upper bounds for one /api/recommendations call
+MAX_BATCH_MOVIES = 200
+MAX_BATCH_K = 50
+
 @router.get("/", response_class=HTMLResponse)
-def home(request: Request, df=Depends(get_df)):
+def home(request: Request, catalog=Depends(get_catalog)):
     """Render the home page with trending movies."""
     # Sample 12 random movies
-    trending = df.sample(min(12, len(df)))
-    trending_movies = []
-    
-    for _, row in trending.iterrows():
-        trending_movies.append(services.get_movie_details(row['id'], df))
+    trending_movies = catalog.sample(12)
         
     return templates.TemplateResponse(
         request=request, 
@@ -32,16 +33,29 @@ def home(request: Request, df=Depends(get_df)):
     )
 
 @router.get("/search", response_class=HTMLResponse)
-def search(request: Request, q: str = Query(""), df=Depends(get_df)):
-    """Search for movies based on query string."""
-    logger.info(f"Searching for movies with query: '{q}'")
-    results = services.search_movies(q, df)
+def search(
+    request: Request,
+    q: str = Query(""),
+    mode: str = Query("smart", pattern="^(smart|hybrid)$"),
+    catalog=Depends(get_catalog),
+    retriever=Depends(get_retriever),
+):
+    """
+    Search for movies based on query string. `mode=hybrid` also matches
+    plots and themes (BM25 + vector similarity) instead of titles only.
+    """
+    logger.info(f"Searching for movies with query: '{q}' (mode: {mode})")
+    if mode == "hybrid":
+        results = services.hybrid_search(q, catalog, retriever)
+    else:
+        results = services.search_movies(q, catalog)
     
     return templates.TemplateResponse(
         request=request, 
         name="index.html", 
         context={
             "search_query": q,
+            "search_mode": mode,
             "movies": results,
             "user": request.session.get("user"),
             "active_page": "home"
@@ -49,21 +63,28 @@ def search(request: Request, q: str = Query(""), df=Depends(get_df)):
     )
 
 @router.get("/movie/{movie_id}", response_class=HTMLResponse)
-def movie_details(
+async def movie_details(
     request: Request, 
     movie_id: int, 
-    df=Depends(get_df),
-    retriever=Depends(get_retriever)
+    catalog=Depends(get_catalog),
+    retriever=Depends(get_retriever),
+    neighbors=Depends(get_neighbors)
 ):
-    """Render details page for a specific movie."""
-    movie = services.get_movie_details(movie_id, df)
+    """
+    Render details page for a specific movie. Only the user's movie states
+    are awaited here; recommending (a FAISS search on a neighbor table miss) and
+    rendering run in the threadpool, off the event loop.
+    """
+    movie = services.get_movie_details(movie_id, catalog)
     if not movie:
         logger.warning(f"Movie ID {movie_id} not found.")
         raise HTTPException(status_code=404, detail="Movie not found")
     
     # Get recommendations
     logger.info(f"Generating recommendations for movie: '{movie['title']}' (ID: {movie_id})")
-    recommendations = services.get_recommendations(movie['title'], df, retriever)
+    recommendations = await run_in_threadpool(
+        services.get_recommendations_by_id, movie_id, catalog, retriever, neighbors=neighbors
+    )
     
     # Get user interaction status if logged in
     user_id = request.session.get("user_id")
@@ -71,12 +92,17 @@ def movie_details(
     user_rating = 0
     
     if user_id:
-        bookmark_status = db.get_bookmark(user_id, movie_id)
-        rating_val = db.get_rating(user_id, movie_id)
-        if rating_val is not None:
-            user_rating = rating_val
+        # One lookup (the cached state, else one bounded query) covers this movie and every recommendation card
+        states = await db.get_user_movie_states(user_id, [movie_id] + [rec['id'] for rec in recommendations])
+        bookmark_status = states[movie_id]['status']
+        if states[movie_id]['rating'] is not None:
+            user_rating = states[movie_id]['rating']
+        for rec in recommendations:
+            rec['user_status'] = states[rec['id']]['status']
+            rec['user_rating'] = states[rec['id']]['rating']
             
-    return templates.TemplateResponse(
+    return await run_in_threadpool(
+        templates.TemplateResponse,
         request=request, 
         name="movie_details.html", 
         context={
@@ -88,3 +114,41 @@ def movie_details(
         }
     )
 
+@router.post("/api/recommendations")
+async def batch_recommendations(
+    request: Request,
+    catalog=Depends(get_catalog),
+    retriever=Depends(get_retriever),
+    neighbors=Depends(get_neighbors)
+):
+    """API endpoint returning recommendations for many movies in one batched call."""
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON")
+
+    movie_ids = data.get('movie_ids') if isinstance(data, dict) else None
+    k = data.get('k', 5) if isinstance(data, dict) else None
+    if (not isinstance(movie_ids, list) or not movie_ids or len(movie_ids) > MAX_BATCH_MOVIES
+            or not all(isinstance(m, int) and not isinstance(m, bool) for m in movie_ids)):
+        raise HTTPException(status_code=400, detail=f"movie_ids must be a list of 1-{MAX_BATCH_MOVIES} integers")
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_BATCH_K:
+        raise HTTPException(status_code=400, detail=f"k must be an integer between 1 and {MAX_BATCH_K}")
+
+    logger.info(f"Generating batch recommendations for {len(movie_ids)} movies (k={k})")
+    # Index search and hydration are CPU-bound; keep them off the event loop
+    results = await run_in_threadpool(services.get_recommendations_batch, movie_ids, catalog, retriever, k, neighbors)
+    return {
+        "k": k,
+        "results": [
+            {"movie_id": movie_id, "recommendations": [services.json_safe(d) for d in recs]}
+            for movie_id, recs in results.items()
+        ],
+        "missing": [m for m in dict.fromkeys(movie_ids) if m not in results],
+    }
+
+@router.get("/api/movie/{movie_id}/stats")
+async def movie_stats(movie_id: int):
+    """Community stats of a movie: rating count and average, watched and to-watch counts."""
+    stats = await db.get_movie_stats([movie_id])
+    return {"movie_id": movie_id, **stats[movie_id]}
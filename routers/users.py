@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Request, HTTPException, Depends
+from datetime import datetime
+
+from fastapi import APIRouter, Request, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse
 
 import services
 import database as db
-from dependencies import templates, get_df
+from dependencies import templates, get_catalog, get_retriever
 from logger import get_logger
 
 # Initialize logger for users
@@ -11,9 +14,51 @@ logger = get_logger("users")
 
 router = APIRouter()
 
+def _encode_cursor(key):
+    """Opaque page cursor for a (created_at, id) keyset position."""
+    return None if key is None else f"{key[0].isoformat()}_{key[1]}"
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        created_at, row_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _library_items(rows, catalog):
+    """Catalog details of a page of library rows, with the user's status/rating attached."""
+    items = []
+    for row, details in zip(rows, services.get_movies_details([r['movie_id'] for r in rows], catalog)):
+        if details:
+            details['user_status'] = row['status']
+            details['user_rating'] = row['rating']
+            details['vote_average_formatted'] = services.format_float(details.get('vote_average'))
+            items.append(details)
+    return items
+
+def _library_sections(pages, catalog):
+    """Template sections for the first page of each library section."""
+    return {
+        section: {"movies": _library_items(rows, catalog), "next_cursor": _encode_cursor(key)}
+        for section, (rows, key) in pages.items()
+    }
+
+def _library_page(rows, key, catalog):
+    """JSON body of one library API page."""
+    return {
+        "items": [services.json_safe(d) for d in _library_items(rows, catalog)],
+        "next_cursor": _encode_cursor(key),
+    }
+
 @router.get("/library", response_class=HTMLResponse)
-def library(request: Request, df=Depends(get_df)):
-    """Render the user's movie library."""
+async def library(request: Request, catalog=Depends(get_catalog)):
+    """
+    Render the first page of each library section; the rest load from the
+    JSON API as the user scrolls. Only the page query is awaited here;
+    building the movie records and rendering run in the threadpool.
+    """
     user_id = request.session.get("user_id")
     username = request.session.get("user")
     
@@ -27,42 +72,50 @@ def library(request: Request, df=Depends(get_df)):
         
     logger.info(f"User '{username}' (ID: {user_id}) is viewing their library.")
     
-    # Get user data
-    bookmarks_raw = db.get_user_bookmarks(user_id)
-    ratings_raw = db.get_user_ratings(user_id)
-    
-    # Process bookmarks
-    to_watch = []
-    watched = []
-    for b in bookmarks_raw:
-        details = services.get_movie_details(b['movie_id'], df)
-        if details:
-            details['user_status'] = b['status']
-            if b['status'] == 'to_watch':
-                to_watch.append(details)
-            elif b['status'] == 'watched':
-                watched.append(details)
-                
-    # Process ratings
-    rated_movies = []
-    for r in ratings_raw:
-        details = services.get_movie_details(r['movie_id'], df)
-        if details:
-            details['user_rating'] = r['rating']
-            rated_movies.append(details)
+    # First page of every section in one query
+    pages = await db.get_user_library(user_id)
+    sections = await run_in_threadpool(_library_sections, pages, catalog)
             
-    return templates.TemplateResponse(
+    return await run_in_threadpool(
+        templates.TemplateResponse,
         request=request, 
         name="library.html", 
         context={
             "user": username,
-            "to_watch": to_watch,
-            "watched": watched,
-            "rated_movies": rated_movies,
+            "sections": sections,
             "active_page": "library"
         }
     )
 
+@router.get("/api/library/bookmarks")
+async def library_bookmarks(
+    request: Request, status: str | None = Query(None, pattern="^(to_watch|watched)$"),
+    cursor: str | None = None, limit: int = Query(db.LIBRARY_PAGE_SIZE, ge=1, le=100),
+    catalog=Depends(get_catalog),
+):
+    """One page of the user's bookmarks, newest first; pass next_cursor back for the next page."""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        logger.warning("Unauthorized API call to /api/library/bookmarks")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    rows, key = await db.get_user_bookmarks_page(user_id, status, _decode_cursor(cursor), limit)
+    return await run_in_threadpool(_library_page, rows, key, catalog)
+
+@router.get("/api/library/ratings")
+async def library_ratings(
+    request: Request, cursor: str | None = None,
+    limit: int = Query(db.LIBRARY_PAGE_SIZE, ge=1, le=100), catalog=Depends(get_catalog),
+):
+    """One page of the user's ratings, newest first; pass next_cursor back for the next page."""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        logger.warning("Unauthorized API call to /api/library/ratings")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    rows, key = await db.get_user_ratings_page(user_id, _decode_cursor(cursor), limit)
+    return await run_in_threadpool(_library_page, rows, key, catalog)
+
 # --- API Endpoints for Javascript Interactions ---
 
 @router.post("/api/bookmark")
@@ -81,7 +134,7 @@ async def add_bookmark(request: Request):
     status = data.get('status')
     
     logger.info(f"User '{username}' (ID: {user_id}) setting bookmark for '{movie_title}' (ID: {movie_id}) to {status}")
-    success = db.add_bookmark(user_id, movie_id, movie_title, status)
+    success = await db.add_bookmark(user_id, movie_id, movie_title, status)
     return {"success": success}
 
 @router.post("/api/remove_bookmark")
@@ -97,7 +150,7 @@ async def remove_bookmark(request: Request):
         
     movie_id = data.get('movie_id')
     logger.info(f"User '{username}' (ID: {user_id}) removing bookmark for movie ID: {movie_id}")
-    db.remove_bookmark(user_id, movie_id)
+    await db.remove_bookmark(user_id, movie_id)
     return {"success": True}
 
 @router.post("/api/rate")
@@ -116,6 +169,37 @@ async def rate_movie(request: Request):
     rating = data.get('rating')
     
     logger.info(f"User '{username}' (ID: {user_id}) rated movie '{movie_title}' (ID: {movie_id}) as {rating}")
-    success = db.add_rating(user_id, movie_id, movie_title, float(rating))
+    success = await db.add_rating(user_id, movie_id, movie_title, float(rating))
     return {"success": success}
 
+@router.get("/api/recommendations/for-you")
+async def recommendations_for_you(
+    request: Request, k: int = Query(10, ge=1, le=50),
+    catalog=Depends(get_catalog), retriever=Depends(get_retriever),
+):
+    """
+    Personalized recommendations: the movies closest to the rating-weighted
+    mean of everything the user rated or watched, minus what they've seen.
+    """
+    user_id = request.session.get("user_id")
+    if not user_id:
+        logger.warning("Unauthorized API call to /api/recommendations/for-you")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    # Keyed by the state's change stamp, so a new rating or bookmark yields a fresh profile
+    state = await db.get_user_state(user_id)
+    key = f"{user_id}|{state.version}"
+    profile = services.profile_cache.get(key)
+    # Vector lookups and the index search are CPU-bound; keep them off the event loop
+    if profile is None:
+        profile = await run_in_threadpool(services.build_user_profile, state.interactions(), retriever)
+        if retriever is not None:
+            services.profile_cache.set(key, profile)
+
+    recommendations = await run_in_threadpool(services.get_profile_recommendations, profile, catalog, retriever, k)
+    return {
+        "k": k,
+        "personalized": retriever is not None and profile["vector"] is not None,
+        "recommendations": [services.json_safe(d) for d in recommendations],
+    }
+
@@ -0,0 +1,217 @@
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+import numpy as np
+from rapidfuzz import process, fuzz
+
+NGRAM = 3
+# Upper bound on titles handed to the fuzzy scorer per query
+FUZZY_CANDIDATES = 500
+FUZZY_CUTOFF = 80
+_PREFIX_END = "\U0010ffff"
+# Okapi BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+_TOKEN = re.compile(r"\w+")
+
+
+def _ngrams(text, n=NGRAM):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _build_postings(texts):
+    """Map every n-gram to the sorted array of positions whose text contains it."""
+    postings = {}
+    for pos, text in enumerate(texts):
+        if text is None:
+            continue
+        for gram in _ngrams(text):
+            postings.setdefault(gram, []).append(pos)
+    return {gram: np.array(positions, dtype=np.int32) for gram, positions in postings.items()}
+
+
+def _tokens(text):
+    return _TOKEN.findall(text.lower()) if isinstance(text, str) else []
+
+
+class BM25Index:
+    """
+    Okapi BM25 over free text with every term's per-document weight computed
+    up front, stored as a CSR-style inverted index: one slice of positions and
+    weights per term. Scoring a query is a few array slices and a bincount.
+    """
+
+    def __init__(self, texts, k1=BM25_K1, b=BM25_B):
+        counts = [Counter(_tokens(text)) for text in texts]
+        self.size = len(counts)
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        avg_length = lengths.mean() if self.size and lengths.mean() > 0 else 1.0
+
+        postings = {}
+        for pos, terms in enumerate(counts):
+            for term, tf in terms.items():
+                postings.setdefault(term, []).append((pos, tf))
+
+        self._terms = {}
+        offsets, positions, weights = [0], [], []
+        for term_id, (term, hits) in enumerate(postings.items()):
+            self._terms[term] = term_id
+            pos = np.array([p for p, _ in hits], dtype=np.int32)
+            tf = np.array([t for _, t in hits], dtype=np.float32)
+            idf = np.log(1 + (self.size - len(hits) + 0.5) / (len(hits) + 0.5))
+            positions.append(pos)
+            weights.append(idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[pos] / avg_length)))
+            offsets.append(offsets[-1] + len(hits))
+        self._offsets = np.array(offsets, dtype=np.int64)
+        self._positions = np.concatenate(positions) if positions else np.empty(0, dtype=np.int32)
+        self._weights = np.concatenate(weights).astype(np.float32) if weights else np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return self.size
+
+    def scores(self, query):
+        """Positions of the documents matching any query term, and their BM25 scores."""
+        term_ids = sorted({self._terms[t] for t in _tokens(query) if t in self._terms})
+        if not term_ids:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        slices = [slice(self._offsets[t], self._offsets[t + 1]) for t in term_ids]
+        positions = np.concatenate([self._positions[s] for s in slices])
+        weights = np.concatenate([self._weights[s] for s in slices])
+        scores = np.bincount(positions, weights=weights, minlength=self.size)
+        matched = np.flatnonzero(scores)
+        return matched, scores[matched].astype(np.float32)
+
+    def search(self, query, limit):
+        """Positions of the `limit` best-scoring documents, best first (ties by position)."""
+        positions, scores = self.scores(query)
+        if len(positions) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            positions, scores = positions[top], scores[top]
+        order = np.lexsort((positions, -scores))
+        return positions[order].tolist()
+
+
+class SearchIndex:
+    """
+    Precomputed structures behind the tiered "Smart Search":
+    a sorted prefix array for exact/starts-with matches, trigram inverted
+    indexes for substring matches on titles and keywords, and trigram
+    candidate pruning for the fuzzy tier.
+    """
+
+    def __init__(self, titles, keyword_texts=None):
+        self.titles = [t if isinstance(t, str) else None for t in titles]
+        self.lower_titles = [t.lower() if t is not None else None for t in self.titles]
+        self.keyword_texts = [k.lower() if isinstance(k, str) else None for k in (keyword_texts or [])]
+
+        order = sorted((t, pos) for pos, t in enumerate(self.lower_titles) if t is not None)
+        self._sorted_titles = [t for t, _ in order]
+        self._sorted_positions = np.array([pos for _, pos in order], dtype=np.int32)
+
+        self._title_postings = _build_postings(self.lower_titles)
+        self._keyword_postings = _build_postings(self.keyword_texts)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Build the index from the raw movie DataFrame."""
+        if df.empty or 'title' not in df.columns:
+            return cls([])
+        keywords = df['keywords'].tolist() if 'keywords' in df.columns else None
+        return cls(df['title'].tolist(), keywords)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _prefix_range(self, lo_key, hi_key):
+        lo = bisect_left(self._sorted_titles, lo_key)
+        hi = bisect_right(self._sorted_titles, hi_key)
+        # Back in catalog order so ties resolve the way the pandas masks did
+        return np.sort(self._sorted_positions[lo:hi]).tolist()
+
+    def exact(self, query):
+        return self._prefix_range(query, query)
+
+    def starts_with(self, query):
+        return self._prefix_range(query, query + _PREFIX_END)
+
+    def _candidates(self, postings, query):
+        """Positions containing every n-gram of the query, or None to scan everything."""
+        grams = _ngrams(query)
+        if not grams:
+            return None
+        lists = sorted((postings.get(gram) for gram in grams), key=lambda p: 0 if p is None else len(p))
+        if lists[0] is None:
+            return []
+        result = lists[0]
+        for positions in lists[1:]:
+            result = np.intersect1d(result, positions, assume_unique=True)
+            if not len(result):
+                break
+        return result.tolist()
+
+    def _substring(self, texts, postings, query):
+        candidates = self._candidates(postings, query)
+        if candidates is None:
+            candidates = range(len(texts))
+        return [pos for pos in candidates if texts[pos] is not None and query in texts[pos]]
+
+    def contains(self, query):
+        return self._substring(self.lower_titles, self._title_postings, query)
+
+    def keyword_contains(self, query):
+        return self._substring(self.keyword_texts, self._keyword_postings, query)
+
+    def fuzzy(self, query, limit):
+        """Titles scoring >= FUZZY_CUTOFF on token_set_ratio, best first."""
+        grams = _ngrams(query)
+        if grams:
+            hits = [self._title_postings[gram] for gram in grams if gram in self._title_postings]
+            if not hits:
+                return []
+            positions, overlap = np.unique(np.concatenate(hits), return_counts=True)
+            if len(positions) > FUZZY_CANDIDATES:
+                # Keep the titles sharing the most trigrams with the query
+                best = np.argpartition(-overlap, FUZZY_CANDIDATES)[:FUZZY_CANDIDATES]
+                positions = np.sort(positions[best])
+            candidates = positions.tolist()
+        else:
+            candidates = [pos for pos, t in enumerate(self.titles) if t is not None]
+
+        choices = [self.titles[pos] for pos in candidates]
+        results = process.extract(query, choices, scorer=fuzz.token_set_ratio, limit=limit)
+        return [candidates[idx] for _, score, idx in results if score >= FUZZY_CUTOFF]
+
+    def search(self, query, limit=12):
+        """
+        Return matching titles in tier order: exact, starts-with, substring,
+        fuzzy, keyword. Stops as soon as `limit` unique titles are collected.
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        results_ordered = []
+        seen_titles = set()
+
+        def add_unique(positions):
+            for pos in positions:
+                title = self.titles[pos]
+                if title not in seen_titles:
+                    results_ordered.append(title)
+                    seen_titles.add(title)
+                if len(results_ordered) >= limit:
+                    return True
+            return False
+
+        tiers = (
+            lambda: self.exact(query),
+            lambda: self.starts_with(query),
+            lambda: self.contains(query),
+            lambda: self.fuzzy(query, limit),
+            lambda: self.keyword_contains(query),
+        )
+        for tier in tiers:
+            if add_unique(tier()):
+                break
+        return results_ordered
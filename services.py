@@ -1,25 +1,54 @@
-from rapidfuzz import process, fuzz
 import joblib
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEndpointEmbeddings
 import os
 import math
+import pickle
+import threading
+import time
+import numpy as np
 import pandas as pd
-import ast
-from datetime import datetime
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_core.documents import Document
+from cache import create_cache
+from catalog import MovieCatalog, as_catalog, get_poster_url
+from catalog_store import CATALOG_STORE_PATH, store_exists
+from embeddings import get_embeddings, index_matches_backend, save_index_metadata
+from indexer import FAISS_PATH, index_version, new_index, new_index_dir, publish_index, tune_index
 from logger import get_logger
+import metrics
+from neighbors import NeighborTable, build_neighbor_table, get_vector_index, neighbors_path
 
 # Initialize logger for services
 logger = get_logger("services")
 
-# Helper functions
-def get_poster_url(poster_path):
-    """Construct full TMDB image URL"""
-    if poster_path and isinstance(poster_path, str):
-        return f"https://image.tmdb.org/t/p/w500{poster_path}"
-    return "https://via.placeholder.com/500x750?text=No+Poster"
+# Result caches hold titles / movie ids only; details are hydrated from the catalog on every hit
+search_cache = create_cache("search")
+recommendation_cache = create_cache("recommendations")
+# Candidates taken from each ranking before hybrid search fuses them
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 50))
+# Reciprocal rank fusion damping: a result at rank r scores 1 / (RRF_K + r) per ranking
+RRF_K = 60
+# Per-user taste profiles, keyed by the user's state version (see user_state)
+profile_cache = create_cache("profiles")
+# Profile weight of a watched movie the user hasn't rated, on the 0-10 rating scale
+WATCHED_WEIGHT = float(os.getenv("WATCHED_WEIGHT", 5.0))
+
+# Memory-map the FAISS index read-only so workers share it through the page cache
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"
+
+# Seconds between checks for a newly published FAISS index (0 disables hot reload)
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", 30))
 
+# Resources loaded once in the gunicorn master (preload_app) and inherited by forked workers
+shared_resources = {}
+
+def invalidate_caches():
+    """Drop cached search and recommendation results after the catalog or index changes."""
+    search_cache.clear()
+    recommendation_cache.clear()
+    profile_cache.clear()
+
+# Helper functions
 def format_number(value):
     """Format number with commas"""
     if value is None or (isinstance(value, float) and math.isnan(value)):
@@ -38,6 +67,10 @@ def format_float(value, decimals=1):
     except:
         return str(value)
 
+def json_safe(details):
+    """Copy of a movie details dict that JSON can encode: NaN/inf floats become None."""
+    return {k: (None if isinstance(v, float) and not math.isfinite(v) else v) for k, v in details.items()}
+
 def render_stars(vote_average):
     """Return star rating string"""
     if pd.isna(vote_average):
@@ -45,184 +78,267 @@ def render_stars(vote_average):
     stars = int(round(vote_average / 2))
     return "★" * stars + "☆" * (5 - stars)
 
+@metrics.timed("movie_details")
 def get_movie_details(identifier, df):
     """
     Get detailed information about a movie.
     identifier: can be a title (str) or a TMDB ID (int).
     """
-    if isinstance(identifier, int):
-        match = df[df['id'] == identifier]
-    else:
-        match = df[df['title'].str.lower() == str(identifier).lower()]
-        
-    if not match.empty:
-        details = match.iloc[0].to_dict()
-        
-        # Ensure list fields are properly formatted
-        for field in ['cast', 'crew', 'genres', 'keywords', 'production_companies']:
-            if field in details:
-                raw_value = details[field]
-
-                # Normalize to list
-                if not isinstance(raw_value, list):
-                    if isinstance(raw_value, str) and raw_value:
-                        try:
-                            parsed = ast.literal_eval(raw_value)
-                            raw_value = parsed if isinstance(parsed, list) else [parsed]
-                        except Exception:
-                            # Keep original string so we don't lose info
-                            raw_value = [raw_value]
-                    else:
-                        raw_value = []
-
-                # Extract names from dictionaries or convert to string
-                processed_items = []
-                for item in raw_value:
-                    if isinstance(item, dict):
-                        # Try different keys: 'name', 'character', 'job', or first available value
-                        name = item.get('name') or item.get('character') or item.get('job')
-                        if not name and item:
-                            name = next((v for v in item.values() if v and isinstance(v, str)), None)
-                        if name:
-                            processed_items.append(str(name).strip())
-                    elif item:
-                        processed_items.append(str(item).strip())
-
-                details[field] = [item for item in processed_items if item and item.strip()]
-            else:
-                details[field] = []
-        
-        # Ensure overview is a string
-        overview_value = details.get('overview')
-        if overview_value is None or (isinstance(overview_value, float) and str(overview_value) == 'nan'):
-            details['overview'] = ""
-        else:
-            details['overview'] = str(overview_value)
-        
-        # Handle numeric fields
-        for field in ['budget', 'revenue', 'runtime', 'vote_average', 'vote_count', 'popularity']:
-            if field in details:
-                if isinstance(details[field], float) and math.isnan(details[field]):
-                    details[field] = None
-                elif details[field] == 0 and field in ['budget', 'revenue']:
-                    details[field] = None
-        
-        # Release date formatting can stay as it's often needed in data, but purely UI strings should go
-        if 'release_date' in details and details['release_date']:
-            try:
-                if isinstance(details['release_date'], str):
-                    date_obj = datetime.strptime(details['release_date'], '%Y-%m-%d')
-                    details['year'] = str(date_obj.year)
-                else:
-                    details['year'] = 'N/A'
-            except:
-                details['year'] = 'N/A'
-        
-        details['poster_url'] = get_poster_url(details.get('poster_path'))
-        
-        return details
-    return None
+    return as_catalog(df).get(identifier)
 
+@metrics.timed("movies_details")
+def get_movies_details(movie_ids, df):
+    """
+    Batch version of get_movie_details for TMDB ids.
+    Returns details aligned with `movie_ids`, with None for unknown ids.
+    """
+    return as_catalog(df).get_many(movie_ids)
+
+@metrics.timed("search")
 def search_movies(query, df, limit=12):
     """
     Search for movies using a tiered "Smart Search" approach.
     """
-    query = query.strip().lower()
+    catalog = as_catalog(df)
+    key = f"{catalog.version}|{limit}|{query.strip().lower()}"
+    titles = search_cache.get(key)
+    if titles is None:
+        titles = catalog.search_index.search(query, limit)
+        search_cache.set(key, titles)
+    return [catalog.get(t) for t in titles]
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Merge ranked lists of ids, scoring each id by the sum of 1 / (k + rank) over the lists."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    # Stable sort: equal scores keep first-seen order
+    return sorted(scores, key=scores.get, reverse=True)
+
+@metrics.timed("hybrid_search")
+def hybrid_search(query, df, retriever, limit=12):
+    """
+    Free-text search mixing BM25 over titles, tags and overviews with vector
+    similarity to the embedded query, fused by reciprocal rank together with
+    the Smart Search title matches. Lexical only while the vector index
+    isn't loaded.
+    """
+    catalog = as_catalog(df)
+    query = query.strip()
     if not query:
         return []
-    
-    results_ordered = []
-    seen_titles = set()
-
-    def add_unique(titles):
-        for t in titles:
-            if t not in seen_titles:
-                results_ordered.append(t)
-                seen_titles.add(t)
-            if len(results_ordered) >= limit:
-                return True
-        return False
-
-    # Tier 1: Direct Title Match (Substring or Exact)
-    exact_matches = df[df['title'].str.lower() == query]['title'].tolist()
-    if add_unique(exact_matches): return [get_movie_details(t, df) for t in results_ordered]
-    
-    starts_with = df[df['title'].str.lower().str.startswith(query)]['title'].tolist()
-    if add_unique(starts_with): return [get_movie_details(t, df) for t in results_ordered]
-    
-    contains = df[df['title'].str.lower().str.contains(query, na=False)]['title'].tolist()
-    if add_unique(contains): return [get_movie_details(t, df) for t in results_ordered]
-
-    # Tier 2: Fuzzy Title Match
-    titles_list = df['title'].tolist()
-    fuzzy_results = process.extract(query, titles_list, scorer=fuzz.token_set_ratio, limit=limit)
-    fuzzy_matches = [match[0] for match in fuzzy_results if match[1] >= 80]
-    if add_unique(fuzzy_matches): return [get_movie_details(t, df) for t in results_ordered]
-
-    # Tier 3: Keyword Match
-    if 'keywords' in df.columns:
-        keyword_matches = df[df['keywords'].str.lower().str.contains(query, na=False)]['title'].tolist()
-        if add_unique(keyword_matches): return [get_movie_details(t, df) for t in results_ordered]
-
-    return [get_movie_details(t, df) for t in results_ordered]
-
-def get_recommendations(title, df, retriever, k=5):
+    key = f"hybrid|{catalog.version}|{limit}|{retriever is not None}|{query.lower()}"
+    ids = search_cache.get(key)
+    if ids is None:
+        rankings = [
+            [r['id'] for r in search_movies(query, catalog, limit)],
+            catalog.ids_at(catalog.bm25_index.search(query, HYBRID_CANDIDATES)),
+        ]
+        if retriever is not None:
+            try:
+                with metrics.timer(metrics.STAGE_DURATION, "embed_query"):
+                    vector = retriever.vectorstore.embedding_function.embed_query(query)
+                rankings.append(get_vector_index(retriever.vectorstore).search_vector(vector, HYBRID_CANDIDATES)[0])
+            except Exception as e:
+                logger.error(f"Vector search failed for '{query}', using BM25 only: {e}")
+        ids = reciprocal_rank_fusion(rankings)[:limit]
+        search_cache.set(key, ids)
+    return [d for d in catalog.get_many(ids) if d]
+
+@metrics.timed("recommendations")
+def get_recommendations_by_id(movie_id, df, retriever, k=5, neighbors=None):
+    """
+    Recommend movies similar to the movie with TMDB id `movie_id`.
+    Served from the precomputed neighbor table when it covers the movie,
+    otherwise by searching the index with the movie's own stored vector.
+    """
     try:
-        title = title.strip()
-        if title not in df['title'].values:
+        catalog = as_catalog(df)
+        if catalog.record(movie_id) is None:
             return []
-        
-        if retriever is None:
-            return []
-            
-        results = retriever.invoke(title, k=k+1)
-        recommendation_titles = [doc.metadata['title'] for doc in results if doc.metadata['title'] != title][:k]
-        
-        return [get_movie_details(t, df) for t in recommendation_titles]
+
+        key = f"{catalog.version}|{movie_id}|{k}"
+        neighbor_ids = recommendation_cache.get(key)
+        if neighbor_ids is None:
+            hit = neighbors.lookup(movie_id, k) if neighbors is not None else None
+            if hit is None:
+                if retriever is None:
+                    # Index not loaded yet (or unavailable): serve popular movies rather than nothing
+                    return catalog.popular(k, exclude={movie_id})
+                hit = get_vector_index(retriever.vectorstore).similar(movie_id, k)
+                if hit is None:
+                    return []
+            neighbor_ids = hit[0]
+            recommendation_cache.set(key, neighbor_ids)
+
+        return [d for d in catalog.get_many(neighbor_ids) if d]
     except Exception as e:
         logger.error(f"Error generating recommendations: {e}")
         return []
 
-def load_movie_data(path='movie_list.pkl'):
-    """Load the movie dataframe."""
+@metrics.timed("recommendations_batch")
+def get_recommendations_batch(movie_ids, df, retriever, k=5, neighbors=None):
+    """
+    get_recommendations_by_id for many movies at once. Cache and neighbor
+    table misses share one batched index search, and every recommended movie
+    is hydrated in a single catalog lookup.
+    Returns {movie_id: [details]} for the known movies, in input order.
+    """
     try:
-        return joblib.load(path)
+        catalog = as_catalog(df)
+        known = [m for m in dict.fromkeys(movie_ids) if catalog.record(m) is not None]
+        neighbor_ids, misses = {}, []
+        for movie_id in known:
+            key = f"{catalog.version}|{movie_id}|{k}"
+            cached = recommendation_cache.get(key)
+            if cached is None and neighbors is not None:
+                hit = neighbors.lookup(movie_id, k)
+                if hit is not None:
+                    cached = hit[0]
+                    recommendation_cache.set(key, cached)
+            if cached is None:
+                misses.append(movie_id)
+            else:
+                neighbor_ids[movie_id] = cached
+
+        if misses and retriever is not None:
+            for movie_id, hit in get_vector_index(retriever.vectorstore).similar_many(misses, k).items():
+                neighbor_ids[movie_id] = hit[0] if hit is not None else []
+                if hit is not None:
+                    recommendation_cache.set(f"{catalog.version}|{movie_id}|{k}", hit[0])
+
+        flat = [n for movie_id in known for n in neighbor_ids.get(movie_id, [])]
+        details = iter(catalog.get_many(flat))
+        results = {}
+        for movie_id in known:
+            if movie_id not in neighbor_ids:
+                # Index not loaded yet (or unavailable): serve popular movies rather than nothing
+                results[movie_id] = catalog.popular(k, exclude={movie_id})
+                continue
+            results[movie_id] = [d for d in (next(details) for _ in neighbor_ids[movie_id]) if d]
+        return results
     except Exception as e:
-        logger.error(f"Error loading movie list: {e}")
+        logger.error(f"Error generating batch recommendations: {e}")
+        return {}
+
+@metrics.timed("recommendations_by_title")
+def get_recommendations(title, df, retriever, k=5, neighbors=None):
+    """Recommend movies similar to `title`; see get_recommendations_by_id."""
+    catalog = as_catalog(df)
+    record = catalog.record(title.strip())
+    if record is None:
+        return []
+    return get_recommendations_by_id(int(record['id']), catalog, retriever, k, neighbors)
+
+@metrics.timed("user_profile")
+def build_user_profile(interactions, retriever):
+    """
+    Taste profile from a user's ratings and bookmarks (see
+    database.get_user_interactions): the rating-weighted mean of the stored
+    vectors of the movies they rated or watched, plus every movie id they
+    already know about. The vector is None when there's nothing to go on.
+    """
+    seen = [int(i['movie_id']) for i in interactions]
+    profile = {"vector": None, "seen": seen}
+    if retriever is None or not interactions:
+        return profile
+
+    ratings = np.array([np.nan if i['rating'] is None else i['rating'] for i in interactions], dtype=np.float32)
+    watched = np.array([i['status'] == 'watched' for i in interactions])
+    weights = np.where(np.isnan(ratings), np.where(watched, WATCHED_WEIGHT, 0.0), ratings).astype(np.float32)
+    found, vectors = get_vector_index(retriever.vectorstore).vectors(seen)
+    weights = weights[found]
+    if weights.sum() <= 0:
+        return profile
+    profile["vector"] = (weights @ vectors / weights.sum()).tolist()
+    return profile
+
+@metrics.timed("profile_recommendations")
+def get_profile_recommendations(profile, df, retriever, k=10):
+    """
+    Movies nearest to a user's taste profile in one index search, leaving out
+    the ones they've already seen. Popular movies when there's no profile yet.
+    """
+    try:
+        catalog = as_catalog(df)
+        if retriever is None or profile["vector"] is None:
+            return catalog.popular(k, exclude=set(profile["seen"]))
+        ids, _ = get_vector_index(retriever.vectorstore).search_vector(profile["vector"], k, exclude=profile["seen"])
+        return [d for d in catalog.get_many(ids) if d]
+    except Exception as e:
+        logger.error(f"Error generating profile recommendations: {e}")
         return []
 
-def create_faiss_index(df, path='movie_recommendation_faiss'):
-    """Create a new FAISS index from the movie dataframe."""
+def load_movie_data(path='movie_list.pkl', store_path=CATALOG_STORE_PATH):
+    """
+    Load the movie catalog. The memory-mapped columnar store is used when it
+    exists; otherwise the pickled DataFrame is loaded and normalized.
+    """
+    try:
+        if store_exists(store_path):
+            logger.info(f"Loading columnar catalog from {store_path}...")
+            catalog = MovieCatalog.from_store(store_path)
+        else:
+            catalog = MovieCatalog(joblib.load(path))
+        # Build search structures now rather than on the first (hybrid) /search request
+        catalog.search_index
+        catalog.bm25_index
+        invalidate_caches()
+        return catalog
+    except Exception as e:
+        logger.error(f"Error loading movie list: {e}")
+        return MovieCatalog()
+
+def movie_documents(df):
+    """One Document per movie: its tags as content, its id and title as metadata."""
+    if isinstance(df, MovieCatalog):
+        ids, titles, tags = df.column('id'), df.column('title'), df.column('tags')
+    else:
+        ids, titles = df['id'].tolist(), df['title'].tolist()
+        tags = df['tags'].tolist() if 'tags' in df.columns else [''] * len(df)
+
+    documents = []
+    for movie_id, title, text in zip(ids, titles, tags):
+        # Join tags into a single string if it's a list
+        if isinstance(text, (list, tuple)):
+            text = " ".join(text)
+        documents.append(Document(
+            page_content=str(text) if text is not None else '',
+            metadata={"id": int(movie_id), "title": str(title)},
+        ))
+    return documents
+
+def create_faiss_index(df, path=FAISS_PATH, backend=None, spec=None, neighbors_k=None):
+    """
+    Create a new FAISS index from the movie dataframe; `spec` picks the index
+    type (see indexer). With `neighbors_k`, the version is published with a
+    neighbor table of that many neighbors per movie.
+    """
     logger.info("Creating new FAISS index. This may take a few minutes...")
     try:
-        if df is None or (isinstance(df, list) and not df):
+        if df is None or len(df) == 0:
             logger.error("Cannot create index: Movie data is empty.")
             return None
 
-        # Prepare documents for embedding
-        documents = []
-        for _, row in df.iterrows():
-            # Join tags into a single string if it's a list
-            tags = row.get('tags', '')
-            if isinstance(tags, list):
-                tags = " ".join(tags)
-            
-            # Create document with metadata
-            doc = Document(
-                page_content=str(tags),
-                metadata={
-                    "id": int(row['id']),
-                    "title": str(row['title'])
-                }
-            )
-            documents.append(doc)
+        documents = movie_documents(df)
         
         # Initialize embedding model
-        embedding = HuggingFaceEndpointEmbeddings(model='sentence-transformers/all-MiniLM-L6-v2')
+        embedding = get_embeddings(backend)
         
         # Create and save vectorstore
-        vectorstore = FAISS.from_documents(documents, embedding)
-        vectorstore.save_local(path)
+        texts = [doc.page_content for doc in documents]
+        vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+        vectorstore = FAISS(embedding, new_index(vectors, spec), InMemoryDocstore(), {})
+        vectorstore.add_embeddings(zip(texts, vectors.tolist()), metadatas=[doc.metadata for doc in documents])
+        # Write a new version and switch to it, never overwriting files workers may have mapped
+        build_dir = new_index_dir(path)
+        vectorstore.save_local(build_dir)
+        save_index_metadata(build_dir, backend)
+        if neighbors_k:
+            build_neighbor_table(vectorstore, neighbors_path(build_dir), neighbors_k)
+        publish_index(build_dir, path)
+        invalidate_caches()
         
         logger.info(f"FAISS index created and saved to {path}.")
         return vectorstore.as_retriever(
@@ -233,7 +349,21 @@ def create_faiss_index(df, path='movie_recommendation_faiss'):
         logger.error(f"Error creating FAISS index: {e}")
         return None
 
-def load_retriever(path='movie_recommendation_faiss'):
+def load_vectorstore(path, embedding, mmap=None):
+    """Load a saved FAISS vectorstore, memory-mapping the index file when enabled."""
+    import faiss
+    mmap = FAISS_MMAP if mmap is None else mmap
+    if not mmap or not hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        vectorstore = FAISS.load_local(path, embedding, allow_dangerous_deserialization=True)
+    else:
+        index = faiss.read_index(os.path.join(path, "index.faiss"), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        with open(os.path.join(path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        vectorstore = FAISS(embedding, index, docstore, index_to_docstore_id)
+    tune_index(vectorstore.index)
+    return vectorstore
+
+def load_retriever(path=FAISS_PATH, backend=None):
     """
     Lazy-load the FAISS retriever.
     If missing, attempts to create one from movie_list.pkl.
@@ -244,27 +374,175 @@ def load_retriever(path='movie_recommendation_faiss'):
         if not os.path.exists(path):
             logger.warning(f"FAISS index directory {path} not found. Triggering auto-creation...")
             df = load_movie_data()
-            return create_faiss_index(df, path)
-
-        # Use CPU explicitly and small model
-        embedding = HuggingFaceEndpointEmbeddings(model='sentence-transformers/all-MiniLM-L6-v2')
-        vectorstore = FAISS.load_local(
-            path, 
-            embedding, 
-            allow_dangerous_deserialization=True
-        )
+            return create_faiss_index(df, path, backend)
+
+        if not index_matches_backend(path, backend):
+            logger.warning(f"FAISS index at {path} was built with a different embedding backend. Rebuilding...")
+            df = load_movie_data()
+            return create_faiss_index(df, path, backend)
+
+        embedding = get_embeddings(backend)
+        vectorstore = load_vectorstore(path, embedding)
         retriever = vectorstore.as_retriever(
             search_type="similarity",
             search_kwargs={"fetch_k": 30}
         )
         logger.info("Recommendation Model loaded successfully.")
+        recommendation_cache.clear()
+        profile_cache.clear()
         return retriever
     except Exception as e:
         logger.error(f"Error loading FAISS model: {e}. Attempting recovery...")
         # If loading fails (e.g. corrupted file), try to recreate
         try:
             df = load_movie_data()
-            return create_faiss_index(df, path)
+            return create_faiss_index(df, path, backend)
         except Exception as re:
             logger.error(f"Critical error: Could not recreate index: {re}")
             return None
+
+def load_warm_retriever(path=FAISS_PATH):
+    """load_retriever, plus building the movie id -> index position map up front."""
+    retriever = load_retriever(path)
+    if retriever is not None:
+        get_vector_index(retriever.vectorstore)
+    return retriever
+
+def load_published_neighbors(path, index_dir, version):
+    """
+    Neighbor table of the index version at `index_dir`, provided that version
+    is still the one published at `path` (read `version` before loading the
+    index); otherwise None, so a table is never paired with another index.
+    """
+    if version is None or index_version(path) != version:
+        return None
+    return NeighborTable.load(neighbors_path(index_dir))
+
+class RetrieverLoader:
+    """
+    Loads the retriever in a background thread. Concurrent callers share
+    that single load instead of racing into their own, and get None until it
+    has finished. Once ready, the saved index is checked every
+    `reload_interval` seconds; when a new version has been published it is
+    loaded in the background and swapped in, serving the old one meanwhile.
+    The neighbor table published with each index version is loaded and
+    swapped along with it (`neighbors`, None when the version has none).
+    """
+
+    def __init__(self, loader=None, path=FAISS_PATH, reload_interval=INDEX_RELOAD_INTERVAL, clock=time.monotonic):
+        self._loader = loader or (lambda: load_warm_retriever(path))
+        self.path = path
+        self.reload_interval = reload_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+        self._reloading = False
+        self._checked_at = clock()
+        self.retriever = None
+        self.neighbors = None
+        self.version = None
+        self.state = "idle"  # idle -> loading -> ready | failed
+        self.error = None
+
+    @classmethod
+    def loaded(cls, retriever, path=FAISS_PATH, neighbors=None, version=None):
+        """A loader that is already finished, e.g. for a retriever preloaded before fork."""
+        loader = cls(path=path)
+        loader._finish(retriever, version or index_version(path), neighbors)
+        return loader
+
+    def start(self):
+        """Begin loading unless a load is running or has succeeded; failed loads are retried."""
+        with self._lock:
+            if self.state in ("idle", "failed"):
+                self.state = "loading"
+                self._spawn()
+        return self
+
+    def reload(self):
+        """Load the index again in the background, keeping the current retriever until it is ready."""
+        with self._lock:
+            if self.state == "ready" and not self._reloading:
+                self._reloading = True
+                self._spawn()
+        return self
+
+    def _spawn(self):
+        self._done.clear()
+        # A daemon, so a shutdown mid-load (e.g. SIGTERM while the model downloads) exits promptly
+        self._thread = threading.Thread(target=self._run, name="retriever-loader", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        # Read the version first so a publish during the load is noticed next time
+        index_dir = os.path.realpath(self.path)
+        version = index_version(index_dir)
+        start = time.perf_counter()
+        try:
+            retriever = self._loader()
+            self.error = None if retriever is not None else "retriever could not be loaded"
+        except Exception as e:
+            logger.error(f"Background retriever load failed: {e}")
+            retriever, self.error = None, str(e)
+        metrics.RETRIEVER_LOAD.observe(time.perf_counter() - start, "ok" if retriever is not None else "failed")
+        neighbors = load_published_neighbors(self.path, index_dir, version) if retriever is not None else None
+        self._finish(retriever, version, neighbors)
+
+    def _finish(self, retriever, version=None, neighbors=None):
+        with self._lock:
+            if retriever is not None:
+                self.retriever, self.neighbors, self.version, self.state = retriever, neighbors, version, "ready"
+                if self._reloading:
+                    # Results cached meanwhile may still come from the old index or table,
+                    # and hybrid search results (in search_cache) rank by the old vectors
+                    recommendation_cache.clear()
+                    profile_cache.clear()
+                    search_cache.clear()
+                    logger.info(f"Reloaded the FAISS index from {self.path}.")
+            elif self.retriever is None:
+                self.state = "failed"
+            self._reloading = False
+            self._done.set()
+
+    def check_for_update(self):
+        """Start a background reload if a new index version was published since the last check."""
+        if self.state != "ready" or self.reload_interval <= 0 or self._reloading:
+            return
+        now = self._clock()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        version = index_version(self.path)
+        if version is not None and version != self.version:
+            logger.info(f"New FAISS index published at {self.path}; reloading in the background.")
+            self.reload()
+
+    def get(self):
+        """The retriever if it is ready, else None; never blocks."""
+        self.check_for_update()
+        return self.retriever
+
+    def wait(self, timeout=None):
+        """Block until the current load finishes; returns the retriever or None."""
+        self._done.wait(timeout)
+        return self.retriever
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+def preload_shared_resources():
+    """
+    Load the catalog, neighbor table and retriever once in the gunicorn master
+    so forked workers inherit them instead of each loading a private copy.
+    """
+    catalog = load_movie_data()
+    index_dir = os.path.realpath(FAISS_PATH)
+    version = index_version(index_dir)
+    start = time.perf_counter()
+    retriever = load_warm_retriever()
+    metrics.RETRIEVER_LOAD.observe(time.perf_counter() - start, "ok" if retriever is not None else "failed")
+    neighbors = load_published_neighbors(FAISS_PATH, index_dir, version) if retriever is not None else None
+    shared_resources.update(catalog=catalog, retriever=retriever, neighbors=neighbors, index_version=version)
+    logger.info(f"Preloaded shared resources ({len(catalog)} movies, retriever {'ready' if retriever else 'unavailable'}).")
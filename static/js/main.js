@@ -96,3 +96,73 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 });
+
+// Library: build a movie card like the one rendered by library.html
+function libraryCard(movie, rated) {
+    const card = document.createElement('div');
+    card.className = 'movie-card';
+    const link = document.createElement('a');
+    link.href = '/movie/' + movie.id;
+    const img = document.createElement('img');
+    img.src = movie.poster_url;
+    img.className = 'movie-poster';
+    img.alt = movie.title;
+    const info = document.createElement('div');
+    info.className = 'movie-info';
+    const title = document.createElement('div');
+    title.className = 'title-text';
+    title.textContent = movie.title;
+    const row = document.createElement('div');
+    row.className = 'd-flex justify-between align-center';
+    const year = document.createElement('span');
+    year.className = 'subtitle-text';
+    year.textContent = movie.year;
+    const badge = document.createElement('span');
+    badge.className = 'rating-badge';
+    if (rated) {
+        badge.style.background = '#eab308';
+        badge.style.boxShadow = '0 4px 10px rgba(234, 179, 8, 0.3)';
+        badge.textContent = '⭐ ' + movie.user_rating;
+    } else {
+        badge.textContent = '★ ' + movie.vote_average_formatted;
+    }
+    row.append(year, badge);
+    info.append(title, row);
+    link.append(img, info);
+    card.append(link);
+    return card;
+}
+
+// Library: append the next page of a section; the button carries its API url and cursor
+async function loadLibraryPage(button) {
+    if (button.disabled) return;
+    button.disabled = true;
+    try {
+        const url = button.dataset.url + (button.dataset.url.includes('?') ? '&' : '?') +
+            'cursor=' + encodeURIComponent(button.dataset.cursor);
+        const response = await fetch(url);
+        if (!response.ok) throw new Error(response.status);
+        const page = await response.json();
+        const grid = button.closest('.tab-content').querySelector('.grid-container');
+        page.items.forEach(movie => grid.append(libraryCard(movie, button.dataset.rated === 'true')));
+        if (page.next_cursor) {
+            button.dataset.cursor = page.next_cursor;
+            button.disabled = false;
+        } else {
+            button.parentElement.remove();
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        showToast("Could not load more movies.");
+        button.disabled = false;
+    }
+}
+
+// Library: load the next page automatically when its button scrolls into view
+document.addEventListener('DOMContentLoaded', function () {
+    if (!('IntersectionObserver' in window)) return;
+    const observer = new IntersectionObserver(entries => {
+        entries.forEach(entry => { if (entry.isIntersecting) loadLibraryPage(entry.target); });
+    });
+    document.querySelectorAll('.load-more').forEach(button => observer.observe(button));
+});
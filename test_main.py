@@ -1,8 +1,29 @@
+import math
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
 import pytest
 from fastapi.testclient import TestClient
 from main import app
 import services
 import joblib
+import numpy as np
+import pandas as pd
+from cache import MemoryCache, RedisCache
+from catalog import MovieCatalog
+from catalog_store import write_store
+from search_index import BM25Index
+import embeddings
+import bulk
+import indexer
+import metrics
+import passwords
+import profiling
+from embeddings import HashingEmbeddings
+from neighbors import NeighborTable, build_neighbor_table, get_vector_index, publish_neighbor_table, vectorstore_metadata
 
 client = TestClient(app)
 
@@ -14,6 +35,182 @@ def df():
     except Exception as e:
         pytest.skip(f"Failed to load movie data: {e}")
 
+@pytest.fixture(scope="module")
+def sample_df():
+    """Small synthetic catalog covering the awkward shapes found in movie_list.pkl."""
+    return pd.DataFrame([
+        {'id': 27205, 'title': 'Inception', 'overview': 'A thief who steals corporate secrets.',
+         'genres': "['Action', 'Science Fiction']", 'keywords': "['dream', 'subconscious', 'heist']",
+         'cast': "[{'name': 'Leonardo DiCaprio'}, {'character': 'Cobb'}]", 'crew': "['Christopher Nolan']",
+         'production_companies': "['Legendary Pictures']", 'release_date': '2010-07-15',
+         'budget': 160000000, 'revenue': 825532764, 'runtime': 148.0, 'vote_average': 8.1,
+         'vote_count': 13752, 'popularity': 167.5, 'poster_path': '/inception.jpg',
+         'tags': 'thief dream heist DiCaprio Nolan'},
+        {'id': 155, 'title': 'The Dark Knight', 'overview': float('nan'),
+         'genres': "['Action', 'Crime']", 'keywords': "['joker', 'dc comics', 'vigilante']",
+         'cast': "['Christian Bale', 'Heath Ledger']", 'crew': "[]",
+         'production_companies': "not a list", 'release_date': 'July 2008',
+         'budget': 0, 'revenue': 0, 'runtime': float('nan'), 'vote_average': 8.2,
+         'vote_count': 12002, 'popularity': 187.3, 'poster_path': None,
+         'tags': 'batman joker gotham vigilante'},
+        {'id': 272, 'title': 'Batman Begins', 'overview': 'Bruce Wayne becomes Batman.',
+         'genres': "['Action', 'Crime', 'Drama']", 'keywords': "['dc comics', 'ninja', 'origin']",
+         'cast': "['Christian Bale']", 'crew': "['Christopher Nolan']",
+         'production_companies': "['Warner Bros.']", 'release_date': '2005-06-10',
+         'budget': 150000000, 'revenue': 374218673, 'runtime': 140.0, 'vote_average': 7.5,
+         'vote_count': 7359, 'popularity': 115.0, 'poster_path': '/begins.jpg',
+         'tags': 'batman origin gotham ninja'},
+        {'id': 268, 'title': 'Batman', 'overview': 'The Dark Knight of Gotham City.',
+         'genres': "['Fantasy', 'Action']", 'keywords': "['dc comics', 'joker']",
+         'cast': "['Michael Keaton', 'Jack Nicholson']", 'crew': "['Tim Burton']",
+         'production_companies': "['PolyGram']", 'release_date': '1989-06-23',
+         'budget': 35000000, 'revenue': 411348924, 'runtime': 126.0, 'vote_average': 7.0,
+         'vote_count': 2096, 'popularity': 44.1, 'poster_path': '/batman.jpg',
+         'tags': 'batman joker gotham burton'},
+        {'id': 19995, 'title': 'Avatar', 'overview': 'In the 22nd century, a paraplegic Marine.',
+         'genres': "['Action', 'Adventure']", 'keywords': "['culture clash', 'future', 'space war']",
+         'cast': "['Sam Worthington']", 'crew': "['James Cameron']",
+         'production_companies': "['Ingenious Film Partners']", 'release_date': float('nan'),
+         'budget': 237000000, 'revenue': 2787965087, 'runtime': 162.0, 'vote_average': float('nan'),
+         'vote_count': 11800, 'popularity': 150.4, 'poster_path': '/avatar.jpg',
+         'tags': 'future space war pandora cameron'},
+        {'id': 99999, 'title': 'inception', 'overview': 'A lowercase duplicate title.',
+         'genres': "", 'keywords': float('nan'), 'cast': None, 'crew': "['Nobody']",
+         'production_companies': "[]", 'release_date': '',
+         'budget': 1, 'revenue': 1, 'runtime': 90.0, 'vote_average': 5.0,
+         'vote_count': 1, 'popularity': 0.1, 'poster_path': '',
+         'tags': 'dream copy'},
+    ])
+
+class FakePool:
+    """
+    Stand-in for database.db_pool that also acts as its connections: records
+    every (query, params) and answers each with `rows`, through plain or
+    named (server-side) cursors.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.queries = []
+        self.cursor_names = []
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self
+
+    async def execute(self, query, params=None):
+        return await self.cursor().execute(query, params)
+
+    def cursor(self, name=None):
+        if name:
+            self.cursor_names.append(name)
+        return _FakeCursor(self)
+
+class _FakeCursor:
+    def __init__(self, pool):
+        self.pool, self.rows, self.itersize = pool, [], None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        self.pool.queries.append((query, params))
+        self.rows = list(self.pool.rows)
+        return self
+
+    async def fetchall(self):
+        return self.rows
+
+    async def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    async def __aiter__(self):
+        for row in self.rows:
+            yield row
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    """A FakePool installed as database.db_pool."""
+    import database
+    pool = FakePool()
+    monkeypatch.setattr(database, "db_pool", pool)
+    return pool
+
+def _baseline_record(movie_id, title, overview, genres, keywords, cast, crew, companies, release_date, year,
+                     budget, revenue, runtime, vote_average, vote_count, popularity, poster_path, poster_url, tags):
+    record = {
+        'id': movie_id, 'title': title, 'overview': overview, 'genres': genres, 'keywords': keywords,
+        'cast': cast, 'crew': crew, 'production_companies': companies, 'release_date': release_date,
+        'budget': budget, 'revenue': revenue, 'runtime': runtime, 'vote_average': vote_average,
+        'vote_count': vote_count, 'popularity': popularity, 'poster_path': poster_path, 'tags': tags,
+        'year': year, 'poster_url': poster_url,
+    }
+    if year is None:
+        del record['year']
+    return record
+
+_NO_POSTER = "https://via.placeholder.com/500x750?text=No+Poster"
+
+# get_movie_details output for each sample_df movie, recorded from the pre-catalog
+# implementation (a mask lookup plus per-call parsing); year None means no 'year' key
+BASELINE_DETAILS = {r['id']: r for r in [
+    _baseline_record(27205, 'Inception', 'A thief who steals corporate secrets.', ['Action', 'Science Fiction'],
+                     ['dream', 'subconscious', 'heist'], ['Leonardo DiCaprio', 'Cobb'], ['Christopher Nolan'],
+                     ['Legendary Pictures'], '2010-07-15', '2010', 160000000, 825532764, 148.0, 8.1, 13752, 167.5,
+                     '/inception.jpg', 'https://image.tmdb.org/t/p/w500/inception.jpg', 'thief dream heist DiCaprio Nolan'),
+    _baseline_record(155, 'The Dark Knight', '', ['Action', 'Crime'], ['joker', 'dc comics', 'vigilante'],
+                     ['Christian Bale', 'Heath Ledger'], [], ['not a list'], 'July 2008', 'N/A', None, None, None,
+                     8.2, 12002, 187.3, float('nan'), _NO_POSTER, 'batman joker gotham vigilante'),
+    _baseline_record(272, 'Batman Begins', 'Bruce Wayne becomes Batman.', ['Action', 'Crime', 'Drama'],
+                     ['dc comics', 'ninja', 'origin'], ['Christian Bale'], ['Christopher Nolan'], ['Warner Bros.'],
+                     '2005-06-10', '2005', 150000000, 374218673, 140.0, 7.5, 7359, 115.0,
+                     '/begins.jpg', 'https://image.tmdb.org/t/p/w500/begins.jpg', 'batman origin gotham ninja'),
+    _baseline_record(268, 'Batman', 'The Dark Knight of Gotham City.', ['Fantasy', 'Action'], ['dc comics', 'joker'],
+                     ['Michael Keaton', 'Jack Nicholson'], ['Tim Burton'], ['PolyGram'], '1989-06-23', '1989',
+                     35000000, 411348924, 126.0, 7.0, 2096, 44.1,
+                     '/batman.jpg', 'https://image.tmdb.org/t/p/w500/batman.jpg', 'batman joker gotham burton'),
+    _baseline_record(19995, 'Avatar', 'In the 22nd century, a paraplegic Marine.', ['Action', 'Adventure'],
+                     ['culture clash', 'future', 'space war'], ['Sam Worthington'], ['James Cameron'],
+                     ['Ingenious Film Partners'], float('nan'), 'N/A', 237000000, 2787965087, 162.0, None, 11800, 150.4,
+                     '/avatar.jpg', 'https://image.tmdb.org/t/p/w500/avatar.jpg', 'future space war pandora cameron'),
+    _baseline_record(99999, 'inception', 'A lowercase duplicate title.', [], [], [], ['Nobody'], [], '', None,
+                     1, 1, 90.0, 5.0, 1, 0.1, '', _NO_POSTER, 'dream copy'),
+]}
+
+# Which movie the baseline returned for each lookup (title lookups: first case-insensitive match)
+BASELINE_LOOKUPS = {
+    27205: 27205, 155: 155, 272: 272, 268: 268, 19995: 19995, 99999: 99999, 123: None,
+    'Inception': 27205, 'The Dark Knight': 155, 'Batman Begins': 272, 'Batman': 268, 'Avatar': 19995,
+    'inception': 27205, 'INCEPTION': 27205, 'Missing': None,
+}
+
+def _legacy_search_titles(query, df, limit=12):
+    """Title order produced by the old full-column pandas search tiers."""
+    from rapidfuzz import process, fuzz
+    query = query.strip().lower()
+    results = []
+    lowered = df['title'].str.lower()
+    tiers = [
+        lambda: df[lowered == query]['title'].tolist(),
+        lambda: df[lowered.str.startswith(query)]['title'].tolist(),
+        lambda: df[lowered.str.contains(query, na=False, regex=False)]['title'].tolist(),
+        lambda: [m[0] for m in process.extract(query, df['title'].tolist(), scorer=fuzz.token_set_ratio, limit=limit) if m[1] >= 80],
+        lambda: df[df['keywords'].str.lower().str.contains(query, na=False, regex=False)]['title'].tolist(),
+    ]
+    for tier in tiers:
+        for t in tier():
+            if t not in results:
+                results.append(t)
+            if len(results) >= limit:
+                return results
+    return results
+
+def _nan_safe(details):
+    return {k: ('nan' if isinstance(v, float) and math.isnan(v) else v) for k, v in details.items()}
+
 # Service Level Tests
 def test_format_number():
     assert services.format_number(1000) == "1,000"
@@ -37,6 +234,496 @@ def test_get_movie_details(df):
     assert details is not None
     assert details['title'] == title
 
+def test_catalog_matches_baseline_details(sample_df):
+    catalog = MovieCatalog(sample_df)
+    for identifier, movie_id in BASELINE_LOOKUPS.items():
+        actual = services.get_movie_details(identifier, catalog)
+        if movie_id is None:
+            assert actual is None
+        else:
+            assert _nan_safe(actual) == _nan_safe(BASELINE_DETAILS[movie_id])
+            assert list(actual) == list(BASELINE_DETAILS[movie_id])
+
+def test_raw_frames_build_their_catalog_once(sample_df, monkeypatch):
+    import gc
+    import catalog as catalog_module
+    frame = sample_df.copy()
+    first = catalog_module.as_catalog(frame)
+    def rebuild(self, df=None):
+        raise AssertionError("the frame's catalog was rebuilt")
+
+    monkeypatch.setattr(catalog_module.MovieCatalog, "__init__", rebuild)
+    assert services.get_movie_details(155, frame)['title'] == "The Dark Knight"
+    assert services.search_movies("Batman", frame) and catalog_module.as_catalog(frame) is first
+
+    # The cached catalog goes with its frame
+    key = id(frame)
+    del frame
+    gc.collect()
+    assert key not in catalog_module._frame_catalogs
+
+def test_catalog_records_are_immutable(sample_df):
+    catalog = MovieCatalog(sample_df)
+    details = catalog.get(27205)
+    details['user_status'] = 'watched'
+    details['genres'].append('Thriller')
+    assert 'user_status' not in catalog.get(27205)
+    assert catalog.get(27205)['genres'] == ['Action', 'Science Fiction']
+    with pytest.raises(TypeError):
+        catalog.record(27205)['title'] = 'Changed'
+
+@pytest.mark.parametrize("column, value", [("tags", "heist dreams"), ("overview", "Rewritten."), ("vote_average", 9.9)])
+def test_catalog_version_tracks_every_column(sample_df, column, value):
+    changed = sample_df.copy()
+    changed.loc[changed['id'] == 27205, column] = value
+    assert MovieCatalog(sample_df.copy()).version == MovieCatalog(sample_df).version
+    assert MovieCatalog(changed).version != MovieCatalog(sample_df).version
+
+@pytest.mark.parametrize("query", ["Batman", "bat", "dark", "ception", "incepton", "dc comics", "joker", "ava", "zzz", "  "])
+@pytest.mark.parametrize("limit", [1, 2, 12])
+def test_search_index_matches_legacy_tiers(sample_df, query, limit):
+    catalog = MovieCatalog(sample_df)
+    titles = catalog.search_index.search(query, limit=limit)
+    expected = _legacy_search_titles(query, sample_df, limit=limit) if query.strip() else []
+    assert titles == expected
+    assert services.search_movies(query, catalog, limit=limit) == [catalog.get(t) for t in expected]
+
+def test_bm25_index_matches_reference_scores():
+    texts = ["batman joker gotham", "batman origin gotham ninja batman", "space war", None, "the joker"]
+    index = BM25Index(texts)
+    docs = [t.split() if t else [] for t in texts]
+    avg = sum(map(len, docs)) / len(docs)
+    expected = {}
+    for term in {"batman", "joker"}:
+        df_t = sum(term in d for d in docs)
+        idf = math.log(1 + (len(docs) - df_t + 0.5) / (df_t + 0.5))
+        for pos, d in enumerate(docs):
+            tf = d.count(term)
+            if tf:
+                expected[pos] = expected.get(pos, 0) + idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * len(d) / avg))
+    positions, scores = index.scores("Batman JOKER joker")
+    assert dict(zip(positions.tolist(), scores.tolist())) == pytest.approx(expected)
+    assert index.search("batman joker", 2) == sorted(expected, key=expected.get, reverse=True)[:2]
+    assert index.search("unknown words", 5) == []
+
+def test_hybrid_search_fuses_lexical_and_vector_rankings(sample_df, tmp_path):
+    assert services.reciprocal_rank_fusion([[1, 2, 3], [3, 1]]) == [1, 3, 2]
+    catalog = MovieCatalog(sample_df)
+    services.invalidate_caches()
+    # Without the vector index: BM25 alone, over titles, tags and overviews
+    lexical = [r['id'] for r in services.hybrid_search("joker gotham", catalog, None)]
+    assert lexical[:2] in ([155, 268], [268, 155]) and set(lexical) == {155, 268, 272}
+    assert [r['id'] for r in services.hybrid_search("paraplegic marine", catalog, None)] == [19995]
+    assert services.hybrid_search("Avatar", catalog, None)[0]['id'] == 19995
+    assert services.hybrid_search("  ", catalog, None) == []
+
+    retriever = services.create_faiss_index(sample_df, str(tmp_path / "faiss"), backend="hashing")
+    hybrid = [r['id'] for r in services.hybrid_search("joker gotham", catalog, retriever, limit=4)]
+    assert len(hybrid) == 4 and set(hybrid[:2]) == {155, 268}
+
+    # Rankings from the old vectors are dropped when a reloaded index is swapped in
+    loader = services.RetrieverLoader(lambda: retriever, path=str(tmp_path / "faiss")).start()
+    loader.wait(5)
+    services.hybrid_search("joker gotham", catalog, retriever, limit=4)
+    assert len(services.search_cache) > 0
+    loader.reload().wait(5)
+    assert len(services.search_cache) == 0
+
+def test_catalog_load_builds_search_indexes_up_front(sample_df, tmp_path):
+    joblib.dump(sample_df, tmp_path / "movies.pkl")
+    catalog = services.load_movie_data(str(tmp_path / "movies.pkl"), store_path=str(tmp_path / "no_store"))
+    assert len(catalog) == len(sample_df)
+    assert {"search_index", "bm25_index"} <= set(vars(catalog))
+
+def test_columnar_store_round_trips_catalog(sample_df, tmp_path):
+    catalog = MovieCatalog(sample_df)
+    write_store(sample_df, tmp_path / "catalog")
+
+    # Cold bulk decode (every field kind, unknown and repeated ids) matches the in-memory catalog
+    ids = [int(i) for i in sample_df['id']] + [123, 155]
+    cold = MovieCatalog.from_store(tmp_path / "catalog")
+    assert [d and _nan_safe(d) for d in cold.get_many(ids)] == [d and _nan_safe(d) for d in catalog.get_many(ids)]
+    assert cold._records._cache.stats()['size'] == len(sample_df)
+
+    stored = MovieCatalog.from_store(tmp_path / "catalog")
+    assert len(stored) == len(catalog)
+    assert stored.version == catalog.version
+    for identifier in list(sample_df['title']) + [int(i) for i in sample_df['id']] + ['INCEPTION']:
+        assert _nan_safe(stored.get(identifier)) == _nan_safe(catalog.get(identifier))
+    assert stored.get('Missing') is None
+    assert [_nan_safe(d) for d in stored.get_many([155, 27205])] == [_nan_safe(d) for d in catalog.get_many([155, 27205])]
+    for query in ["bat", "ception", "incepton", "dc comics"]:
+        assert stored.search_index.search(query) == catalog.search_index.search(query)
+
+def test_hashing_embeddings_are_deterministic_unit_vectors():
+    encoder = HashingEmbeddings(dim=64, batch_size=2)
+    texts = ["batman joker gotham", "batman gotham vigilante", "space war future", ""]
+    vectors = encoder.encode(texts)
+    assert vectors.shape == (4, 64)
+    assert (vectors == HashingEmbeddings(dim=64).encode(texts)).all()
+    assert abs(float((vectors[0] ** 2).sum()) - 1.0) < 1e-5
+    assert not vectors[3].any()
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+def test_offline_index_build_and_load(sample_df, tmp_path):
+    path = str(tmp_path / "faiss")
+    assert services.create_faiss_index(sample_df, path, backend="hashing") is not None
+    retriever = services.load_retriever(path, backend="hashing")
+    docs = retriever.vectorstore.similarity_search("batman gotham joker", k=2)
+    assert {d.metadata['title'] for d in docs} <= {'The Dark Knight', 'Batman Begins', 'Batman'}
+
+def test_neighbor_table_serves_recommendations(sample_df, tmp_path):
+    retriever = services.create_faiss_index(sample_df, str(tmp_path / "faiss"), backend="hashing")
+    table = build_neighbor_table(retriever.vectorstore, str(tmp_path / "neighbors"), k=3)
+    assert table.neighbors.shape == (len(sample_df), 3)
+    assert isinstance(NeighborTable.load(str(tmp_path / "neighbors")).ids, np.memmap)
+
+    neighbor_ids, scores = table.lookup(155, 3)
+    assert 155 not in neighbor_ids
+    assert scores == sorted(scores)
+    assert table.lookup(123, 3) is None and table.lookup(155, 4) is None
+
+    catalog = MovieCatalog(sample_df)
+    recs = services.get_recommendations('The Dark Knight', catalog, None, k=2, neighbors=table)
+    assert [r['id'] for r in recs] == neighbor_ids[:2]
+
+def test_recommendations_by_id_use_stored_vectors(sample_df, tmp_path):
+    class NoEmbedding(HashingEmbeddings):
+        def embed_query(self, text):
+            raise AssertionError("recommendations must not embed at request time")
+
+    retriever = services.create_faiss_index(sample_df, str(tmp_path / "faiss"), backend="hashing")
+    table = build_neighbor_table(retriever.vectorstore, str(tmp_path / "neighbors"), k=3)
+    retriever.vectorstore.embedding_function = NoEmbedding()
+
+    catalog = MovieCatalog(sample_df)
+    live = services.get_recommendations_by_id(155, catalog, retriever, k=3)
+    assert [r['id'] for r in live] == table.lookup(155, 3)[0]
+    assert services.get_recommendations_by_id(123, catalog, retriever) == []
+
+def test_recommendations_fall_back_to_popular_while_index_loads(sample_df):
+    catalog = MovieCatalog(sample_df)
+    services.invalidate_caches()
+    recs = services.get_recommendations_by_id(155, catalog, None, k=3)
+    assert [r['id'] for r in recs] == [27205, 19995, 272]
+    assert [r['id'] for r in catalog.popular(2)] == [155, 27205]
+
+def test_retriever_loader_is_single_flight():
+    release, calls = threading.Event(), []
+
+    def slow_load():
+        calls.append(1)
+        release.wait(5)
+        return "retriever"
+
+    loader = services.RetrieverLoader(slow_load)
+    threads = [threading.Thread(target=loader.start) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert loader.state == "loading" and loader.get() is None
+    # A hung load must not keep the process alive at shutdown
+    assert loader._thread.daemon
+    release.set()
+    assert loader.wait(5) == "retriever"
+    assert loader.ready and len(calls) == 1
+    assert loader.start().get() == "retriever" and len(calls) == 1
+
+def test_incremental_index_sync_embeds_only_changes(sample_df, tmp_path, monkeypatch):
+    path = str(tmp_path / "faiss")
+    services.create_faiss_index(sample_df, path, backend="hashing")
+    first_version = os.path.realpath(path)
+
+    changed = sample_df[sample_df['id'] != 268].copy()
+    changed.loc[changed['id'] == 155, 'tags'] = 'joker chaos gotham'
+    changed = pd.concat([changed, pd.DataFrame([{'id': 680, 'title': 'Pulp Fiction', 'tags': 'crime diner'}])])
+
+    embedded = []
+    class CountingEmbeddings(HashingEmbeddings):
+        def embed_documents(self, texts):
+            embedded.extend(texts)
+            return super().embed_documents(texts)
+    monkeypatch.setattr(embeddings, "get_embeddings", lambda backend=None: CountingEmbeddings())
+
+    stats = indexer.sync_faiss_index(MovieCatalog(changed), path, backend="hashing")
+    assert stats == {"embedded": 2, "removed": 2, "unchanged": 4}
+    assert sorted(embedded) == ['crime diner', 'joker chaos gotham']
+    assert os.path.realpath(path) != first_version and os.path.islink(path)
+
+    # Same vectors as a full rebuild of the changed catalog
+    synced = services.load_vectorstore(path, HashingEmbeddings())
+    rebuilt = services.create_faiss_index(changed, str(tmp_path / "full"), backend="hashing").vectorstore
+    def vectors(vs):
+        ids, _ = vectorstore_metadata(vs)
+        return {movie_id: vs.index.reconstruct(pos).tolist() for pos, movie_id in enumerate(ids.tolist())}
+    assert vectors(synced) == vectors(rebuilt)
+    assert indexer.sync_faiss_index(MovieCatalog(changed), path, backend="hashing")["embedded"] == 0
+
+@pytest.mark.parametrize("spec", ["IVF64,Flat", "HNSW8"])
+def test_index_specs_match_exact_results_on_small_catalog(sample_df, tmp_path, spec):
+    exact = services.create_faiss_index(sample_df, str(tmp_path / "flat"), backend="hashing")
+    path = str(tmp_path / "approx")
+    services.create_faiss_index(sample_df, path, backend="hashing", spec=spec)
+    approx = services.load_retriever(path, backend="hashing")
+    assert type(approx.vectorstore.index).__name__ != "IndexFlatL2"
+
+    catalog = MovieCatalog(sample_df)
+    for movie_id in [155, 272, 19995]:
+        # Same distances; ids may differ among equally distant movies
+        assert get_vector_index(approx.vectorstore).similar(movie_id, 3)[1] == get_vector_index(exact.vectorstore).similar(movie_id, 3)[1]
+
+    # Entries can't be dropped in place from these indexes, so a removal rebuilds
+    stats = indexer.sync_faiss_index(MovieCatalog(sample_df[sample_df['id'] != 268]), path, backend="hashing")
+    assert stats["removed"] == 1 and services.load_vectorstore(path, HashingEmbeddings()).index.ntotal == len(catalog) - 1
+
+def test_retriever_loader_hot_reloads_published_index(tmp_path):
+    path, now = tmp_path / "faiss", [0.0]
+    def publish(content):
+        build = indexer.new_index_dir(str(path))
+        with open(os.path.join(build, "index.faiss"), "w") as f:
+            f.write(content)
+        indexer.publish_index(build, str(path))
+    publish("v1")
+
+    release = threading.Event()
+    def load():
+        if (path / "index.faiss").read_text() == "v2":
+            release.wait(5)
+        return (path / "index.faiss").read_text()
+
+    loader = services.RetrieverLoader(load, path=str(path), reload_interval=10, clock=lambda: now[0]).start()
+    assert loader.wait(5) == "v1"
+    publish("v2")
+    assert loader.get() == "v1"
+    now[0] = 11
+    assert loader.get() == "v1"
+    release.set()
+    assert loader.wait(5) == "v2" and loader.get() == "v2"
+
+def test_neighbor_table_is_swapped_in_with_its_index_version(sample_df, tmp_path):
+    path, now = str(tmp_path / "faiss"), [0.0]
+    services.create_faiss_index(sample_df, path, backend="hashing", neighbors_k=3)
+    first_dir, first_version = os.path.realpath(path), indexer.index_version(path)
+    loader = services.RetrieverLoader(
+        lambda: services.load_retriever(path, backend="hashing"), path=path, reload_interval=10, clock=lambda: now[0]
+    ).start()
+    loader.wait(5)
+    assert 268 in loader.neighbors.ids.tolist()
+
+    # A synced index without a table must not keep serving the old one
+    indexer.sync_faiss_index(MovieCatalog(sample_df[sample_df['id'] != 268]), path, backend="hashing")
+    assert services.load_published_neighbors(path, first_dir, first_version) is None
+    now[0] = 11
+    loader.check_for_update()
+    loader.wait(5)
+    assert loader.ready and loader.neighbors is None
+
+    publish_neighbor_table(path, k=3, backend="hashing")
+    now[0] = 22
+    loader.check_for_update()
+    loader.wait(5)
+    assert loader.version == indexer.index_version(path)
+    assert 268 not in loader.neighbors.ids.tolist()
+    assert all(268 not in row for row in loader.neighbors.neighbors.tolist())
+
+def test_batch_recommendations_use_one_index_search(sample_df, tmp_path):
+    retriever = services.create_faiss_index(sample_df, str(tmp_path / "faiss"), backend="hashing")
+    catalog = MovieCatalog(sample_df)
+    ids = [155, 272, 123, 19995, 155]
+    services.invalidate_caches()
+    expected = {m: services.get_recommendations_by_id(m, catalog, retriever, k=3) for m in [155, 272, 19995]}
+
+    class CountingIndex:
+        def __init__(self, index):
+            self.index, self.searches = index, 0
+        def search(self, queries, k):
+            self.searches += 1
+            return self.index.search(queries, k)
+        def __getattr__(self, name):
+            return getattr(self.index, name)
+
+    vector_index = get_vector_index(retriever.vectorstore)
+    counting = vector_index.index = CountingIndex(vector_index.index)
+    services.invalidate_caches()
+    batch = services.get_recommendations_batch(ids, catalog, retriever, k=3)
+    assert batch == expected and list(batch) == [155, 272, 19995]
+    assert counting.searches == 1
+    assert services.get_recommendations_batch(ids, catalog, retriever, k=3) == expected
+    assert counting.searches == 1
+
+    services.invalidate_caches()
+    fallback = services.get_recommendations_batch([155], catalog, None, k=2)
+    assert [r['id'] for r in fallback[155]] == [27205, 19995]
+
+def test_user_profile_recommendations(sample_df, tmp_path):
+    retriever = services.create_faiss_index(sample_df, str(tmp_path / "faiss"), backend="hashing")
+    catalog = MovieCatalog(sample_df)
+    interactions = [
+        {'movie_id': 155, 'rating': 9.0, 'status': None},
+        {'movie_id': 272, 'rating': None, 'status': 'watched'},
+        {'movie_id': 268, 'rating': None, 'status': 'to_watch'},
+        {'movie_id': 123, 'rating': 8.0, 'status': None},
+    ]
+    profile = services.build_user_profile(interactions, retriever)
+    assert profile["seen"] == [155, 272, 268, 123]
+
+    vector_index = get_vector_index(retriever.vectorstore)
+    found, vectors = vector_index.vectors([155, 272, 268, 123])
+    assert found.tolist() == [True, True, True, False]
+    expected = (9.0 * vectors[0] + services.WATCHED_WEIGHT * vectors[1]) / (9.0 + services.WATCHED_WEIGHT)
+    assert np.allclose(profile["vector"], expected, atol=1e-6)
+
+    recommended = [r['id'] for r in services.get_profile_recommendations(profile, catalog, retriever, k=10)]
+    assert sorted(recommended) == [19995, 27205, 99999]
+
+    # No rated or watched movies (or no index yet): popular unseen movies
+    cold = services.build_user_profile([{'movie_id': 268, 'rating': None, 'status': 'to_watch'}], retriever)
+    assert cold["vector"] is None
+    assert [r['id'] for r in services.get_profile_recommendations(cold, catalog, retriever, k=2)] == [155, 27205]
+
+    with TestClient(app) as client:
+        assert client.get("/api/recommendations/for-you").status_code == 401
+
+def test_user_state_is_cached_until_a_write_in_any_worker(monkeypatch):
+    import multiprocessing
+    import database
+    import user_state
+
+    rows = [{'movie_id': 155, 'rating': 8.0, 'status': 'watched'}, {'movie_id': 272, 'rating': None, 'status': 'to_watch'}]
+    loads = []
+
+    async def fake_interactions(user_id):
+        loads.append(user_id)
+        return rows
+
+    monkeypatch.setattr(database, "db_pool", object())
+    monkeypatch.setattr(database, "get_user_interactions", fake_interactions)
+    user_id = 424242
+    user_state.invalidate(user_id)
+
+    state = asyncio.run(database.get_user_state(user_id))
+    assert asyncio.run(database.get_user_state(user_id)) is state and loads == [user_id]
+    assert state.movie_states([155, 272, 1]) == {
+        155: {'status': 'watched', 'rating': 8.0}, 272: {'status': 'to_watch', 'rating': None},
+        1: {'status': None, 'rating': None},
+    }
+    assert state.interactions() == rows
+    assert state.with_status('to_watch') == [272]
+
+    # A write in another (forked) worker invalidates this worker's copy through shared memory
+    child = multiprocessing.get_context("fork").Process(target=user_state.invalidate, args=(user_id,))
+    child.start()
+    child.join()
+    assert user_state.cached(user_id) is None
+    assert asyncio.run(database.get_user_state(user_id)) is not state and loads == [user_id, user_id]
+
+    # Writes store a fresh stamp: back-to-back ones (even within one clock tick) still move it
+    stamps = [user_state.version(user_id)]
+    for _ in range(3):
+        user_state.invalidate(user_id)
+        stamps.append(user_state.version(user_id))
+    assert len(set(stamps)) == 4
+
+def test_movie_states_take_one_bounded_query_for_one_or_many_movies(fake_pool, monkeypatch):
+    import database
+    import user_state
+
+    async def interactions(user_id):
+        raise AssertionError("a cold movie lookup must not load the whole history")
+
+    monkeypatch.setattr(database, "get_user_interactions", interactions)
+    user_id = 424244
+    user_state.invalidate(user_id)
+
+    # (movie_id, status, rating) per requested id: bookmarked only
+    fake_pool.rows = [(272, 'to_watch', None)]
+    assert asyncio.run(database.get_user_movie_states(user_id, [272])) == {272: {'status': 'to_watch', 'rating': None}}
+    # Rated and watched, rated only, neither; duplicate ids are asked for once
+    fake_pool.rows = [(155, 'watched', 8.0), (19995, None, 6.5), (1, None, None)]
+    assert asyncio.run(database.get_user_movie_states(user_id, [155, 19995, 1, 155])) == {
+        155: {'status': 'watched', 'rating': 8.0},
+        19995: {'status': None, 'rating': 6.5},
+        1: {'status': None, 'rating': None},
+    }
+    assert [params for _, params in fake_pool.queries] == [([272], user_id, user_id), ([155, 19995, 1], user_id, user_id)]
+
+    # A current cached state answers without a query
+    user_state.store(user_id, user_state.UserState(user_state.version(user_id), {272: 'watched'}, {}))
+    assert asyncio.run(database.get_user_movie_states(user_id, [272, 1])) == {
+        272: {'status': 'watched', 'rating': None}, 1: {'status': None, 'rating': None},
+    }
+    assert asyncio.run(database.get_user_movie_states(user_id, [])) == {}
+    assert len(fake_pool.queries) == 2
+    user_state.invalidate(user_id)
+
+def test_batch_details_match_single_lookups(sample_df):
+    catalog = MovieCatalog(sample_df)
+    ids = [272, 123, 155, 272, 99999]
+    batch = services.get_movies_details(ids, catalog)
+    assert batch == [catalog.get(i) for i in ids]
+    assert batch[1] is None and batch[0] is not batch[3]
+    assert services.get_movies_details([], catalog) == []
+    assert MovieCatalog().get_many([1, 2]) == [None, None]
+
+class FakeRedis:
+    """Local stand-in for the handful of Redis commands RedisCache uses."""
+    def __init__(self):
+        self.values, self.lru = {}, {}
+    def get(self, key):
+        return self.values.get(key)
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+            if key.endswith(':lru'):
+                self.lru.clear()
+    def zadd(self, key, mapping):
+        self.lru.update(mapping)
+    def zcard(self, key):
+        return len(self.lru)
+    def zrange(self, key, start, stop):
+        return sorted(self.lru, key=self.lru.get)
+    def zpopmin(self, key, count):
+        popped = sorted(self.lru.items(), key=lambda item: item[1])[:count]
+        for member, _ in popped:
+            del self.lru[member]
+        return popped
+
+def test_memory_cache_lru_and_ttl():
+    now = [0.0]
+    cache = MemoryCache("test", max_size=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", [1])
+    cache.set("b", [2])
+    assert cache.get("a") == [1]
+    cache.set("c", [3])
+    assert cache.get("b") is None
+    now[0] = 11
+    assert cache.get("a") is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "evictions": 1, "size": 1}
+
+def test_redis_cache_is_shared_and_cleared_across_workers():
+    client = FakeRedis()
+    worker_a, worker_b = RedisCache(client, "search", max_size=2), RedisCache(client, "search", max_size=2)
+    worker_a.set("q1", ["Batman"])
+    assert worker_b.get("q1") == ["Batman"]
+    worker_a.set("q2", [])
+    worker_a.set("q3", ["Avatar"])
+    assert worker_b.get("q1") is None and len(worker_b) == 2
+    worker_b.clear()
+    assert worker_a.get("q3") is None
+
+def test_search_results_are_cached_and_invalidated(sample_df, monkeypatch):
+    catalog = MovieCatalog(sample_df)
+    services.invalidate_caches()
+    first = services.search_movies(" Batman ", catalog)
+    monkeypatch.setattr(catalog.search_index, "search", lambda q, limit: pytest.fail("expected a cache hit"))
+    assert services.search_movies("batman", catalog) == first
+    services.invalidate_caches()
+    with pytest.raises(pytest.fail.Exception):
+        services.search_movies("batman", catalog)
+
 # API Tests
 def test_home_page():
     with TestClient(app) as client:
@@ -50,6 +737,353 @@ def test_search_endpoint():
         response = client.get("/search?q=Batman")
         assert response.status_code == 200
         assert "Batman" in response.text
+        assert client.get("/search?q=Batman&mode=hybrid").status_code == 200
+        assert client.get("/search?q=Batman&mode=other").status_code == 422
+
+def test_metrics_histograms_render_in_prometheus_format():
+    stage = 'test "stage"'
+    for seconds in (0.0002, 0.003, 0.003, 20):
+        metrics.STAGE_DURATION.observe(seconds, stage)
+    lines = metrics.render().splitlines()
+    labels = 'stage="test \\"stage\\"",'
+    assert f'service_stage_duration_seconds_bucket{{{labels}le="0.0005"}} 1' in lines
+    assert f'service_stage_duration_seconds_bucket{{{labels}le="0.005"}} 3' in lines
+    assert f'service_stage_duration_seconds_bucket{{{labels}le="10.0"}} 3' in lines
+    assert f'service_stage_duration_seconds_bucket{{{labels}le="+Inf"}} 4' in lines
+    assert f'service_stage_duration_seconds_count{{{labels[:-1]}}} 4' in lines
+    assert metrics.STAGE_DURATION.snapshot(stage) == (4, pytest.approx(20.0062))
+
+def test_metrics_endpoint_reports_routes_stages_and_caches():
+    with TestClient(app) as client:
+        client.get("/search?q=Batman")
+        client.get("/movie/155")
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/search",status="200"}' in text
+    assert 'route="/movie/{movie_id}"' in text
+    assert 'service_stage_duration_seconds_count{stage="search"}' in text
+    assert 'service_stage_duration_seconds_count{stage="render:index.html"}' in text
+    assert 'cache_misses_total{cache="search"}' in text
+    assert "# TYPE retriever_ready gauge" in text
+
+def test_profiling_on_demand_and_admin_listing(tmp_path, monkeypatch):
+    import dependencies
+    monkeypatch.setattr(dependencies, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    saves, save = [], profiling.save_profile
+
+    def recording_save(*args):
+        saves.append(_off_event_loop())
+        return save(*args)
+
+    monkeypatch.setattr(profiling, "save_profile", recording_save)
+    with TestClient(app) as client:
+        client.get("/search?q=Batman")
+        client.get("/search?q=Batman", headers={"X-Profile": "wrong"})
+        assert profiling.list_profiles() == []
+
+        # The token is only accepted as a header, never from the URL
+        client.get("/search?q=Batman&profile=s3cret")
+        assert profiling.list_profiles() == []
+
+        assert client.get("/search?q=Batman", headers={"X-Profile": "s3cret"}).status_code == 200
+        client.get("/movie/155", headers={"X-Profile": "s3cret"})
+        names = profiling.list_profiles()
+        assert len(names) == 2 and names[0].endswith("-GET-movie_movie_id")
+        # Profiles are written from the threadpool, not the event loop
+        assert saves == [True, True]
+
+        assert client.get("/admin/profiles").status_code == 401
+        assert client.get("/admin/profiles", headers={"X-Admin-Token": "wrong"}).status_code == 401
+        listing = client.get("/admin/profiles", headers={"X-Admin-Token": "s3cret"}).json()
+        assert [p["name"] for p in listing["profiles"]] == names
+        search = listing["profiles"][1]
+        assert search["route"] == "/search" and search["status"] == 200
+        assert "search" in [span["stage"] for span in search["spans"]]
+        durations = [span["duration_ms"] for span in listing["slowest_spans"]]
+        assert durations == sorted(durations, reverse=True)
+
+        stacks = client.get(f"/admin/profiles/{names[0]}", headers={"X-Admin-Token": "s3cret"})
+        assert stacks.status_code == 200
+        assert client.get("/admin/profiles/nope", headers={"X-Admin-Token": "s3cret"}).status_code == 404
+
+def test_stack_sampler_records_busy_threads():
+    sampler = profiling.StackSampler(interval=0.001).start()
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+    stacks = sampler.stop()
+    assert sampler.samples > 0
+    assert any("test_stack_sampler_records_busy_threads (test_main.py" in stack for stack in stacks)
+    assert all(";" in stack or stack for stack in stacks)
+
+def test_stack_sampler_keeps_only_the_profiled_requests_threads():
+    from fastapi.concurrency import run_in_threadpool
+    stop = threading.Event()
+
+    def busy_until(deadline):
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+
+    def unrelated_work():
+        while not stop.is_set():
+            sum(range(1000))
+
+    async def unrelated_request():
+        await asyncio.sleep(0.01)
+        busy_until(time.perf_counter() + 0.05)
+
+    async def profiled_request():
+        other = asyncio.create_task(unrelated_request())
+        sampler = profiling.StackSampler(interval=0.001).start()
+        await run_in_threadpool(busy_until, time.perf_counter() + 0.1)
+        await other
+        return sampler.stop()
+
+    # Another thread and another task on the same loop are busy meanwhile
+    bystander = threading.Thread(target=unrelated_work)
+    bystander.start()
+    try:
+        stacks = asyncio.run(profiled_request())
+    finally:
+        stop.set()
+        bystander.join()
+    assert any("busy_until (test_main.py" in stack for stack in stacks)
+    assert not any("unrelated_work" in stack or "unrelated_request" in stack for stack in stacks)
+
+def test_password_pool_hashes_in_processes_and_sheds_load(monkeypatch):
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 4)
+
+    async def hash_and_verify():
+        hashed = await passwords.hash_password_async("hunter22")
+        return hashed, await passwords.verify_password("hunter22", hashed), await passwords.verify_password("nope", hashed)
+
+    try:
+        hashed, good, bad = asyncio.run(hash_and_verify())
+    finally:
+        passwords.shutdown()
+    assert hashed.startswith("$2b$04$") and good and not bad
+    assert passwords.pending() == 0
+
+    monkeypatch.setattr(passwords, "PASSWORD_MAX_PENDING", 0)
+    rejected = passwords.REJECTED.value()
+    with pytest.raises(passwords.PasswordPoolBusy):
+        asyncio.run(passwords.verify_password("hunter22", hashed))
+    assert passwords.REJECTED.value() == rejected + 1
+
+def test_broken_password_pool_is_shut_down_and_replaced(monkeypatch):
+    from concurrent.futures import Executor, ThreadPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    class BrokenPool(Executor):
+        shutdown_calls = []
+
+        def submit(self, fn, *args, **kwargs):
+            raise BrokenProcessPool("a hashing process died")
+
+        def shutdown(self, wait=True, *, cancel_futures=False):
+            self.shutdown_calls.append(cancel_futures)
+
+    broken = BrokenPool()
+    monkeypatch.setattr(passwords, "_pool", broken)
+    monkeypatch.setattr(passwords, "PASSWORD_WORKERS", 1)
+    monkeypatch.setattr(passwords, "ProcessPoolExecutor", lambda max_workers, **kwargs: ThreadPoolExecutor(max_workers))
+    try:
+        assert asyncio.run(passwords._run(sum, [1, 2])) == 3
+        assert broken.shutdown_calls == [True]
+        assert passwords._pool is not broken
+    finally:
+        passwords.shutdown()
+
+def test_login_returns_429_when_password_pool_is_full(monkeypatch):
+    import database
+
+    async def busy(username, password):
+        raise passwords.PasswordPoolBusy("full")
+
+    monkeypatch.setattr(database, "verify_user", busy)
+    with TestClient(app) as client:
+        response = client.post("/login", data={"username": "a", "password": "b"})
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+    assert "Too many sign-in attempts" in response.text
+
+def test_bulk_import_streams_validated_batches(monkeypatch):
+    import psycopg
+    from starlette.requests import ClientDisconnect
+    import database
+    import dependencies
+    monkeypatch.setattr(dependencies, "ADMIN_TOKEN", "s3cret")
+    received = []
+
+    async def bulk_import(kind, batches, stats):
+        stats.update(staged=0, merged=0, skipped=0)
+        async for batch in batches:
+            received.append((kind, batch))
+            stats["staged"] += len(batch)
+        return stats
+
+    monkeypatch.setattr(database, "bulk_import", bulk_import)
+    monkeypatch.setattr(bulk, "BULK_BATCH_SIZE", 2)
+    # Chunk boundaries split a multi-byte character and a quoted field holding a newline
+    body = 'user_id,movie_id,movie_title,rating\n1,2,"Amélie, or\nnot",8\n1,3,X,nan\n2,4,Y,5\nx,5,Z,1\n3,6,W,9\n4,7,V,11'.encode()
+    chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+    with TestClient(app) as client:
+        monkeypatch.setattr(database, "db_pool", object())
+        assert client.post("/admin/import/ratings", content=body).status_code == 401
+        assert client.post("/admin/import/votes", content=body, headers={"X-Admin-Token": "s3cret"}).status_code == 400
+        response = client.post("/admin/import/ratings", content=iter(chunks), headers={"X-Admin-Token": "s3cret"})
+        assert response.status_code == 200
+        assert response.json() == {"read": 6, "rejected": 3, "staged": 3, "merged": 0, "skipped": 0}
+        assert received == [("ratings", [(1, 2, "Amélie, or\nnot", 8.0), (2, 4, "Y", 5.0)]), ("ratings", [(3, 6, "W", 9.0)])]
+
+        received.clear()
+        lines = b'{"user_id": 1, "movie_id": 2, "movie_title": "A", "status": "watched"}\n{oops\n\n{"user_id": 1, "movie_id": 3, "movie_title": "B", "status": "seen"}\n'
+        response = client.post("/admin/import/bookmarks?format=jsonl", content=lines, headers={"X-Admin-Token": "s3cret"})
+        assert response.json()["rejected"] == 2
+        assert received == [("bookmarks", [(1, 2, "A", "watched")])]
+
+        # A failure midway answers with the counts up to it
+        for error, status in [(psycopg.OperationalError("connection lost"), 503), (ClientDisconnect(), 400)]:
+            async def failing_import(kind, batches, stats, error=error):
+                stats.update(staged=0, merged=0, skipped=0)
+                async for batch in batches:
+                    stats["staged"] += len(batch)
+                    raise error
+
+            monkeypatch.setattr(database, "bulk_import", failing_import)
+            response = client.post("/admin/import/ratings", content=body, headers={"X-Admin-Token": "s3cret"})
+            assert response.status_code == status
+            detail = response.json()["detail"]
+            assert {k: detail[k] for k in ("read", "rejected", "staged", "merged")} == {"read": 3, "rejected": 1, "staged": 2, "merged": 0}
+        monkeypatch.setattr(database, "db_pool", None)
+
+def test_library_pages_use_opaque_keyset_cursors():
+    from datetime import datetime
+    from fastapi import HTTPException
+    from routers.users import _decode_cursor, _encode_cursor
+    key = (datetime(2026, 1, 2, 3, 4, 5, 678901), 42)
+    assert _decode_cursor(_encode_cursor(key)) == key
+    assert _encode_cursor(None) is None and _decode_cursor(None) is None
+    with pytest.raises(HTTPException):
+        _decode_cursor("not-a-cursor")
+
+    with TestClient(app) as client:
+        assert client.get("/api/library/bookmarks?status=watched").status_code == 401
+        assert client.get("/api/library/ratings").status_code == 401
+        assert "Please login to view your library" in client.get("/library").text
+
+def test_library_first_pages_are_cached_with_the_user_state(fake_pool, monkeypatch):
+    from datetime import datetime
+    import database
+    import user_state
+
+    async def interactions(user_id):
+        raise AssertionError("a cold library must not load the whole history")
+
+    monkeypatch.setattr(database, "get_user_interactions", interactions)
+    added = datetime(2026, 1, 2)
+    # (section, id, movie_id, movie_title, status, rating, created_at) rows of the UNION query
+    fake_pool.rows = [("watched", 7, 155, "The Dark Knight", "watched", None, added),
+                      ("rated", 9, 272, "Batman Begins", None, 8.0, added)]
+    user_id = 424245
+    user_state.invalidate(user_id)
+    pages = asyncio.run(database.get_user_library(user_id, limit=2))
+    assert pages["to_watch"] == ([], None)
+    assert pages["watched"] == ([{'movie_id': 155, 'movie_title': "The Dark Knight", 'status': "watched", 'rating': None}], None)
+    assert pages["rated"][0][0]['rating'] == 8.0
+    # Cold: only the bounded page query runs, every time
+    assert asyncio.run(database.get_user_library(user_id, limit=2)) == pages
+    assert len(fake_pool.queries) == 2
+
+    # With the user's state cached, the pages are kept on it
+    user_state.store(user_id, user_state.UserState(user_state.version(user_id), {}, {}))
+    cached = asyncio.run(database.get_user_library(user_id, limit=2))
+    assert asyncio.run(database.get_user_library(user_id, limit=2)) is cached
+    assert len(fake_pool.queries) == 3
+
+    # A write invalidates the state and, with it, the cached pages
+    user_state.invalidate(user_id)
+    assert asyncio.run(database.get_user_library(user_id, limit=2)) == pages
+    assert len(fake_pool.queries) == 4
+
+def test_single_lookups_and_full_lists_are_awaitable(fake_pool):
+    import database
+
+    fake_pool.rows = [(8.5,)]
+    assert asyncio.run(database.get_rating(42, 155)) == 8.5
+    fake_pool.rows = []
+    assert asyncio.run(database.get_bookmark(42, 155)) is None
+    fake_pool.rows = [(155, "The Dark Knight", "watched")]
+    assert asyncio.run(database.get_user_bookmarks(42)) == [{'movie_id': 155, 'movie_title': "The Dark Knight", 'status': "watched"}]
+    fake_pool.rows = [(272, "Batman Begins", 7.0)]
+    assert asyncio.run(database.get_user_ratings(42)) == [{'movie_id': 272, 'movie_title': "Batman Begins", 'rating': 7.0}]
+    assert [params for _, params in fake_pool.queries] == [(42, 155), (42, 155), (42,), (42,)]
+
+def test_library_iterators_stream_through_a_server_side_cursor(fake_pool):
+    from datetime import datetime
+    import database
+
+    async def collect(rows):
+        return [row async for row in rows]
+
+    added = datetime(2026, 1, 2)
+    # (id, movie_id, movie_title, status, rating, created_at) rows of the unbounded page query
+    fake_pool.rows = [(8, 272, "Batman Begins", "watched", None, added), (7, 155, "The Dark Knight", "watched", None, added)]
+    rows = asyncio.run(collect(database.iter_user_bookmarks(42, status="watched", batch_size=1)))
+    assert [r['movie_id'] for r in rows] == [272, 155] and rows[0]['status'] == "watched"
+    query, params = fake_pool.queries[0]
+    assert "LIMIT" not in query and params == [42, "watched"]
+
+    fake_pool.rows = [(9, 19995, "Avatar", None, 6.5, added)]
+    assert asyncio.run(collect(database.iter_user_ratings(42))) == [
+        {'movie_id': 19995, 'movie_title': "Avatar", 'status': None, 'rating': 6.5}
+    ]
+    assert fake_pool.cursor_names == ["iter_bookmarks_42", "iter_ratings_42"]
+
+def test_write_buffer_coalesces_batches_and_isolates_failures():
+    from write_buffer import WriteBuffer
+    applied = []
+
+    async def apply(writes):
+        if ("bad", 0) in writes:
+            raise ValueError("constraint violation")
+        applied.append(dict(writes))
+
+    async def scenario():
+        buffer = WriteBuffer(apply, window=0.01, max_pending=100)
+        results = await asyncio.gather(
+            buffer.submit(("rate", 1), 5), buffer.submit(("rate", 1), 7), buffer.submit(("rate", 2), 3),
+        )
+        first = list(applied)
+        # One bad write fails only its own caller
+        applied.clear()
+        mixed = await asyncio.gather(buffer.submit(("bad", 0), 1), buffer.submit(("rate", 3), 9))
+        # Queued writes are committed by flush() without waiting out the window
+        slow = WriteBuffer(apply, window=60)
+        waiter = asyncio.ensure_future(slow.submit(("rate", 4), 1))
+        await asyncio.sleep(0)
+        await slow.flush()
+        return results, first, mixed, await waiter
+
+    results, first, mixed, flushed = asyncio.run(scenario())
+    assert results == [True, True, True]
+    assert first == [{("rate", 1): 7, ("rate", 2): 3}]
+    assert mixed == [False, True]
+    assert applied[:1] == [{("rate", 3): 9}] and applied[-1] == {("rate", 4): 1}
+    assert flushed is True
+
+def test_migrations_are_append_only_and_stats_default_to_zero():
+    import migrations
+    versions = [version for version, _, _ in migrations.MIGRATIONS]
+    assert versions == list(range(1, len(versions) + 1))
+    assert all(description and statements for _, description, statements in migrations.MIGRATIONS)
+
+    with TestClient(app) as client:
+        stats = client.get("/api/movie/155/stats").json()
+    assert stats == {"movie_id": 155, "rating_count": 0, "avg_rating": None, "watched": 0, "to_watch": 0}
 
 def test_login_page():
     with TestClient(app) as client:
@@ -57,6 +1091,83 @@ def test_login_page():
         assert response.status_code == 200
         assert "Login" in response.text
 
+def test_health_and_readiness():
+    with TestClient(app) as client:
+        assert client.get("/healthz").json() == {"status": "ok"}
+        response = client.get("/readyz")
+        body = response.json()
+        assert set(body["checks"]) >= {"catalog", "retriever", "neighbors", "database"}
+        assert response.status_code == (200 if body["status"] == "ready" else 503)
+
+def test_batch_recommendations_endpoint_validates_input():
+    with TestClient(app) as client:
+        assert client.post("/api/recommendations", json={"movie_ids": "155"}).status_code == 400
+        assert client.post("/api/recommendations", json={"movie_ids": [155], "k": 0}).status_code == 400
+        assert client.post("/api/recommendations", json={"movie_ids": list(range(201))}).status_code == 400
+        response = client.post("/api/recommendations", json={"movie_ids": [999999999], "k": 3})
+        assert response.status_code == 200
+        assert response.json() == {"k": 3, "results": [], "missing": [999999999]}
+
+def _off_event_loop():
+    """True when called from a worker thread rather than the event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return True
+    return False
+
+def _log_in(client, user_id, username="tester"):
+    """Give the test client a signed session cookie for `user_id`."""
+    import base64
+    import json
+    from itsdangerous import TimestampSigner
+    import main
+    data = base64.b64encode(json.dumps({"user_id": user_id, "user": username}).encode())
+    client.cookies.set("session", TimestampSigner(str(main.SECRET_KEY)).sign(data).decode())
+
+@pytest.mark.parametrize("method, path, body, patched", [
+    # (module, function, stub result); None calls through to the real function
+    ("get", "/movie/155", None, [("services", "get_recommendations_by_id", []), ("templates", "TemplateResponse", None)]),
+    ("post", "/api/recommendations", {"movie_ids": [155]}, [("services", "get_recommendations_batch", {})]),
+    ("get", "/api/recommendations/for-you", None,
+     [("services", "build_user_profile", {"vector": None, "seen": [155]}), ("services", "get_profile_recommendations", [])]),
+    ("get", "/library", None, [("services", "get_movies_details", None), ("templates", "TemplateResponse", None)]),
+    ("get", "/api/library/ratings", None, [("services", "get_movies_details", None)]),
+])
+def test_cpu_bound_route_work_runs_off_the_event_loop(sample_df, monkeypatch, method, path, body, patched):
+    import database
+    import user_state
+    from dependencies import templates
+    modules, calls = {"services": services, "templates": templates}, []
+
+    def recording(name, real, result):
+        def wrapper(*args, **kwargs):
+            calls.append((name, _off_event_loop()))
+            return real(*args, **kwargs) if result is None else result
+        return wrapper
+
+    async def fake_state(user_id):
+        return user_state.UserState.from_interactions(1, [{'movie_id': 155, 'rating': 8.0, 'status': 'watched'}])
+
+    async def fake_library(user_id, limit=None):
+        return {"to_watch": ([], None), "watched": ([], None), "rated": ([{'movie_id': 155, 'status': None, 'rating': 8.0}], None)}
+
+    async def fake_ratings_page(user_id, after=None, limit=None):
+        return [{'movie_id': 155, 'status': None, 'rating': 8.0}], None
+
+    monkeypatch.setattr(database, "get_user_state", fake_state)
+    monkeypatch.setattr(database, "get_user_library", fake_library)
+    monkeypatch.setattr(database, "get_user_ratings_page", fake_ratings_page)
+    for module, name, result in patched:
+        monkeypatch.setattr(modules[module], name, recording(name, getattr(modules[module], name), result))
+    with TestClient(app) as client:
+        monkeypatch.setattr(app.state, "catalog", MovieCatalog(sample_df))
+        _log_in(client, 424243)
+        response = client.request(method, path, json=body)
+    assert response.status_code == 200
+    assert {name for name, _ in calls} == {name for _, name, _ in patched}
+    assert all(off_loop for _, off_loop in calls)
+
 def test_movie_details_404():
     with TestClient(app) as client:
         response = client.get("/movie/999999999") 
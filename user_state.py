@@ -0,0 +1,94 @@
+"""
+Per-user cache of bookmarks and ratings.
+
+Each worker keeps recently used users' library state in memory. Freshness
+is tracked with change stamps in an anonymous shared memory map created at
+import: gunicorn preloads the app in the master, so every worker forked
+from it sees the same stamps. A write sets the user's stamp to the current
+monotonic time (in every worker at once), and a cached state is only used
+while its stamp hasn't moved. Without a shared master (or across hosts), staleness is bounded by
+USER_STATE_TTL.
+"""
+import mmap
+import os
+import time
+
+import numpy as np
+
+from cache import create_cache
+
+USER_STATE_CACHE_SIZE = int(os.getenv("USER_STATE_CACHE_SIZE", 10000))
+USER_STATE_TTL = float(os.getenv("USER_STATE_TTL", 300))
+
+# Users hash into this many change stamps; sharing a slot only costs a spurious reload
+_SLOTS = 1 << 16
+_versions = np.frombuffer(mmap.mmap(-1, _SLOTS * 8), dtype=np.uint64)
+
+_cache = create_cache("user_state", backend="memory", max_size=USER_STATE_CACHE_SIZE, ttl=USER_STATE_TTL)
+
+
+class UserState:
+    """
+    One user's bookmark statuses and ratings, keyed by movie id, plus the
+    first library pages queried while it was current ({page size: pages}).
+    """
+
+    __slots__ = ("version", "statuses", "ratings", "library")
+
+    def __init__(self, version, statuses, ratings):
+        self.version = version
+        self.statuses = statuses
+        self.ratings = ratings
+        self.library = {}
+
+    @classmethod
+    def from_interactions(cls, version, rows):
+        """Build from database.get_user_interactions rows."""
+        return cls(
+            version,
+            {r['movie_id']: r['status'] for r in rows if r['status'] is not None},
+            {r['movie_id']: r['rating'] for r in rows if r['rating'] is not None},
+        )
+
+    def movie_states(self, movie_ids):
+        """{movie_id: {'status': str|None, 'rating': float|None}} for every requested id."""
+        return {m: {'status': self.statuses.get(m), 'rating': self.ratings.get(m)} for m in movie_ids}
+
+    def interactions(self):
+        """Every rated or bookmarked movie as [{'movie_id', 'rating', 'status'}]."""
+        return [
+            {'movie_id': m, 'rating': self.ratings.get(m), 'status': self.statuses.get(m)}
+            for m in dict.fromkeys([*self.ratings, *self.statuses])
+        ]
+
+    def with_status(self, status):
+        """Ids of the movies bookmarked with `status`."""
+        return [m for m, s in self.statuses.items() if s == status]
+
+
+def version(user_id):
+    """Current change stamp of a user; read it before loading their state."""
+    return int(_versions[int(user_id) % _SLOTS])
+
+
+def cached(user_id):
+    """The cached state of a user if it is still current, else None."""
+    state = _cache.get(int(user_id))
+    if state is not None and state.version == version(user_id):
+        return state
+    return None
+
+
+def store(user_id, state):
+    _cache.set(int(user_id), state)
+    return state
+
+
+def invalidate(user_id):
+    """Mark a user's state as changed in every worker; call after the write has committed."""
+    slot = int(user_id) % _SLOTS
+    # A plain store of a fresh stamp, not a read-modify-write: when two workers
+    # write at once, either stamp differs from every version read before. The
+    # max only separates two writes within one clock tick.
+    _versions[slot] = max(time.monotonic_ns(), int(_versions[slot]) + 1)
+    _cache.delete(int(user_id))
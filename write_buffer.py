@@ -0,0 +1,116 @@
+"""
+Group commit for small user writes.
+
+Bookmark and rating clicks arrive as many tiny writes, each of which used to
+be its own transaction. A WriteBuffer collects them for WRITE_COALESCE_WINDOW
+seconds and applies the batch in one transaction. Writes to the same key
+(user, movie) within a batch coalesce into the latest one. Every caller
+still waits until its batch has committed before returning, so a response
+means the write is durable and the user's next read sees it.
+"""
+import asyncio
+import os
+
+import metrics
+from logger import get_logger
+
+# Initialize logger for write_buffer
+logger = get_logger("write_buffer")
+
+# Seconds writes are collected before a batch is committed; 0 writes each one directly
+WRITE_COALESCE_WINDOW = float(os.getenv("WRITE_COALESCE_WINDOW", 0.002))
+# A batch this large is committed without waiting out the window
+WRITE_COALESCE_MAX = int(os.getenv("WRITE_COALESCE_MAX", 500))
+
+COALESCED = metrics.Counter("db_writes_coalesced_total", "Writes superseded by a later write to the same key in one batch")
+BATCH_SIZE = metrics.Histogram(
+    "db_write_batch_size", "Keys committed per write batch",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+
+
+class WriteBuffer:
+    """
+    Coalesces keyed writes and hands each batch ({key: value}) to the async
+    `apply` callable. If a batch fails, its writes are retried one at a
+    time so a single bad write only fails its own callers.
+    """
+
+    def __init__(self, apply, window=None, max_pending=None):
+        self.apply = apply
+        self.window = WRITE_COALESCE_WINDOW if window is None else window
+        self.max_pending = max_pending or WRITE_COALESCE_MAX
+        self._pending = {}  # key -> (value, [futures])
+        self._timer = None
+        self._scheduled = False
+        self._tasks = set()
+        self._lock = None
+        self._loop = None
+
+    async def submit(self, key, value):
+        """Queue a write and wait for its batch to commit; True on success."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._lock = loop, asyncio.Lock()
+        future = loop.create_future()
+        if key in self._pending:
+            COALESCED.inc()
+            self._pending[key][1].append(future)
+            self._pending[key] = (value, self._pending[key][1])
+        else:
+            self._pending[key] = (value, [future])
+
+        if not self._scheduled:
+            self._scheduled = True
+            self._timer = loop.call_later(self.window, self._start_flush)
+        if len(self._pending) >= self.max_pending and self._timer is not None:
+            # Full: commit now instead of waiting out the window
+            self._timer.cancel()
+            self._start_flush()
+        # Shielded: a caller that disconnects must not cancel the batch it shares
+        return await asyncio.shield(future)
+
+    def _start_flush(self):
+        self._timer = None
+        task = asyncio.ensure_future(self._flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self):
+        # One batch at a time, so a later write to a key never commits before an earlier one
+        async with self._lock:
+            batch, self._pending, self._scheduled = self._pending, {}, False
+            if not batch:
+                return
+            BATCH_SIZE.observe(len(batch))
+            try:
+                await self.apply({key: value for key, (value, _) in batch.items()})
+                results = {key: True for key in batch}
+            except Exception as e:
+                logger.error(f"Write batch of {len(batch)} failed ({e}); retrying writes one by one.")
+                results = {}
+                for key, (value, _) in batch.items():
+                    try:
+                        await self.apply({key: value})
+                        results[key] = True
+                    except Exception as e:
+                        logger.error(f"Write {key} failed: {e}")
+                        results[key] = False
+            for key, (_, futures) in batch.items():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(results[key])
+
+    async def flush(self):
+        """Commit everything queued now and wait for batches in flight; call before shutdown."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            self._scheduled = True
+            self._start_flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def pending(self):
+        return len(self._pending)